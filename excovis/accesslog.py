@@ -0,0 +1,115 @@
+"""Access log of the requested transcripts and samples for popularity-driven cache warming.
+
+Each line of the log is ``TIMESTAMP<TAB>TX_ACCESSION<TAB>SAMPLE_ID``.  The callbacks record the
+transcript and samples that a user looks at, repeated accesses of the same pair by a server
+process are only logged once in ``settings.ACCESS_LOG_DEDUP_SECONDS`` to keep the log compact.
+The warm-up (see ``.warmup``) ranks the transcripts by their number of accesses and the samples
+by their last access and drops entries that are out of the window from the log.
+"""
+
+import collections
+import os
+import threading
+import time
+
+from logzero import logger
+
+from . import settings
+
+#: Seconds of each day.
+DAY = 24 * 60 * 60
+#: Drop the in-process dedup state when it grows larger than this.
+MAX_DEDUP_ENTRIES = 100_000
+
+#: Time of the last logged access by ``(tx_accession, sample_id)`` in this process.
+_last_logged = {}
+#: Lock for ``_last_logged`` and appending to the log.
+_lock = threading.Lock()
+
+
+def record(tx_accession, samples, now=None):
+    """Append the access of ``samples`` for ``tx_accession`` to the log, if enabled."""
+    if not settings.ACCESS_LOG_PATH or not tx_accession or not samples:
+        return
+    now = time.time() if now is None else now
+    with _lock:
+        if len(_last_logged) > MAX_DEDUP_ENTRIES:
+            _last_logged.clear()
+        lines = []
+        for sample in samples:
+            key = (tx_accession, sample)
+            last = _last_logged.get(key)
+            if last is None or now - last >= settings.ACCESS_LOG_DEDUP_SECONDS:
+                _last_logged[key] = now
+                lines.append("%d\t%s\t%s\n" % (now, tx_accession, sample))
+        if not lines:
+            return
+        try:
+            # Opened per write such that compaction by another process is picked up.
+            with open(settings.ACCESS_LOG_PATH, "at") as outputf:
+                outputf.write("".join(lines))
+        except OSError as e:
+            logger.warning("Could not write to access log: %s", e)
+
+
+def read(path, since=0):
+    """Yield ``(timestamp, tx_accession, sample_id)`` of the log at ``path`` from ``since`` on."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rt") as inputf:
+        for line in inputf:
+            arr = line.rstrip("\n").split("\t")
+            if len(arr) != 3:
+                continue  # skip partially written lines
+            try:
+                timestamp = int(arr[0])
+            except ValueError:
+                continue
+            if timestamp >= since:
+                yield timestamp, arr[1], arr[2]
+
+
+def rank(entries, top_k, recent_since):
+    """Rank the accesses ``entries`` for warming the cache.
+
+    Returns pair of the ``top_k`` transcript accessions by number of accesses and the sample IDs
+    accessed from ``recent_since`` on, most recently accessed first.
+    """
+    counts = collections.Counter()
+    last_access = {}
+    for timestamp, tx_accession, sample in entries:
+        counts[tx_accession] += 1
+        if timestamp >= recent_since:
+            last_access[sample] = max(timestamp, last_access.get(sample, 0))
+    tx_accessions = [tx_accession for tx_accession, _ in counts.most_common(top_k)]
+    samples = sorted(last_access, key=lambda sample: -last_access[sample])
+    return tx_accessions, samples
+
+
+def compact(path, since):
+    """Rewrite the log at ``path`` without the entries before ``since``.
+
+    Accesses appended while rewriting are lost, which is fine for ranking.
+    """
+    if not os.path.exists(path):
+        return
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "wt") as outputf:
+        for entry in read(path, since):
+            outputf.write("%d\t%s\t%s\n" % entry)
+    os.replace(tmp_path, path)
+
+
+def popular(now=None):
+    """Return pair of the most popular transcripts and the recently active samples.
+
+    Uses the ``settings.ACCESS_LOG_*`` and ``settings.POPULAR_*`` values and compacts the log.
+    """
+    now = time.time() if now is None else now
+    since = now - settings.POPULAR_WINDOW_DAYS * DAY
+    compact(settings.ACCESS_LOG_PATH, since)
+    return rank(
+        read(settings.ACCESS_LOG_PATH, since),
+        settings.POPULAR_TOP_K,
+        now - settings.POPULAR_RECENT_DAYS * DAY,
+    )
@@ -0,0 +1,127 @@
+"""Admission control for the expensive stages of request processing.
+
+Each stage (loading coverage from BAM files, rendering plots) admits a bounded number of
+concurrent computations.  A bounded number of further requests may wait for a free slot.  When
+the queue is full or the wait times out, ``Busy`` is raised right away such that the client can
+retry later instead of oversubscribing the host.  The limits apply per server process.  This
+module is unaware of the Dash app.
+"""
+
+import contextlib
+import threading
+import time
+
+from . import settings
+from .exceptions import ExcovisException
+
+
+class Busy(ExcovisException):
+    """Raised when a stage does not admit a computation."""
+
+
+class Stage:
+    """Concurrency limit with a bounded queue for one stage."""
+
+    def __init__(self, name, limit, queue_size):
+        #: Name of the stage.
+        self.name = name
+        #: Number of concurrent computations.
+        self.limit = limit
+        #: Number of computations that may wait for a free slot.
+        self.queue_size = queue_size
+        #: The free slots.
+        self.slots = threading.BoundedSemaphore(limit)
+        #: Lock for the counters.
+        self.lock = threading.Lock()
+        #: Number of running computations.
+        self.active = 0
+        #: Number of waiting computations.
+        self.waiting = 0
+        #: Number of admitted computations.
+        self.admitted = 0
+        #: Number of rejected computations.
+        self.rejected = 0
+        #: Total and maximal seconds that admitted computations waited.
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def acquire(self, timeout=None):
+        """Wait for a free slot for up to ``timeout`` seconds, raise ``Busy`` if none."""
+        if timeout is None:
+            timeout = settings.ADMISSION_TIMEOUT
+        with self.lock:
+            if self.active + self.waiting >= self.limit + self.queue_size:
+                self.rejected += 1
+                raise Busy("Queue of stage %s is full" % self.name)
+            self.waiting += 1
+        start = time.monotonic()
+        acquired = self.slots.acquire(timeout=timeout)
+        waited = time.monotonic() - start
+        with self.lock:
+            self.waiting -= 1
+            if not acquired:
+                self.rejected += 1
+                raise Busy("Timeout waiting for stage %s" % self.name)
+            self.active += 1
+            self.admitted += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def release(self):
+        """Release a slot acquired with ``acquire()``."""
+        with self.lock:
+            self.active -= 1
+        self.slots.release()
+
+    def stats(self):
+        """Return ``dict`` with the limits, queue depth and wait times."""
+        with self.lock:
+            return {
+                "limit": self.limit,
+                "queue_size": self.queue_size,
+                "active": self.active,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "wait_mean": self.wait_total / self.admitted if self.admitted else 0.0,
+                "wait_max": self.wait_max,
+            }
+
+
+#: Names of the settings with the concurrency limit and queue size of each stage.
+STAGE_SETTINGS = {
+    "load": ("LOAD_CONCURRENCY", "LOAD_QUEUE_SIZE"),
+    "render": ("RENDER_WORKERS", "RENDER_QUEUE_SIZE"),
+}
+
+#: The stages by name, created on first use.
+_stages = {}
+#: Lock for creating ``_stages``.
+_lock = threading.Lock()
+
+
+def get_stage(name):
+    """Return ``Stage`` with the given ``name``, create it on first call."""
+    with _lock:
+        if name not in _stages:
+            limit, queue_size = (getattr(settings, key) for key in STAGE_SETTINGS[name])
+            _stages[name] = Stage(name, limit, queue_size)
+        return _stages[name]
+
+
+@contextlib.contextmanager
+def admit(name):
+    """Context manager running the body in a slot of stage ``name``."""
+    stage = get_stage(name)
+    stage.acquire()
+    try:
+        yield
+    finally:
+        stage.release()
+
+
+def stats():
+    """Return ``dict`` with the statistics of each stage used so far."""
+    with _lock:
+        stages = list(_stages.values())
+    return {stage.name: stage.stats() for stage in stages}
@@ -5,12 +5,13 @@ this module is imported, the values in ``.settings`` must already have been setu
 """
 
 import os
+import re
 
 import dash
 import flask
 
 
-from . import cache, callbacks, settings
+from . import admission, cache, callbacks, downloads, metrics, settings, store, warmup
 from .__init__ import __version__
 from .ui import build_layout
 
@@ -49,17 +50,66 @@ app.title = "ExCoVis v%s" % __version__
 app.css.config.serve_locally = True
 app.scripts.config.serve_locally = True
 
-# Setup the application's main layout.
-app.layout = build_layout()
+# Setup the application's main layout, built on each page load to get a fresh session ID.
+app.layout = build_layout
+
+# Register the download routes.
+app_flask.register_blueprint(downloads.blueprint)
 
 # Register the callbacks with the app.
 #
 # Callbacks for the coverage plot.
 callbacks.register_plot(app)
+callbacks.register_graph(app)
 callbacks.register_table(app)
+callbacks.register_downloads(app)
 callbacks.register_transcript_select(app)
 
 # Add redirection for root.
 @app_flask.route("/")
 def redirect_root():
     return flask.redirect("%s/dash/" % settings.PUBLIC_URL_PREFIX)
+
+
+# Serve rendered plots by their content hash.
+@app_flask.route("/plots/<digest>.png")
+def serve_plot(digest):
+    if not re.fullmatch(r"[0-9a-f]{64}", digest):
+        flask.abort(404)
+    png = store.load_image(digest)
+    if png is None:
+        flask.abort(404)
+    response = flask.Response(png, mimetype="image/png")
+    response.set_etag(digest)
+    response.cache_control.public = True
+    response.cache_control.max_age = settings.IMAGE_MAX_AGE
+    return response.make_conditional(flask.request)
+
+
+# Report the admission control and cache statistics of this server process.
+@app_flask.route("/admission")
+def admission_stats():
+    backend = cache.cache.cache
+    return flask.jsonify(
+        {
+            "pid": os.getpid(),
+            "stages": admission.stats(),
+            # Evictions and hit ratio, only with a cache size limit, see ``.boundedcache``.
+            "cache": backend.stats() if hasattr(backend, "stats") else None,
+        }
+    )
+
+
+# Expose the metrics in the Prometheus text format.
+@app_flask.route("/metrics")
+def serve_metrics():
+    data, content_type = metrics.generate()
+    return flask.Response(data, content_type=content_type)
+
+
+# Report whether the startup warm-up has finished, for readiness probes.
+@app_flask.route("/ready")
+def ready():
+    response = flask.jsonify({"ready": warmup.is_ready(), "warmup": warmup.get_progress()})
+    response.status_code = 200 if warmup.is_ready() else 503
+    return response
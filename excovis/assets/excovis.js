@@ -0,0 +1,99 @@
+/* Clientside callbacks for ExCoVis.
+ *
+ * These callbacks handle display-only changes without a round trip to the server.
+ */
+
+(function () {
+  /* Decode base64 string into typed array of the given type (little endian). */
+  function decode(b64, ArrayType) {
+    var bin = window.atob(b64);
+    var bytes = new Uint8Array(bin.length);
+    for (var i = 0; i < bin.length; i++) {
+      bytes[i] = bin.charCodeAt(i);
+    }
+    return new ArrayType(bytes.buffer);
+  }
+
+  /* Build the interactive coverage figure from the "coverage-store" data. */
+  function renderCoverage(data, ymax, thresholds) {
+    if (!data) {
+      return {};
+    }
+    var n = data.samples.length;
+    var xs = Array.from(decode(data.x, Int32Array));
+    var mins = decode(data.min, Uint16Array);
+    var maxs = decode(data.max, Uint16Array);
+    var nBins = xs.length;
+    var gap = 0.02;
+    var traces = [];
+    var shapes = [];
+    var layout = {
+      title: data.title,
+      height: data.trackHeight * n + 100,
+      margin: {l: 60, r: 20, t: 40, b: 40},
+      showlegend: false,
+      uirevision: data.uirevision,
+      xaxis: {
+        anchor: "y" + n,
+        tickvals: data.tickvals,
+        ticktext: data.ticktext,
+      },
+    };
+    if (data.range) {
+      layout.xaxis.range = data.range;
+    }
+
+    data.samples.forEach(function (sample, i) {
+      var yaxis = i === 0 ? "y" : "y" + (i + 1);
+      var row = {
+        min: Array.from(mins.subarray(i * nBins, (i + 1) * nBins)),
+        max: Array.from(maxs.subarray(i * nBins, (i + 1) * nBins)),
+      };
+      traces.push({
+        type: "scattergl", mode: "lines", x: xs, y: row.max, name: sample + " (max)",
+        xaxis: "x", yaxis: yaxis, fill: "tozeroy", line: {color: "#61a0ff", width: 1},
+      });
+      traces.push({
+        type: "scattergl", mode: "lines", x: xs, y: row.min, name: sample + " (min)",
+        xaxis: "x", yaxis: yaxis, fill: "tozeroy", line: {color: "#1a4f9c", width: 1},
+      });
+      layout["yaxis" + (i === 0 ? "" : i + 1)] = {
+        title: {text: sample},
+        range: [0, ymax],
+        domain: [1 - (i + 1) / n + gap, 1 - i / n],
+        anchor: "x",
+      };
+      // Show lines with warning and error threshold.
+      (thresholds || []).forEach(function (y) {
+        shapes.push({
+          type: "line", xref: "paper", x0: 0, x1: 1, yref: yaxis, y0: y, y1: y,
+          line: {color: "black", width: 1, dash: "dot"},
+        });
+      });
+    });
+    // Display vertical lines indicating exon jumps.
+    data.jumps.forEach(function (x) {
+      shapes.push({
+        type: "line", xref: "x", x0: x, x1: x, yref: "paper", y0: 0, y1: 1,
+        line: {color: "dimgray", width: 1},
+      });
+    });
+    layout.shapes = shapes;
+    return {data: traces, layout: layout};
+  }
+
+  /* Forward the display options to the server-rendered image only in the image modes. */
+  function imageOptions(ymax, thresholds, plotMode) {
+    if (plotMode === "interactive") {
+      return window.dash_clientside.no_update;
+    }
+    return {ymax: ymax, thresholds: thresholds};
+  }
+
+  window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    excovis: {
+      renderCoverage: renderCoverage,
+      imageOptions: imageOptions,
+    },
+  });
+})();
@@ -0,0 +1,282 @@
+"""File system cache backend with a byte-size budget and frequency-aware eviction.
+
+The memoized results (e.g., coverage data frames) and the rendered images are evictable entries
+whose sizes count towards ``settings.CACHE_SIZE_LIMIT``, the control entries (job states,
+warm-up progress, cancellation generations, locks, and memoize versions) are never evicted but
+removed once expired, as the pruning of ``FileSystemCache`` is disabled.
+When the budget is exceeded, the least recently used entries are evicted, where a hit refreshes
+the modification time of the entry's file.  A new memoized result is only admitted if it was
+accessed at least as frequently as the entries that would be evicted for it (TinyLFU), such
+that a single sweep over many samples does not evict the entries that are used over and over
+again.
+The access frequencies are estimated by each process on its own with a count-min sketch that is
+halved periodically to forget old accesses.  The total size is rescanned from the directory
+every ``settings.CACHE_SCAN_INTERVAL`` seconds, so the budget is approximate with several
+processes writing to the cache.
+
+Enable with ``CACHE_TYPE = "excovis.boundedcache.bounded_filesystem"``, see ``.cache``.
+"""
+
+import collections
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from flask_caching.backends.filesystemcache import FileSystemCache
+from logzero import logger
+import numpy as np
+
+from . import metrics
+from .cache import LOCK_KEY_SUFFIX
+from .store import IMAGE_KEY_PREFIX
+
+#: Prefix of the keys of the control entries.
+CONTROL_KEY_PREFIX = "excovis-"
+#: Suffixes of the keys of the memoize versions and the single-flight locks.
+PINNED_KEY_SUFFIXES = ("_memver", LOCK_KEY_SUFFIX)
+#: File name prefix of the evictable entries by kind.
+FILE_PREFIXES = {"image": "i.", "memoized": "m."}
+#: Kind of the evictable entries by file name prefix.
+KINDS = {prefix: kind for kind, prefix in FILE_PREFIXES.items()}
+
+#: Saturation value of the frequency counters.
+MAX_FREQUENCY = 15
+
+
+def entry_kind(key):
+    """Return kind of the evictable entry for ``key`` or ``None`` for control entries."""
+    if key.startswith(IMAGE_KEY_PREFIX):
+        return "image"
+    elif key.startswith(CONTROL_KEY_PREFIX) or key.endswith(PINNED_KEY_SUFFIXES):
+        return None
+    else:
+        return "memoized"
+
+
+class FrequencySketch:
+    """Count-min sketch of the access frequencies of hex digests.
+
+    All counters are halved after ``10 * width`` increments such that old accesses fade.
+    """
+
+    def __init__(self, width=1 << 16, depth=4):
+        #: Number of counters per row.
+        self.width = width
+        #: The counters, one row per hash function.
+        self.table = np.zeros((depth, width), dtype=np.uint8)
+        #: Number of increments until the counters are halved.
+        self.sample_size = 10 * width
+        #: Number of increments since the counters were last halved.
+        self.additions = 0
+        self._rows = np.arange(depth)
+
+    def _columns(self, digest):
+        return [int(digest[8 * i : 8 * i + 8], 16) % self.width for i in self._rows]
+
+    def increment(self, digest):
+        """Count an access of ``digest``."""
+        columns = self._columns(digest)
+        counts = self.table[self._rows, columns]
+        if counts.min() < MAX_FREQUENCY:
+            # Conservative update: only increment the smallest counters.
+            rows = self._rows[counts == counts.min()]
+            self.table[rows, np.array(columns)[rows]] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.table >>= 1
+            self.additions //= 2
+
+    def frequency(self, digest):
+        """Return the estimated access frequency of ``digest``."""
+        return int(self.table[self._rows, self._columns(digest)].min())
+
+
+class BoundedFileSystemCache(FileSystemCache):
+    """File system cache limited to ``max_bytes`` of evictable entries, see module docstring."""
+
+    def __init__(self, cache_dir, max_bytes, scan_interval=10.0, **kwargs):
+        # The number of files is not limited, the entries are evicted by size.
+        super().__init__(cache_dir, threshold=0, **kwargs)
+        #: The budget of the evictable entries in bytes.
+        self.max_bytes = max_bytes
+        #: Seconds between rescans of the total size.
+        self.scan_interval = scan_interval
+        self._sketch = FrequencySketch()
+        self._lock = threading.Lock()
+        #: Estimated total size of the evictable entries.
+        self._bytes = 0
+        #: ``time.monotonic()`` of the last scan, ``None`` for never.
+        self._scanned = None
+        self._stats = collections.Counter()
+
+    def _get_filename(self, key):
+        kind = entry_kind(key)
+        filename = super()._get_filename(key)
+        if kind is None:
+            return filename
+        dirname, basename = os.path.split(filename)
+        return os.path.join(dirname, FILE_PREFIXES[kind] + basename)
+
+    def get(self, key):
+        kind = entry_kind(key)
+        if kind is None:
+            return super().get(key)
+        filename = self._get_filename(key)
+        with self._lock:
+            self._sketch.increment(os.path.basename(filename)[2:])
+        value = super().get(key)
+        if value is None:
+            self._stats["misses"] += 1
+            metrics.CACHE_LOOKUP_TOTAL.labels(kind, "miss").inc()
+        else:
+            self._stats["hits"] += 1
+            metrics.CACHE_LOOKUP_TOTAL.labels(kind, "hit").inc()
+            try:
+                os.utime(filename)  # refresh for the LRU order
+            except OSError:
+                pass
+        return value
+
+    def set(self, key, value, timeout=None, mgmt_element=False):
+        kind = entry_kind(key)
+        if kind is None or mgmt_element:
+            return super().set(key, value, timeout, mgmt_element)
+        timeout = self._normalize_timeout(timeout)
+        filename = self._get_filename(key)
+        try:
+            fd, tmp = tempfile.mkstemp(suffix=self._fs_transaction_suffix, dir=self._path)
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(timeout, f, 1)
+                pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(tmp)
+            if not self._make_room(kind, os.path.basename(filename)[2:], size):
+                os.remove(tmp)
+                return False
+            os.replace(tmp, filename)
+            os.chmod(filename, self._mode)
+        except (IOError, OSError):
+            return False
+        self._stats["writes"] += 1
+        metrics.CACHE_ENTRY_BYTES.labels(kind).observe(size)
+        return True
+
+    def clear(self):
+        result = super().clear()
+        with self._lock:
+            self._bytes, self._scanned = 0, None
+        return result
+
+    def _scan(self):
+        """Return the evictable entries as ``(mtime, size, name)``, least recently used first.
+
+        Also updates the estimated total size and removes the expired control entries.
+        """
+        entries = []
+        now = time.time()
+        with os.scandir(self._path) as it:
+            for dirent in it:
+                if dirent.name.endswith(self._fs_transaction_suffix):
+                    continue
+                elif dirent.name[:2] not in KINDS:
+                    self._remove_if_expired(dirent.path, now)
+                    continue
+                try:
+                    stat = dirent.stat()
+                except OSError:
+                    continue  # evicted or replaced concurrently
+                entries.append((stat.st_mtime, stat.st_size, dirent.name))
+        entries.sort()
+        self._bytes = sum(size for _, size, _ in entries)
+        self._scanned = time.monotonic()
+        metrics.CACHE_BYTES.set(self._bytes)
+        return entries
+
+    def _remove_if_expired(self, path, now):
+        """Remove the control entry at ``path`` if it expired before ``now``."""
+        try:
+            with open(path, "rb") as f:
+                expires = pickle.load(f)
+            if expires != 0 and expires <= now:
+                os.remove(path)
+                self._stats["expired"] += 1
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass  # removed or replaced concurrently
+
+    def _evict(self, name, size):
+        kind = KINDS[name[:2]]
+        try:
+            os.remove(os.path.join(self._path, name))
+        except OSError:
+            return  # evicted by another process
+        self._bytes -= size
+        self._stats["evictions"] += 1
+        self._stats["evicted_bytes"] += size
+        metrics.CACHE_EVICTED_TOTAL.labels(kind).inc()
+        metrics.CACHE_EVICTED_BYTES.labels(kind).inc(size)
+
+    def _make_room(self, kind, digest, size):
+        """Evict entries for a new entry of ``size`` bytes, return whether to admit it.
+
+        Rendered images are always admitted as they are requested right after writing them.
+        """
+        with self._lock:
+            if self._scanned is None or time.monotonic() - self._scanned > self.scan_interval:
+                self._scan()
+            if self._bytes + size <= self.max_bytes:
+                self._bytes += size
+                return True
+            entries = self._scan()
+            victims, freed = [], 0
+            for _, victim_size, name in entries:
+                if self._bytes - freed + size <= self.max_bytes:
+                    break
+                victims.append((name, victim_size))
+                freed += victim_size
+            admit = size <= self.max_bytes and (
+                kind == "image"
+                or self._sketch.frequency(digest)
+                >= max((self._sketch.frequency(name[2:]) for name, _ in victims), default=0)
+            )
+            if not admit:
+                self._stats["rejections"] += 1
+                metrics.CACHE_REJECTED_TOTAL.labels(kind).inc()
+                # Still keep the entries of other processes within the budget.
+                victims, freed = [], 0
+                for _, victim_size, name in entries:
+                    if self._bytes - freed <= self.max_bytes:
+                        break
+                    victims.append((name, victim_size))
+                    freed += victim_size
+            for name, victim_size in victims:
+                self._evict(name, victim_size)
+            if admit:
+                self._bytes += size
+            logger.debug(
+                "Cache %s %s entry of %d bytes, evicted %d entries",
+                "admitted" if admit else "rejected",
+                kind,
+                size,
+                len(victims),
+            )
+            return admit
+
+    def stats(self):
+        """Return ``dict`` with the statistics of this process, including the hit ratio."""
+        with self._lock:
+            result = dict(self._stats, bytes=self._bytes, max_bytes=self.max_bytes)
+        lookups = result.get("hits", 0) + result.get("misses", 0)
+        result["hit_ratio"] = result.get("hits", 0) / lookups if lookups else None
+        return result
+
+
+def bounded_filesystem(app, config, args, kwargs):
+    """Return ``BoundedFileSystemCache`` for the Flask cache ``config``."""
+    args.insert(0, config["CACHE_DIR"])
+    kwargs.update(
+        max_bytes=config["CACHE_SIZE_LIMIT"],
+        scan_interval=config["CACHE_SCAN_INTERVAL"],
+        ignore_errors=config["CACHE_IGNORE_ERRORS"],
+    )
+    return BoundedFileSystemCache(*args, **kwargs)
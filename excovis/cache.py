@@ -1,24 +1,170 @@
-"""Setup of the Flask cache."""
+"""Setup of the Flask cache.
 
-from flask_caching import Cache
-from logzero import logger
+Also provides ``single_flight()`` for coalescing concurrent identical calls of memoized
+functions such that they wait for one computation instead of repeating it.
+"""
+
+from concurrent.futures import Future
+import functools
+import os
+import threading
+import time
 
-from . import settings
+from flask_caching import Cache, function_namespace
+from logzero import logger
 
-#: The cache configuration, built from ``.settings``.
-CACHE_CONFIG = {
-    "DEBUG": settings.DEBUG,
-    "CACHE_TYPE": settings.CACHE_TYPE,
-    "CACHE_DEFAULT_TIMEOUT": settings.CACHE_DEFAULT_TIMEOUT,
-    "CACHE_DIR": settings.CACHE_DIR,
-    "CACHE_REDIS_URL": settings.CACHE_REDIS_URL,
-}
+from . import metrics, settings, slowlog
+from .exceptions import Superseded
 
 #: The global cache instance.
 cache = Cache()
 
+#: Suffix of the cache keys of the cross-process single-flight locks.
+LOCK_KEY_SUFFIX = "-lock"
+
+#: Futures of the computations in flight in this process, by cache key.
+_in_flight = {}
+#: Lock for ``_in_flight``.
+_in_flight_lock = threading.Lock()
+#: Lock for adding memoize versions, ``add()`` of the file system cache is not atomic.
+_version_lock = threading.Lock()
+
+
+def build_cache_config():
+    """Return the cache configuration, built from ``.settings``."""
+    config = {
+        "DEBUG": settings.DEBUG,
+        "CACHE_TYPE": settings.CACHE_TYPE,
+        "CACHE_DEFAULT_TIMEOUT": settings.CACHE_DEFAULT_TIMEOUT,
+        "CACHE_DIR": settings.CACHE_DIR,
+        "CACHE_REDIS_URL": settings.CACHE_REDIS_URL,
+    }
+    if settings.CACHE_TYPE == "filesystem" and settings.CACHE_SIZE_LIMIT:
+        # Limit the size of the cache, see ``.boundedcache``.
+        config.update(
+            CACHE_TYPE="excovis.boundedcache.bounded_filesystem",
+            CACHE_SIZE_LIMIT=settings.CACHE_SIZE_LIMIT,
+            CACHE_SCAN_INTERVAL=settings.CACHE_SCAN_INTERVAL,
+        )
+    return config
+
 
 def setup_cache(app):
     """Setup the Dash app's Flask app with the cache."""
-    logger.info("Using cache configuration %s", CACHE_CONFIG)
-    cache.init_app(app.server, config=CACHE_CONFIG)
+    config = build_cache_config()
+    logger.info("Using cache configuration %s", config)
+    cache.init_app(app.server, config=config)
+
+
+def _count(memoized, result):
+    """Count the cache ``result`` of a call of ``memoized`` in the metrics and the slow log."""
+    metrics.CACHE_TOTAL.labels(memoized.__name__, result).inc()
+    slowlog.add_cache_result(memoized.__name__, result)
+
+
+def _call_with_lock(memoized, key, args, kwargs):
+    """Call ``memoized`` holding the cross-process lock for ``key`` in the cache backend.
+
+    If another process holds the lock then wait for it to store the result, up to
+    ``settings.SINGLE_FLIGHT_TIMEOUT`` seconds.  The lock is taken with ``add()`` which is atomic
+    for Redis and best effort for the file system cache.
+    """
+    backend = cache.cache
+    if backend.has(key):
+        _count(memoized, "hit")
+        return memoized(*args, **kwargs)
+    lock_key = key + LOCK_KEY_SUFFIX
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_TIMEOUT
+    while not backend.add(lock_key, os.getpid(), timeout=settings.SINGLE_FLIGHT_TIMEOUT):
+        if backend.has(key):
+            _count(memoized, "coalesced")
+            return memoized(*args, **kwargs)
+        elif time.monotonic() > deadline:
+            logger.warning("Timeout waiting for computation of %s, computing it", key)
+            _count(memoized, "miss")
+            return memoized(*args, **kwargs)
+        time.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+    _count(memoized, "miss")
+    try:
+        return memoized(*args, **kwargs)
+    finally:
+        backend.delete(lock_key)
+
+
+def _add_version(memoized):
+    """Add the memoize version of ``memoized`` to the cache unless present.
+
+    ``cache.memoize()`` creates the version on first use, so concurrent first calls would create
+    different versions and thus different cache keys.  ``add()`` lets only one of them win.
+    """
+    fname, _ = function_namespace(memoized.uncached)
+    with _version_lock:
+        cache.cache.add(cache._memvname(fname), cache._memoize_make_version_hash())
+
+
+def single_flight(memoized):
+    """Decorator for coalescing concurrent identical calls of the ``cache.memoize()`` function.
+
+    Only the first of the concurrent calls in a process computes the result, the others wait for
+    its result.  Across processes, the calls are coalesced by a lock in the cache backend.  Note
+    that the concurrent callers in one process receive the same result object.
+    """
+
+    @functools.wraps(memoized)
+    def wrapper(*args, **kwargs):
+        _add_version(memoized)
+        key = memoized.make_cache_key(memoized.uncached, *args, **kwargs)
+        while True:
+            with _in_flight_lock:
+                future = _in_flight.get(key)
+                leader = future is None
+                if leader:
+                    future = _in_flight[key] = Future()
+            if leader:
+                break
+            try:
+                result = future.result()
+                _count(memoized, "coalesced")
+                return result
+            except Superseded:
+                pass  # the leader's request was superseded, not ours, so retry
+        try:
+            result = _call_with_lock(memoized, key, args, kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with _in_flight_lock:
+                del _in_flight[key]
+
+    return wrapper
+
+
+def process_memoize(func):
+    """Decorator keeping the results of ``func`` in process memory as well.
+
+    Used in front of ``cache.memoize()`` for results that are loaded before forking the server
+    workers, such that these share them copy-on-write.  The results expire after
+    ``settings.CACHE_DEFAULT_TIMEOUT`` seconds like the entries of the cache, and are then loaded
+    from the cache again.  ``wrapper.cache_clear()`` drops all results of this process.
+    """
+    results = {}
+    lock = threading.Lock()
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        timeout = float(settings.CACHE_DEFAULT_TIMEOUT or 0)
+        with lock:
+            loaded, result = results.get(args, (None, None))
+        if loaded is not None and (not timeout or time.monotonic() - loaded < timeout):
+            return result
+        result = func(*args)
+        with lock:
+            results[args] = (time.monotonic(), result)
+        return result
+
+    wrapper.cache_clear = results.clear
+    return wrapper
@@ -4,26 +4,68 @@ Each ``register_*`` function sets up callbacks for one aspect of the app.  This
 any component building itself.  Instead, this is done in the module ``.ui``.
 """
 
-import base64
-from io import BytesIO
+import functools
+import urllib.parse
 
 import dash
 import dash_html_components as html
-import dash_table
-from intervaltree import Interval, IntervalTree
 from logzero import logger
-import pandas as pd
 from natsort import natsorted
 
-from . import plot, genes, store
+from . import (
+    accesslog,
+    admission,
+    cancel,
+    downloads,
+    interactive,
+    jobs,
+    metrics,
+    plot,
+    genes,
+    settings,
+    store,
+    table,
+    ui,
+)
 
 
-def fig_to_uri(in_fig, **save_args):
-    out_img = BytesIO()
-    in_fig.savefig(out_img, format="png", **save_args)
-    out_img.seek(0)  # rewind file
-    encoded = base64.b64encode(out_img.read()).decode("ascii").replace("\n", "")
-    return "data:image/png;base64,{}".format(encoded)
+def image_url(digest):
+    """Return the URL that serves the stored image with the given ``digest``."""
+    return "%s/plots/%s.png" % (settings.PUBLIC_URL_PREFIX, digest)
+
+
+def png_to_url(png):
+    """Store PNG ``bytes`` in the cache and return the URL that serves them."""
+    return image_url(store.store_image(png))
+
+
+def busy_message():
+    """Return message for display while the server is too busy and the request is retried."""
+    return html.Div("The server is busy, retrying...", className="text-center text-warning")
+
+
+def retry_when_busy(*busy_result):
+    """Decorator for callbacks whose last output is ``disabled`` of a retry ``dcc.Interval``.
+
+    The interval is enabled if the callback raises ``admission.Busy`` such that it is retried, in
+    this case the other outputs are set to ``busy_result``.  The callback receives the interval's
+    ``n_intervals`` as its last input.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            try:
+                result = func(*args)
+            except admission.Busy as e:
+                logger.info("%s, retrying", e)
+                metrics.BUSY_TOTAL.labels(func.__name__).inc()
+                return busy_result + (False,)
+            return tuple(result) + (True,)
+
+        return wrapper
+
+    return decorator
 
 
 def register_transcript_select(app):
@@ -36,6 +78,7 @@ def register_transcript_select(app):
         ],
         [dash.dependencies.Input("input_gene", "value")],
     )
+    @metrics.instrumented_callback("transcript_options")
     def transcript_options(gene_symbol):
         if not gene_symbol:
             return [], []
@@ -55,88 +98,254 @@ def register_transcript_select(app):
 def register_plot(app):
     """Register the display of the coverage plot."""
 
+    # Only forward display options in image modes, so the interactive mode is not re-rendered.
+    app.clientside_callback(
+        dash.dependencies.ClientsideFunction(namespace="excovis", function_name="imageOptions"),
+        dash.dependencies.Output("image-options", "data"),
+        [
+            dash.dependencies.Input("input_%s" % s, "value")
+            for s in ("ymax", "thresholds", "plot_mode")
+        ],
+    )
+
     @app.callback(
-        dash.dependencies.Output("page-plot", "children"),
+        [
+            dash.dependencies.Output("page-plot", "children"),
+            dash.dependencies.Output("plot-job", "data"),
+            dash.dependencies.Output("plot-retry", "disabled"),
+        ],
         [
             dash.dependencies.Input("input_%s" % s, "value")
-            for s in ("padding", "ymax", "transcript", "samples")
+            for s in ("padding", "transcript", "samples", "plot_mode")
+        ]
+        + [
+            dash.dependencies.Input("image-options", "data"),
+            dash.dependencies.Input("plot-job-result", "data"),
+            dash.dependencies.Input("plot-retry", "n_intervals"),
+        ],
+        [
+            dash.dependencies.State("plot-job", "data"),
+            dash.dependencies.State("session-id", "data"),
         ],
     )
-    def render_plot(padding, ymax, gene, samples):
-        if not gene or not samples:
-            return html.Div(
-                "After selecting gene and sample(s), the coverage plot will appear here.",
-                className="text-center",
+    @metrics.instrumented_callback("render_plot")
+    @cancel.cancellable("plot")
+    @retry_when_busy(busy_message(), None)
+    def render_plot(padding, gene, samples, plot_mode, image_options, job_result, _n_retries, job):
+        triggered = [t["prop_id"] for t in dash.callback_context.triggered]
+        if triggered == ["plot-job-result.data"]:
+            # Display the result of the background job if it is still the current one.
+            if not job or not job_result or job_result["id"] != job["id"]:
+                raise dash.exceptions.PreventUpdate
+            elif job_result.get("error"):
+                return (
+                    html.Div(
+                        "Rendering the plot failed: %s" % job_result["error"],
+                        className="text-center text-danger",
+                    ),
+                    None,
+                )
+            else:
+                return html.Img(id="cov-plot", src=image_url(job_result["digest"])), None
+        elif plot_mode not in ("image", "heatmap") or not image_options:
+            return [], None
+        elif not gene or not samples:
+            return (
+                html.Div(
+                    "After selecting gene and sample(s), the coverage plot will appear here.",
+                    className="text-center",
+                ),
+                None,
+            )
+        accesslog.record(gene, samples)
+        args = (
+            padding,
+            image_options["ymax"],
+            gene,
+            samples,
+            tuple(image_options["thresholds"]),
+            True if plot_mode == "heatmap" else None,
+        )
+        if jobs.enabled() and len(samples) >= settings.JOB_MIN_SAMPLES:
+            # Large plots are rendered in the background, see ``poll_plot_job()``.
+            # The image of a done job may have been evicted from the cache in the meantime.
+            return [], {"id": jobs.submit(plot.render_plot_job, *args, valid=store.has_image)}
+        png = plot.render_plot(*args)
+        return html.Img(id="cov-plot", src=png_to_url(png)), None
+
+    @app.callback(
+        [
+            dash.dependencies.Output("plot-job-interval", "disabled"),
+            dash.dependencies.Output("plot-job-progress", "children"),
+            dash.dependencies.Output("plot-job-result", "data"),
+        ],
+        [
+            dash.dependencies.Input("plot-job", "data"),
+            dash.dependencies.Input("plot-job-interval", "n_intervals"),
+        ],
+    )
+    @metrics.instrumented_callback("poll_plot_job")
+    def poll_plot_job(job, _n_intervals):
+        if not job:
+            return True, [], dash.no_update
+        state = jobs.get_state(job["id"])
+        if state is None:
+            return True, [], {"id": job["id"], "error": "The job was lost, please try again."}
+        elif state["state"] == jobs.DONE:
+            return True, [], {"id": job["id"], "digest": state["result"]}
+        elif state["state"] == jobs.FAILED:
+            return True, [], {"id": job["id"], "error": state["message"]}
+        else:
+            return (
+                False,
+                ui.render_job_progress(state["message"], state["progress"]),
+                dash.no_update,
             )
+
+
+def register_graph(app):
+    """Register the display of the interactive coverage plot."""
+
+    @app.callback(
+        [
+            dash.dependencies.Output("coverage-store", "data"),
+            dash.dependencies.Output("page-graph", "style"),
+            dash.dependencies.Output("graph-retry", "disabled"),
+        ],
+        [
+            dash.dependencies.Input("input_%s" % s, "value")
+            for s in ("padding", "transcript", "samples", "plot_mode")
+        ]
+        + [
+            dash.dependencies.Input("cov-graph", "relayoutData"),
+            dash.dependencies.Input("graph-retry", "n_intervals"),
+        ],
+        [dash.dependencies.State("session-id", "data")],
+    )
+    @metrics.instrumented_callback("load_graph_data")
+    @cancel.cancellable("graph")
+    @retry_when_busy(dash.no_update, {})
+    def load_graph_data(padding, tx_accession, samples, plot_mode, relayout_data, _n_retries):
+        if plot_mode != "interactive" or not tx_accession or not samples:
+            return None, {"display": "none"}
+        accesslog.record(tx_accession, samples)
+        triggered = [t["prop_id"] for t in dash.callback_context.triggered]
+        if triggered == ["cov-graph.relayoutData"]:
+            if not interactive.relayout_changes_x(relayout_data):
+                raise dash.exceptions.PreventUpdate
+            x_range = interactive.relayout_range(relayout_data)
         else:
-            mpl_fig = plot.render_plot(padding, ymax, gene, samples)
-            return html.Img(id="cov-plot", src=fig_to_uri(mpl_fig))
+            x_range = None
+        return interactive.load_store_data(padding, tx_accession, samples, x_range), {}
+
+    # The figure is built in the browser from the stored data, ``ymax`` and the thresholds.
+    app.clientside_callback(
+        dash.dependencies.ClientsideFunction(namespace="excovis", function_name="renderCoverage"),
+        dash.dependencies.Output("cov-graph", "figure"),
+        [dash.dependencies.Input("coverage-store", "data")]
+        + [dash.dependencies.Input("input_%s" % s, "value") for s in ("ymax", "thresholds")],
+    )
 
 
 def register_table(app):
     """Register the display of the coverage table."""
 
     @app.callback(
-        dash.dependencies.Output("page-table", "children"),
+        [
+            dash.dependencies.Output("page-table", "style"),
+            dash.dependencies.Output("coverage-table-title", "children"),
+            dash.dependencies.Output("coverage-table", "columns"),
+            dash.dependencies.Output("coverage-table", "data"),
+            dash.dependencies.Output("coverage-table", "page_count"),
+            dash.dependencies.Output("table-retry", "disabled"),
+        ],
         [
             dash.dependencies.Input("input_%s" % s, "value")
             for s in ("transcript", "samples", "aggregation")
-        ],
+        ]
+        + [
+            dash.dependencies.Input("coverage-table", s)
+            for s in ("page_current", "page_size", "sort_by", "filter_query")
+        ]
+        + [dash.dependencies.Input("table-retry", "n_intervals")],
+        [dash.dependencies.State("session-id", "data")],
+    )
+    @metrics.instrumented_callback("render_table")
+    @cancel.cancellable("table")
+    @retry_when_busy(
+        {},
+        "Coverage Table (the server is busy, retrying...)",
+        dash.no_update,
+        dash.no_update,
+        dash.no_update,
     )
-    def render_plot(tx_accession, samples, aggregation):
+    def render_table(
+        tx_accession,
+        samples,
+        aggregation,
+        page_current,
+        page_size,
+        sort_by,
+        filter_query,
+        _n_retries,
+    ):
         if not tx_accession or not samples:
-            return []
+            return {"display": "none"}, None, [], [], 1
         else:
-            transcript = genes.load_transcripts()[tx_accession]
-            tree = IntervalTree([Interval(exon.begin, exon.end) for exon in transcript.exons])
-            coverage_df = store.load_coverage_df(0, tx_accession, samples)
-            # Filter for on-target coverage only
-            coverage_df = coverage_df[
-                coverage_df.apply(lambda x: tree.overlaps_point(x["pos"] - 1), axis=1)
-            ].drop(columns=["chrom", "pos"])
-            # Make data tidy
-            coverage_df = pd.melt(
-                frame=coverage_df, id_vars=["exon_no"], var_name="sample", value_name="coverage"
+            accesslog.record(tx_accession, samples)
+            # Look up the cached statistic, only the current page is sent to the client.
+            table_df = store.load_coverage_table(
+                tx_accession,
+                samples,
+                plot.coverage_thresholds(),
+                aggregation,
+                sort_by,
+                filter_query,
             )
-            orig_coverage_df = coverage_df.copy(deep=True)
-            # Aggregate per sample and exon.
-            grouped_df = coverage_df.groupby(["exon_no", "sample"])
-            if aggregation == "min":
-                coverage_df = grouped_df.min()
-            elif aggregation == "max":
-                coverage_df = grouped_df.max()
-            elif aggregation == "median":
-                coverage_df = grouped_df.median()
-            else:  # if aggregation == "mean":
-                coverage_df = grouped_df.mean()
-            # Make each sample its own column again
-            coverage_df = coverage_df.reset_index()
-            coverage_df["coverage"] = coverage_df["coverage"].apply(lambda x: round(x, 1))
-            coverage_df = coverage_df.pivot(
-                index="exon_no", columns="sample", values="coverage"
-            ).reset_index()
-            coverage_df.insert(0, "feature", "exon")
-            # Aggregate per sample.
-            grouped_df2 = orig_coverage_df.groupby(["sample"])
-            if aggregation == "min":
-                coverage_df2 = grouped_df2.min()
-            elif aggregation == "max":
-                coverage_df2 = grouped_df2.max()
-            elif aggregation == "median":
-                coverage_df2 = grouped_df2.median()
-            else:  # if aggregation == "mean":
-                coverage_df2 = grouped_df2.mean()
-            # Make each sample its own column again
-            coverage_df2 = coverage_df2.reset_index()
-            coverage_df2["coverage"] = coverage_df2["coverage"].apply(lambda x: round(x, 1))
-            coverage_df2 = coverage_df2.pivot(columns="sample", values="coverage")
-            coverage_df2.insert(0, "exon_no", None)
-            coverage_df2.insert(0, "feature", "transcript")
-            return [
-                html.H3("Coverage Table (%s)" % aggregation),
-                dash_table.DataTable(
-                    columns=[{"name": i, "id": i} for i in coverage_df.columns],
-                    data=pd.concat([coverage_df2, coverage_df]).to_dict("records"),
-                    sort_action="native",
-                ),
-            ]
+            records, page_count = table.page_df(table_df, page_current, page_size)
+            return (
+                {},
+                "Coverage Table (%s)" % aggregation,
+                [{"name": i, "id": i} for i in table_df.columns],
+                records,
+                page_count,
+            )
+
+
+def register_downloads(app):
+    """Register updating of the download links."""
+
+    @app.callback(
+        dash.dependencies.Output("download-links", "children"),
+        [
+            dash.dependencies.Input("input_%s" % s, "value")
+            for s in ("padding", "transcript", "samples")
+        ],
+    )
+    @metrics.instrumented_callback("render_download_links")
+    def render_download_links(padding, tx_accession, samples):
+        if not tx_accession or not samples:
+            return []
+        query_coverage = urllib.parse.urlencode(
+            [("padding", padding)] + [("sample", sample) for sample in samples]
+        )
+        query_stats = urllib.parse.urlencode(
+            [("sample", sample) for sample in samples]
+            + [("threshold", threshold) for threshold in plot.coverage_thresholds()]
+        )
+        children = []
+        for title, path, query in (
+            ("per-base coverage", "coverage", query_coverage),
+            ("exon statistics", "exon-stats", query_stats),
+        ):
+            children.append(html.Span("Download %s: " % title, className="ml-3"))
+            for fmt in downloads.MIME_TYPES:
+                url = "%s/download/%s/%s.%s?%s" % (
+                    settings.PUBLIC_URL_PREFIX,
+                    path,
+                    urllib.parse.quote(tx_accession),
+                    fmt,
+                    query,
+                )
+                children.append(html.A(fmt.upper(), href=url, className="mr-2"))
+        return children
@@ -0,0 +1,111 @@
+"""Cancellation of superseded callback computations.
+
+Each browser session (see the ``session-id`` store in ``.ui``) counts the requests for each
+callback output in a generation counter in the Flask cache.  A callback wrapped with
+``cancellable()`` runs with the generation of its request in a thread-local token.  Long
+running code calls ``check()`` that raises ``Superseded`` once a newer request for the same
+session and output has started, such that BAM reads and renders are abandoned and the worker is
+freed.  The callback then does not update its output.
+"""
+
+import concurrent.futures
+import functools
+import threading
+import time
+
+import attr
+import dash
+from logzero import logger
+
+from . import metrics, settings
+from .cache import cache
+from .exceptions import Superseded
+
+#: Prefix of the cache keys of the generation counters.
+GENERATION_KEY_PREFIX = "excovis-generation-"
+#: Prefix of the cache keys of the cancellation counters.
+CANCELLED_KEY_PREFIX = "excovis-cancelled-"
+
+#: The outputs of the cancellable callbacks.
+OUTPUTS = ("plot", "graph", "table")
+
+#: The token of the current thread.
+_local = threading.local()
+
+
+@attr.s(auto_attribs=True)
+class Token:
+    """The generation of the request that the current thread computes."""
+
+    #: Cache key of the generation counter.
+    key: str
+    #: Generation of the request.
+    generation: int
+    #: ``time.monotonic()`` of the last check.
+    checked: float = 0.0
+
+
+def current():
+    """Return ``Token`` of the current thread or ``None``."""
+    return getattr(_local, "token", None)
+
+
+def check():
+    """Raise ``Superseded`` if a newer request has started, at most every check interval."""
+    token = current()
+    if token is None:
+        return
+    now = time.monotonic()
+    if now - token.checked < settings.CANCEL_CHECK_INTERVAL:
+        return
+    token.checked = now
+    latest = cache.get(token.key)
+    if latest is not None and latest > token.generation:
+        raise Superseded("Request %s/%d was superseded" % (token.key, token.generation))
+
+
+def wait(future):
+    """Return result of ``future``, cancel it and raise ``Superseded`` if superseded first."""
+    while True:
+        try:
+            return future.result(timeout=settings.CANCEL_CHECK_INTERVAL)
+        except concurrent.futures.TimeoutError:
+            try:
+                check()
+            except Superseded:
+                future.cancel()
+                raise
+
+
+def cancellable(output):
+    """Decorator for Dash callbacks whose computation is abandoned when superseded.
+
+    The decorated callback receives the ``session-id`` store data as additional last argument.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            *args, session_id = args
+            if not session_id:
+                return func(*args)
+            key = "%s%s-%s" % (GENERATION_KEY_PREFIX, session_id, output)
+            _local.token = Token(key, cache.cache.inc(key) or 0, time.monotonic())
+            try:
+                return func(*args)
+            except Superseded as e:
+                logger.debug("%s", e)
+                cache.cache.inc(CANCELLED_KEY_PREFIX + output)
+                metrics.CANCELLED_TOTAL.labels(output).inc()
+                raise dash.exceptions.PreventUpdate
+            finally:
+                _local.token = None
+
+        return wrapper
+
+    return decorator
+
+
+def cancelled_counts():
+    """Return ``dict`` with the number of cancelled computations for each output."""
+    return {output: cache.get(CANCELLED_KEY_PREFIX + output) or 0 for output in OUTPUTS}
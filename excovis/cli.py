@@ -11,8 +11,15 @@ import warnings
 import logzero
 
 from . import __version__
+from .loadtest import run as run_loadtest
+from .loadtest import setup_argparse as setup_argparse_loadtest
+from .replay import run as run_replay
+from .replay import setup_argparse as setup_argparse_replay
+from .synth import run as run_synth
+from .synth import setup_argparse as setup_argparse_synth
 from .webserver import run as run_webserver
 from .webserver import setup_argparse as setup_argparse_webserver
+from .webserver import setup_argparse_serve as setup_argparse_serve
 
 
 def run_nocmd(_, parser):
@@ -31,6 +38,23 @@ def main(argv=None):
     subparsers = parser.add_subparsers(dest="cmd")
 
     setup_argparse_webserver(subparsers.add_parser("run", help="Run the ExCoVis web server."))
+    setup_argparse_serve(
+        subparsers.add_parser("serve", help="Run ExCoVis in the multi-process production server.")
+    )
+
+    setup_argparse_replay(
+        subparsers.add_parser("replay", help="Replay the requests of a slow log offline.")
+    )
+
+    setup_argparse_synth(
+        subparsers.add_parser("synth", help="Write synthetic BAM and transcript files.")
+    )
+
+    setup_argparse_loadtest(
+        subparsers.add_parser(
+            "loadtest", help="Drive a running ExCoVis server with simulated users."
+        )
+    )
 
     args = parser.parse_args(argv)
 
@@ -42,7 +66,14 @@ def main(argv=None):
     logzero.loglevel(level=level)
 
     # Handle the actual command line.
-    cmds = {None: run_nocmd, "run": run_webserver}
+    cmds = {
+        None: run_nocmd,
+        "run": run_webserver,
+        "serve": run_webserver,
+        "replay": run_replay,
+        "synth": run_synth,
+        "loadtest": run_loadtest,
+    }
 
     # Disable duplicated crypto warnings from paramiko, triggered by fs.sshfs.
     warnings.filterwarnings(
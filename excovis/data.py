@@ -8,11 +8,14 @@ This module is unaware of the Dash app.
 import hashlib
 from urllib.parse import urlunparse as _urlunparse
 import re
+import typing
 
 import attr
 import fs.path
 import fs.tools
 from fs.osfs import OSFS
+import numpy as np
+import pandas as pd
 import pysam
 
 from . import settings
@@ -34,6 +37,45 @@ class MetaData:
     sample: str
 
 
+@attr.s(auto_attribs=True, frozen=True)
+class CoverageArrays:
+    """Columnar representation of a coverage data frame as returned by ``store.load_coverage_df()``.
+
+    This is used for passing coverage into worker processes without pickling ``DataFrame``
+    objects.
+    """
+
+    #: Chromosome name.
+    chrom: str
+    #: 1-based positions.
+    pos: np.ndarray
+    #: Exon number of each position.
+    exon_no: np.ndarray
+    #: Sample names.
+    samples: typing.Tuple[str, ...]
+    #: Depth of coverage, one row per sample, one column per position.
+    depths: np.ndarray
+
+    @staticmethod
+    def from_df(df):
+        """Construct from coverage data frame."""
+        samples = tuple(df.columns[3:])
+        return CoverageArrays(
+            chrom=df["chrom"].iloc[0] if len(df) else "",
+            pos=df["pos"].to_numpy(dtype=np.int64),
+            exon_no=df["exon_no"].to_numpy(dtype=np.int32),
+            samples=samples,
+            depths=df.loc[:, list(samples)].to_numpy(dtype=np.int32).T.reshape(len(samples), -1),
+        )
+
+    def to_df(self):
+        """Convert back into coverage data frame."""
+        df = pd.DataFrame({"chrom": self.chrom, "pos": self.pos, "exon_no": self.exon_no})
+        for sample, depths in zip(self.samples, self.depths):
+            df[sample] = depths
+        return df
+
+
 def redacted_urlunparse(url, redact_with="***"):
     """``urlunparse()`` but redact password."""
     netloc = []
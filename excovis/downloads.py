@@ -0,0 +1,146 @@
+"""Flask routes for downloading the data behind the coverage plot and table.
+
+The responses are streamed in chunks of ``CHUNK_ROWS`` rows that are generated from the cached
+data frames such that the whole file is never materialized in memory.  Parquet output requires
+the optional ``pyarrow`` package.
+"""
+
+import flask
+
+from . import admission, genes, settings, store, stats
+from .exceptions import ExcovisException
+
+#: Number of data frame rows per streamed chunk.
+CHUNK_ROWS = 10_000
+
+#: Mapping from supported format to MIME type.
+MIME_TYPES = {
+    "csv": "text/csv",
+    "tsv": "text/tab-separated-values",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+#: The blueprint with the download routes.
+blueprint = flask.Blueprint("downloads", __name__)
+
+
+def iter_delimited(df, sep):
+    """Yield ``df`` as delimited text in chunks of ``CHUNK_ROWS`` rows."""
+    yield df.iloc[:0].to_csv(sep=sep, index=False)
+    for begin in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[begin : begin + CHUNK_ROWS].to_csv(sep=sep, index=False, header=False)
+
+
+class _ChunkSink:
+    """Write-only file-like object that collects the written chunks for streaming."""
+
+    def __init__(self):
+        self.chunks = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def pop(self):
+        """Return and forget the chunks written so far."""
+        result = b"".join(self.chunks)
+        self.chunks = []
+        return result
+
+
+def iter_parquet(df):
+    """Yield ``df`` as Parquet file with one row group for each ``CHUNK_ROWS`` rows."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for begin in range(0, len(df), CHUNK_ROWS):
+            chunk = df.iloc[begin : begin + CHUNK_ROWS]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.pop()
+    yield sink.pop()
+
+
+def stream_df(df, name, fmt):
+    """Return streamed response with ``df`` in format ``fmt`` as attachment ``name.fmt``."""
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa
+        except ImportError:
+            flask.abort(404, "Parquet export requires the pyarrow package")
+        chunks = iter_parquet(df)
+    else:
+        chunks = iter_delimited(df, "\t" if fmt == "tsv" else ",")
+    return flask.Response(
+        chunks,
+        mimetype=MIME_TYPES[fmt],
+        headers={"Content-Disposition": 'attachment; filename="%s.%s"' % (name, fmt)},
+    )
+
+
+def abort_busy():
+    """Abort with "503 Service Unavailable" asking the client to retry later."""
+    flask.abort(
+        flask.Response(
+            "The server is busy, please retry later.",
+            status=503,
+            headers={"Retry-After": str(max(1, settings.BUSY_RETRY_INTERVAL // 1000))},
+        )
+    )
+
+
+def _get_args(tx_accession, fmt):
+    """Check common arguments and return transcript and the list of samples."""
+    transcript = genes.load_transcripts().get(tx_accession)
+    samples = flask.request.args.getlist("sample")
+    if fmt not in MIME_TYPES or not transcript or not samples:
+        flask.abort(404)
+    return transcript, samples
+
+
+@blueprint.route("/download/coverage/<tx_accession>.<fmt>")
+def download_coverage(tx_accession, fmt):
+    """Download per-base coverage of the ``sample`` arguments, ``padding`` around the exons."""
+    transcript, samples = _get_args(tx_accession, fmt)
+    padding = flask.request.args.get("padding", 0, type=int)
+    if not 0 <= padding <= settings.MAX_EXON_PADDING:
+        # Coverage is only loaded up to the maximal padding of the UI slider.
+        flask.abort(400, "The padding must be between 0 and %d" % settings.MAX_EXON_PADDING)
+    try:
+        coverage_df = store.load_coverage_df(padding, tx_accession, samples)
+    except admission.Busy:
+        abort_busy()
+    except ExcovisException as e:
+        flask.abort(404, str(e))
+    coverage_df = coverage_df[
+        genes.on_target_mask(transcript, coverage_df["pos"].values, padding)
+    ].drop_duplicates("pos")
+    return stream_df(coverage_df, "coverage-%s" % tx_accession, fmt)
+
+
+@blueprint.route("/download/exon-stats/<tx_accession>.<fmt>")
+def download_exon_stats(tx_accession, fmt):
+    """Download per-exon coverage statistics of the ``sample`` arguments."""
+    _, samples = _get_args(tx_accession, fmt)
+    thresholds = flask.request.args.getlist("threshold", type=int)
+    try:
+        coverage_stats = store.load_coverage_stats(tx_accession, samples, tuple(thresholds))
+    except admission.Busy:
+        abort_busy()
+    except ExcovisException as e:
+        flask.abort(404, str(e))
+    return stream_df(stats.to_long_df(coverage_stats), "exon-stats-%s" % tx_accession, fmt)
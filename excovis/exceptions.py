@@ -3,3 +3,7 @@
 
 class ExcovisException(Exception):
     """Base class for exceptions in ExCoVis."""
+
+
+class Superseded(ExcovisException):
+    """Raised when the computation for a request is abandoned because a newer one started."""
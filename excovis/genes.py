@@ -6,8 +6,10 @@ from urllib.request import urlopen
 
 import attr
 from logzero import logger
+import numpy as np
 
-from .cache import cache
+from . import metrics, settings
+from .cache import cache, process_memoize, single_flight
 
 #: URL to ``ncbiRefSeq.txt.gz`` file for GRCh37.
 NCBI_REF_SEQ_GRCH37 = "http://hgdownload.cse.ucsc.edu/goldenPath/hg19/database/ncbiRefSeq.txt.gz"
@@ -50,28 +52,64 @@ class Transcript:
     exons: typing.Tuple[Exon]
 
 
-@cache.memoize()
-def load_transcripts(url=NCBI_REF_SEQ_GRCH37):
+def _parse_transcripts(inputf):
     result = {}
-    logger.info("Opening URL %s...", url)
-    # with urlopen(url) as gzf:
-    #     logger.info("Opening .gz file...")
-    #     with gzip.GzipFile(fileobj=gzf, mode="r") as inputf:
-    with gzip.open("/tmp/ncbiRefSeq.txt.gz") as inputf:
-        for line in inputf:
-            arr = line.decode("utf-8").strip().split("\t")
-            begins = list(map(int, arr[9].split(",")[:-1]))
-            ends = list(map(int, arr[10].split(",")[:-1]))
-            transcript = Transcript(
-                gene_symbol=arr[12],
-                tx_accession=arr[1],
-                strand=arr[3],
-                chrom=arr[2][3:],
-                tx_begin=int(arr[4]),
-                tx_end=int(arr[5]),
-                cds_begin=int(arr[6]),
-                cds_end=int(arr[7]),
-                exons=tuple(Exon(begin=begin, end=end) for begin, end in zip(begins, ends)),
-            )
-            result[transcript.tx_accession] = transcript
+    for line in inputf:
+        arr = line.decode("utf-8").strip().split("\t")
+        begins = list(map(int, arr[9].split(",")[:-1]))
+        ends = list(map(int, arr[10].split(",")[:-1]))
+        transcript = Transcript(
+            gene_symbol=arr[12],
+            tx_accession=arr[1],
+            strand=arr[3],
+            chrom=arr[2][3:],
+            tx_begin=int(arr[4]),
+            tx_end=int(arr[5]),
+            cds_begin=int(arr[6]),
+            cds_end=int(arr[7]),
+            exons=tuple(Exon(begin=begin, end=end) for begin, end in zip(begins, ends)),
+        )
+        result[transcript.tx_accession] = transcript
     return result
+
+
+def read_transcripts(path):
+    """Read the transcripts from the UCSC ``ncbiRefSeq.txt.gz`` file or URL at ``path``.
+
+    Returns ``dict`` mapping transcript accession to ``Transcript``.
+    """
+    logger.info("Opening %s...", path)
+    if "://" in path:
+        with urlopen(path) as gzf:
+            with gzip.GzipFile(fileobj=gzf, mode="r") as inputf:
+                return _parse_transcripts(inputf)
+    else:
+        with gzip.open(path) as inputf:
+            return _parse_transcripts(inputf)
+
+
+# Also kept in process memory, shared copy-on-write with forked server workers.
+@process_memoize
+@metrics.timed("load_transcripts")
+@single_flight
+@cache.memoize()
+def _load_transcripts(path):
+    return read_transcripts(path)
+
+
+def load_transcripts(path=None):
+    """Load the transcripts from ``path``, defaults to ``settings.TRANSCRIPTS_PATH``."""
+    return _load_transcripts(path or settings.TRANSCRIPTS_PATH)
+
+
+def on_target_mask(transcript, positions, padding=0):
+    """Return boolean mask of the 1-based ``positions`` that fall into exons of ``transcript``.
+
+    The exons are extended by ``padding`` bases on each side.
+    """
+    exons = sorted(transcript.exons, key=lambda exon: exon.begin)
+    begins = np.array([exon.begin - padding for exon in exons])
+    ends = np.array([exon.end + padding for exon in exons])
+    pos = np.asarray(positions) - 1
+    idx = np.searchsorted(begins, pos, side="right") - 1
+    return (idx >= 0) & (pos < ends[np.maximum(idx, 0)])
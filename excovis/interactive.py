@@ -0,0 +1,151 @@
+"""Code for the interactive coverage plot.
+
+The interactive plot is drawn by plotly in the browser using WebGL.  The server only sends
+coverage that has been downsampled to minimum and maximum per bin for the currently visible
+range.  When the user zooms in, the finer bins are fetched through the ``relayoutData`` of the
+graph.  The figure itself is built by a clientside callback such that display-only changes
+(maximal coverage and thresholds) do not need a round trip to the server.
+"""
+
+import base64
+import re
+
+import numpy as np
+
+from . import data, genes, metrics, settings, store
+
+#: Height of each sample's coverage track in pixels.
+TRACK_HEIGHT = 150
+
+#: Largest depth that can be encoded for the browser, larger values are clipped.
+UINT16_MAX = 65535
+
+#: Regular expression for extracting x axis range changes from plotly ``relayoutData``.
+_RE_RANGE = re.compile(r"^xaxis\d*\.range\[([01])\]$")
+#: Regular expression for detecting x axis range changes and resets in plotly ``relayoutData``.
+_RE_X_CHANGE = re.compile(r"^xaxis\d*\.(range\[[01]\]|autorange)$")
+
+
+def projected_positions(transcript, exon_padding):
+    """Return sorted array of the genome positions that are displayed for ``transcript``."""
+    return np.unique(
+        np.concatenate(
+            [
+                np.arange(exon.begin - exon_padding, exon.end + exon_padding + 1)
+                for exon in transcript.exons
+            ]
+        )
+    )
+
+
+def project(positions, pos):
+    """Project genome positions ``pos`` into the plot space defined by ``positions``.
+
+    Return pair of projected positions and mask of the elements of ``pos`` that are displayed.
+    """
+    idx = np.searchsorted(positions, pos)
+    idx_clipped = np.minimum(idx, len(positions) - 1)
+    mask = positions[idx_clipped] == pos
+    return idx_clipped[mask], mask
+
+
+def downsample(xs, depths, begin, end, n_bins):
+    """Downsample coverage to minimum and maximum per bin.
+
+    ``xs`` is the sorted array of positions and ``depths`` the depth matrix with one row per
+    sample.  Only positions in ``[begin, end]`` are considered.  Return triple of bin positions,
+    minimal and maximal depth per bin and sample.  If there are not more than ``n_bins`` positions
+    then the data is returned unchanged.
+    """
+    lo, hi = np.searchsorted(xs, [begin, end + 1])
+    xs = xs[lo:hi]
+    depths = depths[:, lo:hi]
+    if len(xs) <= n_bins:
+        return xs, depths, depths
+    edges = np.linspace(xs[0], xs[-1] + 1, n_bins + 1)
+    starts = np.unique(np.searchsorted(xs, edges[:-1]))
+    return (
+        xs[starts],
+        np.minimum.reduceat(depths, starts, axis=1),
+        np.maximum.reduceat(depths, starts, axis=1),
+    )
+
+
+def relayout_changes_x(relayout_data):
+    """Return whether plotly ``relayout_data`` describes a change of the x axis range."""
+    return any(_RE_X_CHANGE.match(key) for key in (relayout_data or {}))
+
+
+def relayout_range(relayout_data):
+    """Extract the x range from plotly ``relayout_data``, ``None`` if reset or missing."""
+    result = [None, None]
+    for key, value in (relayout_data or {}).items():
+        m = _RE_RANGE.match(key)
+        if m:
+            result[int(m.group(1))] = value
+    if None in result:
+        return None
+    else:
+        return tuple(result)
+
+
+def encode_array(arr, dtype):
+    """Encode ``arr`` as base64 string of the little-endian ``dtype`` values."""
+    return base64.b64encode(np.ascontiguousarray(arr, dtype=dtype).tobytes()).decode("ascii")
+
+
+def build_store_data(transcript, coverage, exon_padding, x_range=None):
+    """Build the compact representation of the ``data.CoverageArrays`` in ``coverage``.
+
+    The result is stored in the ``coverage-store`` component and turned into the plotly figure
+    by the clientside callback ``excovis.renderCoverage`` from ``assets/excovis.js``.  Depths are
+    encoded as base64 unsigned 16 bit integers with one row per sample.
+    """
+    positions = projected_positions(transcript, exon_padding)
+    xs, mask = project(positions, coverage.pos)
+    order = np.argsort(xs, kind="stable")
+    xs = xs[order]
+    depths = coverage.depths[:, mask][:, order]
+
+    if x_range:
+        begin, end = max(0, int(x_range[0])), int(np.ceil(x_range[1]))
+    else:
+        begin, end = 0, len(positions) - 1
+    with metrics.stage("downsample"):
+        bin_xs, bin_mins, bin_maxs = downsample(xs, depths, begin, end, settings.INTERACTIVE_BINS)
+
+    # Compute positions of vertical lines indicating exon jumps and label exons at their centers.
+    jumps = np.flatnonzero(np.diff(positions) != 1) + 1
+    exons = sorted(transcript.exons, key=lambda exon: exon.begin)
+    centers = np.searchsorted(positions, [(exon.begin + exon.end) // 2 for exon in exons])
+    if transcript.strand == "+":
+        labels = ["exon %d" % (i + 1) for i in range(len(exons))]
+    else:
+        labels = ["exon %d" % (len(exons) - i) for i in range(len(exons))]
+
+    with metrics.stage("encode"):
+        encoded = {
+            "x": encode_array(bin_xs, "<i4"),
+            "min": encode_array(np.minimum(bin_mins, UINT16_MAX), "<u2"),
+            "max": encode_array(np.minimum(bin_maxs, UINT16_MAX), "<u2"),
+        }
+    return {
+        "title": "Coverage for transcript %s of gene %s"
+        % (transcript.tx_accession, transcript.gene_symbol),
+        "uirevision": "%s-%s" % (transcript.tx_accession, exon_padding),
+        "trackHeight": TRACK_HEIGHT,
+        "samples": list(coverage.samples),
+        **encoded,
+        "jumps": jumps.tolist(),
+        "tickvals": centers.tolist(),
+        "ticktext": labels,
+        "range": list(x_range) if x_range else None,
+    }
+
+
+def load_store_data(exon_padding, tx_accession, samples, x_range=None):
+    """Load coverage and build data for the ``coverage-store`` component."""
+    transcript = genes.load_transcripts()[tx_accession]
+    coverage_df = store.load_coverage_df(exon_padding, tx_accession, samples)
+    coverage = data.CoverageArrays.from_df(coverage_df)
+    return build_store_data(transcript, coverage, exon_padding, x_range)
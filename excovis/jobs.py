@@ -0,0 +1,203 @@
+"""Background jobs for long-running computations.
+
+Jobs run in a local pool of worker processes and keep their state in the Flask cache such that
+any server process can poll it, no external broker is needed.  The job ID is derived from the
+function and its arguments, so identical requests share one job.  The job function receives the
+job ID as its first argument for reporting progress with ``set_progress()`` and returns a
+JSON-serializable result.  While a job runs, its worker process updates the state periodically.
+Pending and running jobs whose state was not updated within ``settings.JOB_STALE_SECONDS`` are
+considered lost, e.g., with their server or worker process, and are submitted again.
+
+The worker processes are spawned with a copy of ``.settings`` and import the app for the cache.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import multiprocessing
+import threading
+import time
+
+import flask
+from logzero import logger
+
+from . import settings
+from .cache import cache
+
+#: Prefix of the cache keys of the job states.
+JOB_KEY_PREFIX = "excovis-job-"
+
+#: Job is waiting for a free worker.
+PENDING = "pending"
+#: Job is running.
+RUNNING = "running"
+#: Job has finished, the state has the ``result``.
+DONE = "done"
+#: Job has failed, the state has the error ``message``.
+FAILED = "failed"
+
+#: The lazily created process pool.
+_pool = None
+#: Lock for creating ``_pool``.
+_lock = threading.Lock()
+#: Lock for updating the job states from the threads of this process.
+_state_lock = threading.Lock()
+
+
+def init_worker(values):
+    """Initialize job worker process with the ``settings`` ``values`` of the server.
+
+    Also used for other spawned worker processes that need the app's cache.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    for key, value in values.items():
+        setattr(settings, key, value)
+    # Render in the job process itself.
+    settings.RENDER_WORKERS = 0
+
+    from .app import app_flask
+
+    app_flask.app_context().push()
+
+
+def settings_values():
+    """Return ``dict`` with the values of ``.settings`` for ``init_worker()``."""
+    return {key: value for key, value in vars(settings).items() if key.isupper()}
+
+
+def _get_pool():
+    """Return the process pool, create it on first call."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            logger.info("Starting %d job worker(s)", settings.JOB_WORKERS)
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.JOB_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(settings_values(),),
+            )
+        return _pool
+
+
+def enabled():
+    """Return whether background jobs are enabled."""
+    return settings.JOB_WORKERS > 0
+
+
+def make_job_id(fn, *args):
+    """Return the job ID for ``fn(*args)``."""
+    key = repr((fn.__module__, fn.__qualname__) + args)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def get_state(job_id):
+    """Return state ``dict`` of the job with ``state``, ``progress``, ``message``, ``result``.
+
+    Also has the ``started`` and ``updated`` times.  Returns ``None`` if the job is unknown, a
+    stale pending or running job is reported as failed.
+    """
+    state = cache.get(JOB_KEY_PREFIX + job_id)
+    if (
+        state
+        and state["state"] in (PENDING, RUNNING)
+        and time.time() - state.get("updated", time.time()) > settings.JOB_STALE_SECONDS
+    ):
+        logger.warning("Job %s is stale, last updated at %s", job_id, state["updated"])
+        state.update(state=FAILED, message="The job was lost, please try again.")
+    return state
+
+
+def _set_state(job_id, **values):
+    with _state_lock:
+        state = cache.get(JOB_KEY_PREFIX + job_id) or {
+            "state": PENDING,
+            "progress": 0.0,
+            "message": "",
+            "result": None,
+            "started": time.time(),
+        }
+        state.update(values, updated=time.time())
+        cache.set(JOB_KEY_PREFIX + job_id, state)
+
+
+def set_progress(job_id, progress, message=""):
+    """Report the ``progress`` of the running job as fraction in ``[0, 1]``."""
+    _set_state(job_id, progress=progress, message=message)
+
+
+def _heartbeat(app, job_id, stop):
+    """Update the state of the running job until ``stop`` is set, marking it as alive."""
+    with app.app_context():
+        while not stop.wait(settings.JOB_STALE_SECONDS / 3):
+            _set_state(job_id)
+
+
+def _run(job_id, fn, args):
+    """Run the job in the worker process and record its outcome."""
+    _set_state(job_id, state=RUNNING, message="Starting")
+    # Long steps without progress reports, e.g., rendering, must not make the job stale.
+    stop = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat,
+        args=(flask.current_app._get_current_object(), job_id, stop),
+        name="excovis-job-heartbeat",
+        daemon=True,
+    )
+    heartbeat.start()
+    try:
+        result = fn(job_id, *args)
+    except Exception as e:
+        logger.exception("Job %s failed", job_id)
+        outcome = {"state": FAILED, "message": str(e)}
+    else:
+        outcome = {"state": DONE, "progress": 1.0, "message": "Done", "result": result}
+    finally:
+        stop.set()
+        heartbeat.join()
+    _set_state(job_id, **outcome)
+
+
+def submit(fn, *args, valid=None):
+    """Submit job ``fn(job_id, *args)`` unless an identical one is pending, running or done.
+
+    The callable ``valid`` may check whether the ``result`` of a done job can still be used,
+    e.g., whether the data it refers to is still in the cache, the job is submitted again if not.
+    Returns the job ID.
+    """
+    job_id = make_job_id(fn, *args)
+    state = get_state(job_id)
+    if state and state["state"] in (PENDING, RUNNING):
+        return job_id
+    elif state and state["state"] == DONE and (valid is None or valid(state["result"])):
+        return job_id
+    _set_state(
+        job_id,
+        state=PENDING,
+        progress=0.0,
+        message="Waiting for a free worker",
+        result=None,
+        started=time.time(),
+    )
+    future = _get_pool().submit(_run, job_id, fn, args)
+    app = flask.current_app._get_current_object()
+
+    def on_done(future):
+        # Record failures of the pool itself, e.g., a crashed worker.
+        if future.exception() is not None:
+            logger.error("Job %s failed in pool: %s", job_id, future.exception())
+            with app.app_context():
+                _set_state(job_id, state=FAILED, message=str(future.exception()))
+
+    future.add_done_callback(on_done)
+    return job_id
+
+
+def shutdown():
+    """Shutdown the job pool, if any."""
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,485 @@
+"""Headless load testing of a running ExCoVis server.
+
+Each simulated user behaves like a browser tab: it loads the layout and the callback graph
+through ``/dash/_dash-layout`` and ``/dash/_dash-dependencies``, and then runs a session script
+(pick gene, which selects a transcript, pick samples, move the sliders, page, sort and filter
+the coverage table) with think times in between.  Each changed input fires the dependent
+callbacks through ``/dash/_dash-update-component`` like the Dash renderer does, i.e., callbacks
+are chained, independent callbacks run concurrently, enabled intervals (busy retries, job
+polling) tick, and the plot images are fetched.  The clientside callbacks that the server
+callbacks depend on are emulated in Python.
+
+The number of concurrent users is ramped up in stages.  For each stage, the latency percentiles
+and error rates per callback are reported.  This module is unaware of the Dash app and only
+talks HTTP.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+from logzero import logger
+import numpy as np
+import requests
+
+#: Percentiles of the latency to report.
+PERCENTILES = (50, 90, 95, 99)
+
+#: Outcome of a request that succeeded.
+OK = "ok"
+#: Outcome of a callback request that did not update its outputs (HTTP 204).
+PREVENTED = "prevented"
+#: Outcome of a callback request that the busy server asked to retry.
+BUSY = "busy"
+#: Outcome of a failed request.
+ERROR = "error"
+
+#: Sentinel for clientside callbacks that do not update their output.
+NO_UPDATE = object()
+
+
+def _image_options(ymax, thresholds, plot_mode):
+    if plot_mode == "interactive":
+        return NO_UPDATE
+    return {"ymax": ymax, "thresholds": thresholds}
+
+
+#: Python emulations of the clientside callbacks by function name, the others are skipped.
+CLIENTSIDE = {"imageOptions": _image_options}
+
+
+def split_output(output):
+    """Return list of ``(id, property)`` of the callback ``output`` string."""
+    if output.startswith(".."):
+        parts = output[2:-2].split("...")
+    else:
+        parts = [output]
+    return [tuple(part.rsplit(".", 1)) for part in parts]
+
+
+def classify_update(response):
+    """Return outcome of callback ``response``, ``BUSY`` if it enables a busy retry interval."""
+    for component_id, props in response.json()["response"].items():
+        if component_id.endswith("-retry") and props.get("disabled") is False:
+            return BUSY
+    return OK
+
+
+class Callback:
+    """A callback from ``_dash-dependencies``."""
+
+    def __init__(self, dependency):
+        #: The output string that identifies the callback on the server.
+        self.output = dependency["output"]
+        #: Pairs of ``(id, property)`` of the outputs.
+        self.outputs = split_output(self.output)
+        #: Pairs of ``(id, property)`` of the inputs.
+        self.inputs = [(dep["id"], dep["property"]) for dep in dependency["inputs"]]
+        #: Pairs of ``(id, property)`` of the state.
+        self.state = [(dep["id"], dep["property"]) for dep in dependency["state"]]
+        #: Name of the clientside function or ``None`` for server callbacks.
+        self.clientside = (dependency.get("clientside_function") or {}).get("function_name")
+        #: Label in the report, the first output.
+        self.label = "%s.%s" % self.outputs[0]
+
+    def is_multi(self):
+        return self.output.startswith("..")
+
+
+class Recorder:
+    """Thread-safe collection of the request latencies and outcomes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        #: Tuples of ``(stage, label, seconds, outcome)``.
+        self.records = []
+        #: The current stage.
+        self.stage = None
+
+    def add(self, label, seconds, outcome):
+        with self.lock:
+            self.records.append((self.stage, label, seconds, outcome))
+
+
+class Session:
+    """One simulated browser tab."""
+
+    def __init__(self, base_url, recorder, rng, timeout, executor):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.rng = rng
+        self.timeout = timeout
+        self.executor = executor
+        self.http = requests.Session()
+        #: Values of the component properties by ``(id, property)``.
+        self.props = {}
+        #: Component types by ID.
+        self.types = {}
+        #: The callbacks.
+        self.callbacks = []
+
+    def _request(self, label, method, path, classify=None, **kwargs):
+        """Perform HTTP request and record it, return response or ``None`` on errors.
+
+        Relative ``path``s are below the base URL, absolute ones on its host.  The outcome of
+        successful requests is determined by ``classify(response)`` if given.
+        """
+        url = urllib.parse.urljoin(self.base_url + "/", path)
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            logger.debug("%s %s failed: %s", method, url, e)
+            self.recorder.add(label, time.perf_counter() - start, ERROR)
+            return None
+        seconds = time.perf_counter() - start
+        if response.status_code >= 400:
+            self.recorder.add(label, seconds, ERROR)
+            return None
+        if response.status_code == 204:
+            outcome = PREVENTED
+        else:
+            outcome = classify(response) if classify else OK
+        self.recorder.add(label, seconds, outcome)
+        return response
+
+    def _collect(self, component):
+        """Collect the properties of the components with IDs below ``component``."""
+        if isinstance(component, list):
+            for child in component:
+                self._collect(child)
+        elif isinstance(component, dict) and "props" in component:
+            props = component["props"]
+            if "id" in props:
+                self.types[props["id"]] = component.get("type")
+                for key, value in props.items():
+                    if key != "children":
+                        self.props[(props["id"], key)] = value
+            self._collect(props.get("children"))
+
+    def _images(self, component):
+        """Yield the ``src`` URLs of the images below ``component``."""
+        if isinstance(component, list):
+            for child in component:
+                yield from self._images(child)
+        elif isinstance(component, dict) and "props" in component:
+            if component.get("type") == "Img" and component["props"].get("src", "").startswith("/"):
+                yield component["props"]["src"]
+            yield from self._images(component["props"].get("children"))
+
+    def load(self):
+        """Load the layout and the callbacks, run the initial callbacks."""
+        layout = self._request("layout", "GET", "dash/_dash-layout")
+        dependencies = self._request("dependencies", "GET", "dash/_dash-dependencies")
+        if layout is None or dependencies is None:
+            return False
+        self._collect(layout.json())
+        self.callbacks = list(map(Callback, dependencies.json()))
+        # Dash runs the callbacks whose inputs are all in the layout on page load.
+        initial = [
+            callback
+            for callback in self.callbacks
+            if all(component_id in self.types for component_id, _ in callback.inputs)
+        ]
+        self.propagate(set(), initial)
+        return True
+
+    def _call_clientside(self, callback):
+        func = CLIENTSIDE.get(callback.clientside)
+        if func is None:
+            return set()
+        value = func(*(self.props.get(key) for key in callback.inputs + callback.state))
+        if value is NO_UPDATE:
+            return set()
+        self.props[callback.outputs[0]] = value
+        return {callback.outputs[0]}
+
+    def _call_server(self, callback, changed):
+        """Call the server ``callback``, apply its outputs and return the changed properties."""
+
+        def deps(keys):
+            return [{"id": i, "property": p, "value": self.props.get((i, p))} for i, p in keys]
+
+        outputs = [{"id": i, "property": p} for i, p in callback.outputs]
+        payload = {
+            "output": callback.output,
+            "outputs": outputs if callback.is_multi() else outputs[0],
+            "inputs": deps(callback.inputs),
+            "changedPropIds": sorted("%s.%s" % key for key in changed),
+            "state": deps(callback.state),
+        }
+        response = self._request(
+            callback.label,
+            "POST",
+            "dash/_dash-update-component",
+            classify=classify_update,
+            json=payload,
+        )
+        if response is None or response.status_code == 204:
+            return set()
+        result = set()
+        for component_id, props in response.json()["response"].items():
+            for key, value in props.items():
+                self.props[(component_id, key)] = value
+                result.add((component_id, key))
+                if key == "children":
+                    self._collect(value)
+                    for src in self._images(value):
+                        self._request("image", "GET", src)
+        return result
+
+    def _call(self, callback, changed):
+        if callback.clientside:
+            return self._call_clientside(callback)
+        return self._call_server(callback, changed)
+
+    def propagate(self, changed, pending=None):
+        """Fire the callbacks depending on the ``changed`` properties, and so on.
+
+        Like the Dash renderer, a callback waits for the pending callbacks that compute its
+        inputs, the others run concurrently.
+        """
+        if pending is None:
+            pending = [cb for cb in self.callbacks if changed & set(cb.inputs)]
+        triggers = {id(cb): changed & set(cb.inputs) for cb in pending}
+        while pending:
+            outputs = {key for cb in pending for key in cb.outputs}
+            ready = [cb for cb in pending if not (set(cb.inputs) & outputs - set(cb.outputs))]
+            ready = ready or pending
+            results = list(self.executor.map(lambda cb: self._call(cb, triggers[id(cb)]), ready))
+            pending = [cb for cb in pending if cb not in ready]
+            for result in results:
+                for cb in self.callbacks:
+                    hit = result & set(cb.inputs)
+                    if hit:
+                        if cb not in pending:
+                            pending.append(cb)
+                            triggers[id(cb)] = set()
+                        triggers[id(cb)] |= hit
+
+    def tick_intervals(self, deadline):
+        """Let the enabled intervals tick until all are disabled or the ``deadline``."""
+        while time.monotonic() < deadline:
+            enabled = [
+                component_id
+                for component_id, component_type in self.types.items()
+                if component_type == "Interval"
+                and self.props.get((component_id, "disabled")) is False
+            ]
+            if not enabled:
+                return
+            interval = min(self.props.get((i, "interval")) or 1000 for i in enabled)
+            time.sleep(interval / 1000.0)
+            changed = set()
+            for component_id in enabled:
+                key = (component_id, "n_intervals")
+                self.props[key] = (self.props.get(key) or 0) + 1
+                changed.add(key)
+            self.propagate(changed)
+
+    def set_prop(self, component_id, prop, value, deadline):
+        """Set the property ``prop`` of the input ``component_id`` like a user would."""
+        key = (component_id, prop)
+        self.props[key] = value
+        self.propagate({key})
+        self.tick_intervals(deadline)
+
+    def options(self, component_id):
+        return [option["value"] for option in self.props.get((component_id, "options")) or []]
+
+    def table_action(self):
+        """Return ``(property, value)`` for going to a page, sorting or filtering the table.
+
+        Returns ``None`` if the table is not shown.
+        """
+        columns = [column["id"] for column in self.props.get(("coverage-table", "columns")) or []]
+        if not columns:
+            return None
+        action = self.rng.choice(["page_current", "sort_by", "filter_query"])
+        if action == "page_current":
+            page_count = self.props.get(("coverage-table", "page_count")) or 1
+            return action, self.rng.randrange(page_count)
+        elif action == "sort_by":
+            return action, [
+                {
+                    "column_id": self.rng.choice(columns),
+                    "direction": self.rng.choice(["asc", "desc"]),
+                }
+            ]
+        else:
+            return action, self.rng.choice(
+                ["", "{%s} lt %d" % (self.rng.choice(columns), self.rng.randint(0, 100))]
+            )
+
+    def run_script(self, args, deadline):
+        """Run the session script until done or ``deadline``."""
+        if not self.load():
+            return
+
+        def think():
+            time.sleep(self.rng.uniform(0, 2 * args.think_time))
+            return time.monotonic() < deadline
+
+        genes, samples = self.options("input_gene"), self.options("input_samples")
+        if not genes or not samples:
+            logger.warning("The server has no genes or samples to select")
+            return
+        steps = [
+            ("input_gene", lambda: self.rng.choice(genes)),
+            (
+                "input_samples",
+                lambda: self.rng.sample(
+                    samples, self.rng.randint(1, min(args.max_samples, len(samples)))
+                ),
+            ),
+        ]
+        for slider in ("input_padding", "input_ymax"):
+            low = self.props.get((slider, "min"), 0)
+            high = self.props.get((slider, "max"), 100)
+            steps += [(slider, lambda low=low, high=high: self.rng.randint(low, high))] * (
+                args.slider_moves
+            )
+        for component_id, value in steps:
+            if not think():
+                return
+            self.set_prop(component_id, "value", value(), deadline)
+        # The table is shown once the samples are selected.
+        for _ in range(args.table_moves):
+            if not think():
+                return
+            action = self.table_action()
+            if action:
+                self.set_prop("coverage-table", *action, deadline)
+
+
+def run_user(args, recorder, seed, deadline):
+    """Run sessions of one simulated user until the ``deadline``."""
+    rng = random.Random(seed)
+    with ThreadPoolExecutor(max_workers=args.connections) as executor:
+        while time.monotonic() < deadline:
+            Session(args.url, recorder, rng, args.timeout, executor).run_script(args, deadline)
+
+
+def summarize(records):
+    """Return list of per-label statistics ``dict`` for the ``records`` of one stage."""
+    by_label = {}
+    for _, label, seconds, outcome in records:
+        by_label.setdefault(label, []).append((seconds, outcome))
+    result = []
+    for label, values in sorted(by_label.items()):
+        seconds = np.array([s for s, _ in values]) * 1000.0
+        outcomes = [o for _, o in values]
+        row = {
+            "label": label,
+            "count": len(values),
+            "error_rate": outcomes.count(ERROR) / len(values),
+            "busy_rate": outcomes.count(BUSY) / len(values),
+        }
+        for q in PERCENTILES:
+            row["p%d_ms" % q] = float(np.percentile(seconds, q))
+        row["max_ms"] = float(seconds.max())
+        result.append(row)
+    return result
+
+
+def print_report(report):
+    """Print the report as tab-separated table."""
+    header = ["users", "label", "count", "rps", "errors", "busy"]
+    header += ["p%d_ms" % q for q in PERCENTILES] + ["max_ms"]
+    print("\t".join(header))
+    for stage in report:
+        for row in stage["callbacks"]:
+            values = [
+                stage["users"],
+                row["label"],
+                row["count"],
+                "%.2f" % (row["count"] / stage["seconds"]),
+                "%.1f%%" % (100.0 * row["error_rate"]),
+                "%.1f%%" % (100.0 * row["busy_rate"]),
+            ]
+            values += ["%.0f" % row["p%d_ms" % q] for q in PERCENTILES]
+            values += ["%.0f" % row["max_ms"]]
+            print("\t".join(map(str, values)))
+
+
+def run(args, parser):
+    """Main entry point after argument parsing."""
+    recorder = Recorder()
+    report = []
+    for users in args.users:
+        logger.info("Running %d user(s) for %ds against %s", users, args.stage_duration, args.url)
+        recorder.stage = users
+        start = time.monotonic()
+        deadline = start + args.stage_duration
+        threads = [
+            threading.Thread(
+                target=run_user, args=(args, recorder, args.seed * 1000 + i, deadline), daemon=True
+            )
+            for i in range(users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with recorder.lock:
+            records = [record for record in recorder.records if record[0] == users]
+        report.append(
+            {
+                "users": users,
+                "seconds": time.monotonic() - start,
+                "callbacks": summarize(records),
+            }
+        )
+    print_report(report)
+    if args.output:
+        with open(args.output, "wt") as outputf:
+            json.dump(report, outputf, indent=2)
+
+
+def setup_argparse(parser):
+    """Setup argparse sub parser."""
+    parser.add_argument(
+        "url",
+        nargs="?",
+        default="http://localhost:8050",
+        help="URL of the running server, including the public URL prefix",
+    )
+    parser.add_argument(
+        "--users",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8, 16],
+        help="Numbers of concurrent users of the ramp stages",
+    )
+    parser.add_argument(
+        "--stage-duration", type=int, default=60, help="Seconds that each ramp stage runs"
+    )
+    parser.add_argument(
+        "--think-time", type=float, default=2.0, help="Mean seconds between the steps of a user"
+    )
+    parser.add_argument(
+        "--max-samples", type=int, default=10, help="Maximal number of samples a user selects"
+    )
+    parser.add_argument(
+        "--slider-moves", type=int, default=2, help="Number of moves of each slider per session"
+    )
+    parser.add_argument(
+        "--table-moves",
+        type=int,
+        default=3,
+        help="Number of times a user pages, sorts or filters the coverage table per session",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=6,
+        help="Number of concurrent requests per user, as in browsers",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=120.0, help="Seconds before requests time out"
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the random numbers")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this file")
@@ -0,0 +1,176 @@
+"""Prometheus metrics for the hot paths of ExCoVis.
+
+The metrics are exposed in the Prometheus text format by the ``/metrics`` route of the app.
+With several server worker processes, set the environment variable ``PROMETHEUS_MULTIPROC_DIR``
+to an empty directory before starting the server such that the metrics are aggregated over all
+processes (see the ``prometheus_client`` documentation).  The timed functions, stages and
+callbacks are also traced as spans with ``.tracing`` and recorded for the slow log of
+``.slowlog``.  This module is unaware of the Dash app.
+"""
+
+import contextlib
+import functools
+import os
+import time
+
+import dash
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from . import slowlog, tracing
+
+#: Histogram buckets for latencies in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+#: Histogram buckets for sizes in bytes.
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+#: Latency of the instrumented functions, including cache hits.
+FUNCTION_SECONDS = Histogram(
+    "excovis_function_seconds",
+    "Latency of instrumented functions",
+    ["function"],
+    buckets=LATENCY_BUCKETS,
+)
+#: Latency of the stages within the functions, e.g., opening BAM files or rendering.
+STAGE_SECONDS = Histogram(
+    "excovis_stage_seconds",
+    "Latency of stages within the instrumented functions",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+#: Latency of the Dash callbacks.
+CALLBACK_SECONDS = Histogram(
+    "excovis_callback_seconds", "Latency of Dash callbacks", ["callback"], buckets=LATENCY_BUCKETS
+)
+#: Outcomes of the Dash callbacks.
+CALLBACK_TOTAL = Counter(
+    "excovis_callback_total", "Dash callback calls by outcome", ["callback", "outcome"]
+)
+#: Lookups of the memoized functions in the cache.
+CACHE_TOTAL = Counter(
+    "excovis_cache_total",
+    "Calls of memoized functions by cache result (hit, miss, coalesced)",
+    ["function", "result"],
+)
+#: Lookups of evictable entries in the size-bounded cache (see ``.boundedcache``).
+CACHE_LOOKUP_TOTAL = Counter(
+    "excovis_cache_lookup_total",
+    "Lookups in the size-bounded cache by entry kind and result (hit, miss)",
+    ["kind", "result"],
+)
+#: Sizes of the entries written to the size-bounded cache.
+CACHE_ENTRY_BYTES = Histogram(
+    "excovis_cache_entry_bytes",
+    "Sizes of the entries written to the size-bounded cache",
+    ["kind"],
+    buckets=SIZE_BUCKETS,
+)
+#: Entries evicted from the size-bounded cache.
+CACHE_EVICTED_TOTAL = Counter(
+    "excovis_cache_evicted_total", "Entries evicted from the size-bounded cache", ["kind"]
+)
+#: Bytes evicted from the size-bounded cache.
+CACHE_EVICTED_BYTES = Counter(
+    "excovis_cache_evicted_bytes", "Bytes evicted from the size-bounded cache", ["kind"]
+)
+#: Entries not admitted to the size-bounded cache because they were less frequently used.
+CACHE_REJECTED_TOTAL = Counter(
+    "excovis_cache_rejected_total", "Entries not admitted to the size-bounded cache", ["kind"]
+)
+#: Bytes of the evictable entries in the size-bounded cache when last scanned.
+CACHE_BYTES = Gauge(
+    "excovis_cache_bytes", "Bytes of the entries in the size-bounded cache", multiprocess_mode="max"
+)
+#: Computations abandoned because they were superseded by newer requests.
+CANCELLED_TOTAL = Counter(
+    "excovis_cancelled_total", "Computations abandoned as superseded", ["output"]
+)
+#: Requests rejected because the server was busy.
+BUSY_TOTAL = Counter("excovis_busy_total", "Callback calls rejected as busy", ["callback"])
+
+
+def timed(name):
+    """Decorator recording the latency of the decorated function as ``name``."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with tracing.span(name):
+                    return func(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                FUNCTION_SECONDS.labels(name).observe(seconds)
+                slowlog.add_stage(name, seconds)
+
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def stage(name, **trace_args):
+    """Context manager recording the latency of its body as stage ``name``.
+
+    The ``trace_args`` are added to the stage's tracing span.
+    """
+    start = time.perf_counter()
+    try:
+        with tracing.span(name, **trace_args):
+            yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(seconds)
+        slowlog.add_stage(name, seconds)
+
+
+def instrumented_callback(name):
+    """Decorator recording latency and outcome (ok, prevented, error) of a Dash callback."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            start = time.perf_counter()
+            outcome = "error"
+            with tracing.span("callback:%s" % name), slowlog.recording(name) as record:
+                try:
+                    result = func(*args)
+                    outcome = "ok"
+                    return result
+                except dash.exceptions.PreventUpdate:
+                    outcome = "prevented"
+                    raise
+                finally:
+                    CALLBACK_SECONDS.labels(name).observe(time.perf_counter() - start)
+                    CALLBACK_TOTAL.labels(name, outcome).inc()
+                    if record is not None:
+                        record.outcome = outcome
+
+        return wrapper
+
+    return decorator
+
+
+def generate():
+    """Return pair of the metrics in Prometheus text format and its content type."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Remove the live metrics of the exited server process ``pid`` in multi-process mode."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
@@ -1,5 +1,6 @@
 """Code for plotting."""
 
+from io import BytesIO
 from itertools import chain
 import os
 import sys
@@ -7,12 +8,13 @@ import sys
 import pandas as pd
 import numpy as np
 import matplotlib as mpl
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import matplotlib.path as pltpath
 import matplotlib.patches as patches
 
 from excovis.exceptions import ExcovisException
-from . import data, genes, settings, store
+from . import cancel, data, genes, jobs, metrics, render, settings, store
 
 from logzero import logger
 
@@ -34,17 +36,20 @@ MIN_OK = 20
 FIGSIZE_H = 12
 #: Figure widget
 FIGSIZE_V = 2.5
+#: Height of the heatmap in heatmap mode
+HEATMAP_FIGSIZE_V = 7.5
 
 
 def pos_filtered(df, chrom, begin, end):
     return df[(df.chrom == chrom) & (df.pos >= begin - 1) & (df.pos < end)]
 
 
-def val_to_qual(x):
+def val_to_qual(x, thresholds=(MIN_WARN, MIN_OK)):
     """Convert the given quality value to a quality level."""
-    if x < MIN_WARN:
+    min_warn, min_ok = thresholds
+    if x < min_warn:
         return 0
-    elif x < MIN_OK:
+    elif x < min_ok:
         return 1
     else:
         return 2
@@ -62,7 +67,78 @@ def build_qualmap(quals):
     return mpl.colors.ListedColormap(lst)
 
 
-def _plot_for_gene(transcripts, df_covs, sep_vlines=[], projected=False, suptitle=None, ymax=50):
+def _plot_transcripts(ax, transcripts, pos_begin, pos_end, sep_vlines, projected):
+    """Plot the transcripts into ``ax``."""
+    num_tx = transcripts.shape[0]
+    ax.set_yticks([])
+    ax.set_xlim(pos_begin, pos_end)
+    ax.set_ylim(-num_tx * EXON_ROW_HEIGHT - MARGIN_Y_TX, MARGIN_Y_TX)
+    ax.tick_params(axis="y", which="both", bottom=False, top=False, labelbottom=False)
+    if sep_vlines:
+        # Display vertical lines indicating exon jumps.
+        for x in sep_vlines:
+            ax.axvline(x=x, lw=1, ls="-", color="dimgray")
+    if projected:
+        ax.tick_params(axis="x", which="both", bottom=False, top=False, labelbottom=False)
+
+    for idx in range(num_tx):
+        transcript = transcripts.iloc[idx, :]
+        ax.text(  # transcript name
+            pos_begin + (pos_end - pos_begin) / 2,
+            -idx * EXON_ROW_HEIGHT - EXON_CDS_HEIGHT - TEXT_MARGIN,
+            transcript.tx_accession,
+            horizontalalignment="center",
+            verticalalignment="top",
+            size="larger",
+        )
+        if not projected:
+            ax.add_patch(  # dashed line connecting exons
+                patches.PathPatch(
+                    pltpath.Path(
+                        (
+                            (transcript.begin, -idx * EXON_ROW_HEIGHT - 0.5 * EXON_CDS_HEIGHT),
+                            (transcript.end, -idx * EXON_ROW_HEIGHT - 0.5 * EXON_CDS_HEIGHT),
+                        ),
+                        (pltpath.Path.MOVETO, pltpath.Path.LINETO),
+                    ),
+                    ls="--",
+                )
+            )
+        for begin, length in zip(transcript.exon_begins, transcript.exon_lengths):
+            ax.add_patch(  # box with UTR height
+                patches.Rectangle(
+                    (begin, -idx * EXON_ROW_HEIGHT - EXON_CDS_HEIGHT + EXON_UTR_HEIGHT / 2),
+                    length,
+                    EXON_UTR_HEIGHT,
+                    linewidth=1,
+                    color="#3a3a3a",
+                )
+            )
+            cds_begin = transcript.cds_begin
+            cds_end = transcript.cds_end
+            if cds_begin <= (begin + length) and begin <= cds_end:
+                off_left = 0 if begin >= cds_begin else cds_begin - begin
+                off_right = 0 if cds_end > (begin + length) else (begin + length) - cds_end
+                ax.add_patch(  # box with CDS height
+                    patches.Rectangle(
+                        (begin + off_left, -idx * EXON_ROW_HEIGHT - EXON_CDS_HEIGHT),
+                        length - off_left - off_right,
+                        EXON_CDS_HEIGHT,
+                        linewidth=1,
+                        color="#3a3a3a",
+                    )
+                )
+
+
+def _plot_for_gene(
+    transcripts,
+    df_covs,
+    sep_vlines=[],
+    projected=False,
+    suptitle=None,
+    ymax=50,
+    thresholds=(MIN_WARN, MIN_OK),
+):
     if transcripts.empty:
         tx_chrom = "1"
     else:
@@ -77,7 +153,8 @@ def _plot_for_gene(transcripts, df_covs, sep_vlines=[], projected=False, suptitl
     samples = list(tx_covs.columns[3:])
 
     # Initialize figure.
-    fig = plt.figure(figsize=(FIGSIZE_H, (len(samples) + 1) * FIGSIZE_V), dpi=75)
+    fig = Figure(figsize=(FIGSIZE_H, (len(samples) + 1) * FIGSIZE_V), dpi=75)
+    FigureCanvasAgg(fig)
     if suptitle:
         fig.suptitle(suptitle)
 
@@ -93,7 +170,7 @@ def _plot_for_gene(transcripts, df_covs, sep_vlines=[], projected=False, suptitl
     for sample_idx, sample in enumerate(samples):
         ax = fig.add_subplot(len(samples) + 1, 1, sample_idx + 1)
         ax.set_xlim(pos_begin, pos_end)
-        x = tx_covs.loc[:, sample].apply(val_to_qual).values
+        x = np.digitize(tx_covs.loc[:, sample].values, thresholds)
         # background image
         im = ax.imshow(
             x.reshape(1, -1),
@@ -117,8 +194,8 @@ def _plot_for_gene(transcripts, df_covs, sep_vlines=[], projected=False, suptitl
         if projected:
             ax.tick_params(axis="x", which="both", bottom=False, top=False, labelbottom=False)
         # Show lines with warning and error threshold.
-        ax.axhline(y=MIN_OK, lw=1, ls=":", color="black")
-        ax.axhline(y=MIN_WARN, lw=1, ls=":", color="black")
+        for y in thresholds:
+            ax.axhline(y=y, lw=1, ls=":", color="black")
         # Display vertical lines indicating CDS start and end
         for x in cds_vlines:
             ax.axvline(x=x, lw=1, ls=":", color="dimgray")
@@ -138,69 +215,87 @@ def _plot_for_gene(transcripts, df_covs, sep_vlines=[], projected=False, suptitl
 
     # Create bottom plot with the transcripts.
     ax = fig.add_subplot(len(samples) + 1, 1, len(samples) + 1)
-    ax.set_yticks([])
+    _plot_transcripts(ax, transcripts, pos_begin, pos_end, sep_vlines, projected)
+    fig.subplots_adjust(top=0.95)
+    return fig
+
+
+def _plot_heatmap_for_gene(
+    transcripts,
+    df_covs,
+    sep_vlines=[],
+    projected=False,
+    suptitle=None,
+    ymax=50,
+    thresholds=(MIN_WARN, MIN_OK),
+):
+    """Plot coverage of all samples as one heatmap with one row per sample.
+
+    In contrast to ``_plot_for_gene()``, the figure size does not grow with the number of samples.
+    """
+    if transcripts.empty:
+        tx_chrom = "1"
+    else:
+        tx_chrom = transcripts["chrom"].iloc[0]
+
+    # Compute start and end genome position.
+    pos_begin = transcripts.begin.min() - PADDING - MARGIN_X
+    pos_end = transcripts.end.max() + PADDING + MARGIN_X
+    # Extract coverage information from coverage data frame, one column per position.
+    tx_covs = pos_filtered(df_covs, tx_chrom, pos_begin, pos_end).drop_duplicates("pos")
+    # Get sample names.
+    samples = list(tx_covs.columns[3:])
+
+    # Initialize figure.
+    fig = Figure(figsize=(FIGSIZE_H, HEATMAP_FIGSIZE_V + FIGSIZE_V), dpi=75)
+    FigureCanvasAgg(fig)
+    if suptitle:
+        fig.suptitle(suptitle)
+    grid = fig.add_gridspec(
+        2, 2, height_ratios=[HEATMAP_FIGSIZE_V, FIGSIZE_V], width_ratios=[50, 1]
+    )
+
+    # Create heatmap with samples x positions, each position is a cell from ``pos - 0.5`` to
+    # ``pos + 0.5`` and the gaps between the covered positions (e.g., introns) are left empty.
+    tx_covs = tx_covs.sort_values("pos")
+    pos = tx_covs.pos.values.astype(float)
+    gaps = np.flatnonzero(np.diff(pos) > 1)
+    edges = np.insert(np.append(pos - 0.5, pos[-1:] + 0.5), gaps + 1, pos[gaps] + 0.5)
+    values = np.insert(tx_covs.loc[:, samples].values.T.astype(float), gaps + 1, np.nan, axis=1)
+    ax = fig.add_subplot(grid[0, 0])
+    im = ax.pcolorfast(
+        edges,
+        np.arange(len(samples) + 1),
+        np.ma.masked_invalid(values),
+        cmap="viridis",
+        vmin=0,
+        vmax=ymax,
+    )
     ax.set_xlim(pos_begin, pos_end)
-    ax.set_ylim(-num_tx * EXON_ROW_HEIGHT - MARGIN_Y_TX, MARGIN_Y_TX)
-    ax.tick_params(axis="y", which="both", bottom=False, top=False, labelbottom=False)
+    ax.set_ylim(len(samples), 0)
+    ax.set_yticks([i + 0.5 for i in range(len(samples))])
+    ax.set_yticklabels(samples, fontsize=max(4, min(10, 400 / max(len(samples), 1))))
+    if projected:
+        ax.tick_params(axis="x", which="both", bottom=False, top=False, labelbottom=False)
     if sep_vlines:
         # Display vertical lines indicating exon jumps.
         for x in sep_vlines:
-            ax.axvline(x=x, lw=1, ls="-", color="dimgray")
-    if projected:
-        ax.tick_params(axis="x", which="both", bottom=False, top=False, labelbottom=False)
+            ax.axvline(x=x, lw=1, ls="-", color="white")
+    # Show color bar with warning and error threshold.
+    cax = fig.add_subplot(grid[0, 1])
+    cbar = fig.colorbar(im, cax=cax, extend="max")
+    cbar.set_label("depth of coverage")
+    for y in thresholds:
+        cax.axhline(y=y, lw=1, ls=":", color="black")
 
-    for idx in range(num_tx):
-        transcript = transcripts.iloc[idx, :]
-        ax.text(  # transcript name
-            pos_begin + (pos_end - pos_begin) / 2,
-            -idx * EXON_ROW_HEIGHT - EXON_CDS_HEIGHT - TEXT_MARGIN,
-            transcript.tx_accession,
-            horizontalalignment="center",
-            verticalalignment="top",
-            size="larger",
-        )
-        if not projected:
-            ax.add_patch(  # dashed line connecting exons
-                patches.PathPatch(
-                    pltpath.Path(
-                        (
-                            (transcript.begin, -idx * EXON_ROW_HEIGHT - 0.5 * EXON_CDS_HEIGHT),
-                            (transcript.end, -idx * EXON_ROW_HEIGHT - 0.5 * EXON_CDS_HEIGHT),
-                        ),
-                        (pltpath.Path.MOVETO, pltpath.Path.LINETO),
-                    ),
-                    ls="--",
-                )
-            )
-        for begin, length in zip(transcript.exon_begins, transcript.exon_lengths):
-            ax.add_patch(  # box with UTR height
-                patches.Rectangle(
-                    (begin, -idx * EXON_ROW_HEIGHT - EXON_CDS_HEIGHT + EXON_UTR_HEIGHT / 2),
-                    length,
-                    EXON_UTR_HEIGHT,
-                    linewidth=1,
-                    color="#3a3a3a",
-                )
-            )
-            cds_begin = transcript.cds_begin
-            cds_end = transcript.cds_end
-            if cds_begin <= (begin + length) and begin <= cds_end:
-                off_left = 0 if begin >= cds_begin else cds_begin - begin
-                off_right = 0 if cds_end > (begin + length) else (begin + length) - cds_end
-                ax.add_patch(  # box with CDS height
-                    patches.Rectangle(
-                        (begin + off_left, -idx * EXON_ROW_HEIGHT - EXON_CDS_HEIGHT),
-                        length - off_left - off_right,
-                        EXON_CDS_HEIGHT,
-                        linewidth=1,
-                        color="#3a3a3a",
-                    )
-                )
+    # Create bottom plot with the transcripts.
+    ax = fig.add_subplot(grid[1, 0])
+    _plot_transcripts(ax, transcripts, pos_begin, pos_end, sep_vlines, projected)
     fig.subplots_adjust(top=0.95)
     return fig
 
 
-def _plot_for_gene_projected(transcript, df_covs, exon_padding, ymax):
+def _plot_for_gene_projected(transcript, df_covs, exon_padding, ymax, thresholds, heatmap):
     # Prepare the projection from chromosome to plotted space (only consider +/- exon_padding bases around the exon).
     positions = set()
     for exon in transcript.exons:
@@ -262,7 +357,8 @@ def _plot_for_gene_projected(transcript, df_covs, exon_padding, ymax):
         prev = gpos
 
     # Plot.
-    return _plot_for_gene(
+    plot_func = _plot_heatmap_for_gene if heatmap else _plot_for_gene
+    return plot_func(
         proj_transcripts,
         proj_covs,
         sep_vlines=jump_positions,
@@ -270,10 +366,20 @@ def _plot_for_gene_projected(transcript, df_covs, exon_padding, ymax):
         suptitle="Coverage for transcript %s of gene %s"
         % (transcript.tx_accession, transcript.gene_symbol),
         ymax=ymax,
+        thresholds=thresholds,
     )
 
 
-def plot_for_gene(transcript, df_covs, exon_padding=None, ymax=50):
+def plot_for_gene(
+    transcript, df_covs, exon_padding=None, ymax=50, thresholds=(MIN_WARN, MIN_OK), heatmap=None
+):
+    """Plot coverage in ``df_covs`` for ``transcript``.
+
+    With ``heatmap=None``, the heatmap is used if there are more than
+    ``settings.HEATMAP_MIN_SAMPLES`` samples.
+    """
+    if heatmap is None:
+        heatmap = use_heatmap(len(df_covs.columns) - 3)
     transcripts = pd.DataFrame(
         data=[
             {
@@ -305,18 +411,86 @@ def plot_for_gene(transcript, df_covs, exon_padding=None, ymax=50):
 
     if exon_padding is None:
         # Select transcripts that we are interested in.
-        return _plot_for_gene(
+        plot_func = _plot_heatmap_for_gene if heatmap else _plot_for_gene
+        return plot_func(
             transcripts,
             df_covs,
             ymax=ymax,
+            thresholds=thresholds,
             suptitle="Coverage for transcript %s of gene %s"
             % (transcript.tx_accession, transcript.gene_symbol),
         )
     else:
-        return _plot_for_gene_projected(transcript, df_covs, exon_padding, ymax)
+        return _plot_for_gene_projected(
+            transcript, df_covs, exon_padding, ymax, thresholds, heatmap
+        )
+
+
+def coverage_thresholds():
+    """Return the thresholds for the "percentage of bases with depth >= N" metrics."""
+    return tuple(settings.COVERAGE_THRESHOLDS or (MIN_WARN, MIN_OK))
+
 
+def use_heatmap(num_samples):
+    """Return whether to use the heatmap for plotting ``num_samples`` samples."""
+    return num_samples > settings.HEATMAP_MIN_SAMPLES
 
-def render_plot(exon_padding, ymax, tx_accession, samples):
+
+def fig_to_png(fig, **save_args):
+    """Render ``fig`` to PNG and return the ``bytes``, the figure is cleared afterwards."""
+    out_img = BytesIO()
+    try:
+        fig.savefig(out_img, format="png", **save_args)
+    finally:
+        fig.clear()
+    return out_img.getvalue()
+
+
+def render_png(transcript, coverage, exon_padding, ymax, thresholds, heatmap):
+    """Plot the ``data.CoverageArrays`` in ``coverage`` and return PNG ``bytes``.
+
+    This is the entry point in the render worker processes.
+    """
+    return fig_to_png(
+        plot_for_gene(transcript, coverage.to_df(), exon_padding, ymax, thresholds, heatmap)
+    )
+
+
+@metrics.timed("render_plot")
+def render_plot(
+    exon_padding, ymax, tx_accession, samples, thresholds=(MIN_WARN, MIN_OK), heatmap=None
+):
+    """Load coverage and render plot in the render pool, return PNG ``bytes``.
+
+    With ``heatmap=None``, the heatmap is used if there are more than
+    ``settings.HEATMAP_MIN_SAMPLES`` samples.
+    """
     transcript = genes.load_transcripts()[tx_accession]
     coverage_df = store.load_coverage_df(exon_padding, tx_accession, samples)
-    return plot_for_gene(transcript, coverage_df, exon_padding, ymax)
+    coverage = data.CoverageArrays.from_df(coverage_df)
+    if heatmap is None:
+        heatmap = use_heatmap(len(samples))
+    cancel.check()
+    with metrics.stage("render"):
+        future = render.submit(
+            render_png, transcript, coverage, exon_padding, ymax, tuple(thresholds), heatmap
+        )
+        return cancel.wait(future)
+
+
+def render_plot_job(job_id, exon_padding, ymax, tx_accession, samples, thresholds, heatmap):
+    """Background job for ``render_plot()``, stores the image and returns its digest.
+
+    Reports the progress of loading the coverage of each sample and of rendering.
+    """
+    transcript = genes.load_transcripts()[tx_accession]
+    tree = store.transcript_tree(transcript)
+    steps = len(samples) + 1
+    for i, sample in enumerate(samples):
+        jobs.set_progress(
+            job_id, i / steps, "Loading coverage of sample %d of %d" % (i + 1, len(samples))
+        )
+        store.load_shared_coverage(sample, tree, transcript)
+    jobs.set_progress(job_id, len(samples) / steps, "Rendering plot")
+    png = render_plot(exon_padding, ymax, tx_accession, samples, thresholds, heatmap)
+    return store.store_image(png)
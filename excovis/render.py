@@ -0,0 +1,92 @@
+"""Pool of worker processes for rendering plots.
+
+Matplotlib is neither thread-safe nor cheap and rendering holds the GIL.  Thus, rendering is
+performed in a dedicated pool of worker processes that use the Agg backend.  The functions
+submitted to the pool receive plain coverage arrays and return the encoded image as ``bytes``.
+
+The number of submitted but unfinished jobs is bounded by the ``render`` stage of ``.admission``,
+i.e., ``settings.RENDER_WORKERS`` plus ``settings.RENDER_QUEUE_SIZE``.  This module is unaware
+of the Dash app.
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+import threading
+
+from logzero import logger
+
+from . import admission, settings
+
+
+class RenderQueueFull(admission.Busy):
+    """Raised when the render queue is full."""
+
+
+#: The lazily created process pool.
+_pool = None
+#: Lock for creating ``_pool``.
+_lock = threading.Lock()
+
+
+def _init_worker():
+    """Initialize render worker process."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _get_pool():
+    """Return the process pool, create it on first call."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            logger.info(
+                "Starting %d render worker(s) with queue size %d",
+                settings.RENDER_WORKERS,
+                settings.RENDER_QUEUE_SIZE,
+            )
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def submit(fn, *args):
+    """Submit ``fn(*args)`` to the render pool and return a ``Future``.
+
+    With ``settings.RENDER_WORKERS == 0``, ``fn`` is called directly.  Raises ``RenderQueueFull``
+    if the queue is full or no worker becomes free within ``settings.RENDER_QUEUE_TIMEOUT``
+    seconds.
+    """
+    if not settings.RENDER_WORKERS:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    pool = _get_pool()
+    stage = admission.get_stage("render")
+    try:
+        stage.acquire(timeout=settings.RENDER_QUEUE_TIMEOUT)
+    except admission.Busy as e:
+        raise RenderQueueFull(str(e))
+    try:
+        future = pool.submit(fn, *args)
+    except Exception:
+        stage.release()
+        raise
+    future.add_done_callback(lambda _: stage.release())
+    return future
+
+
+def shutdown():
+    """Shutdown the render pool, if any."""
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,136 @@
+"""Offline replay of the requests in a slow log (see ``.slowlog``).
+
+The logged Dash requests are re-executed against the current code through the Flask test
+client, without a server.  This reproduces latency outliers from production and measures fixes
+on real traffic shapes.  The requests run with a fresh temporary cache that is cleared before
+each request unless ``--keep-cache`` is given, and everything is computed in the request, i.e.,
+without background jobs.
+"""
+
+import statistics
+import tempfile
+import time
+
+from logzero import logger
+
+from . import render, settings, slowlog
+from .webserver import configure
+from .webserver import setup_argparse as setup_argparse_webserver
+
+#: Route of the Dash callback requests.
+UPDATE_COMPONENT_PATH = "/dash/_dash-update-component"
+
+
+def prepare_payload(payload):
+    """Return copy of the logged Dash request ``payload`` for replay.
+
+    The session ID is removed such that the replayed computations cannot be superseded.
+    """
+    result = dict(payload)
+    result["state"] = [
+        dict(state, value=None) if state.get("id") == "session-id" else state
+        for state in payload.get("state", [])
+    ]
+    return result
+
+
+def replay(args):
+    """Replay the requests of the slow log, return list of ``(entry, seconds, statuses)``."""
+    from .app import app_flask
+    from .cache import cache
+
+    client = app_flask.test_client()
+    results = []
+    entries = list(slowlog.read(args.path))
+    for i, entry in enumerate(entries):
+        if args.callbacks and entry["callback"] not in args.callbacks:
+            continue
+        elif not entry.get("payload"):
+            logger.warning("Skipping entry %d without request payload", i + 1)
+            continue
+        payload = prepare_payload(entry["payload"])
+        seconds, statuses = [], []
+        for _ in range(args.repeat):
+            if not args.keep_cache:
+                with app_flask.app_context():
+                    cache.clear()
+            start = time.perf_counter()
+            response = client.post(UPDATE_COMPONENT_PATH, json=payload)
+            seconds.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+        logger.info(
+            "Entry %d/%d (%s): logged %.3fs, replayed %.3fs (status %s)",
+            i + 1,
+            len(entries),
+            entry["callback"],
+            entry["seconds"],
+            statistics.median(seconds),
+            ",".join(map(str, sorted(set(statuses)))),
+        )
+        results.append((entry, seconds, statuses))
+    return results
+
+
+def print_summary(results):
+    """Print table of the logged and replayed seconds of each request."""
+    print("\t".join(("#", "callback", "trace", "logged_s", "replayed_s", "min_s", "status")))
+    for i, (entry, seconds, statuses) in enumerate(results):
+        print(
+            "\t".join(
+                (
+                    str(i + 1),
+                    entry["callback"],
+                    entry.get("trace") or ".",
+                    "%.3f" % entry["seconds"],
+                    "%.3f" % statistics.median(seconds),
+                    "%.3f" % min(seconds),
+                    ",".join(map(str, sorted(set(statuses)))),
+                )
+            )
+        )
+
+
+def run(args, parser):
+    """Main entry point after argument parsing."""
+    configure(args, parser)
+    # Compute everything in the request, in a private cache, and log all replayed requests.
+    settings.JOB_WORKERS = 0
+    settings.CACHE_TYPE = "filesystem"
+    settings.SLOWLOG_PATH = args.output
+    settings.SLOWLOG_THRESHOLD = 0
+    # Replayed requests are not real accesses.
+    settings.ACCESS_LOG_PATH = None
+    with tempfile.TemporaryDirectory(prefix="EXCOVIS.replay.") as tmpdir:
+        settings.CACHE_DIR = tmpdir
+        settings.TEMP_DIR = tmpdir
+        try:
+            print_summary(replay(args))
+        finally:
+            render.shutdown()
+
+
+def setup_argparse(parser):
+    """Setup argparse sub parser."""
+    setup_argparse_webserver(parser)
+    parser.add_argument("path", metavar="SLOWLOG", help="Path to the slow log to replay")
+    parser.add_argument(
+        "--callback",
+        dest="callbacks",
+        default=[],
+        action="append",
+        help="Only replay requests of this callback, may be given multiple times",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Number of times to replay each request"
+    )
+    parser.add_argument(
+        "--keep-cache",
+        default=False,
+        action="store_true",
+        help="Do not clear the cache before each request, e.g., to measure cache hits",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Write the replayed requests with their stage timings to this slow log file",
+    )
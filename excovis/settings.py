@@ -4,6 +4,8 @@ Configuration is kept as global state.  This is not how Python apps usually do i
 way to do it with Dash.
 """
 
+import os
+
 # Currently constant settings.
 
 #: String to use for the Bootstrap "brand" at home.
@@ -41,6 +43,10 @@ DEBUG = False
 #: Paths/URLs with data sources.
 DATA_SOURCES = []
 
+#: Path or URL of the UCSC ``ncbiRefSeq.txt.gz`` file with the transcripts, e.g.,
+#: ``genes.NCBI_REF_SEQ_GRCH37``.
+TRANSCRIPTS_PATH = "/tmp/ncbiRefSeq.txt.gz"
+
 #: The type of the cache to use from {"filesystem", "redis"}
 CACHE_TYPE = "filesystem"
 #: Default cache timeout.
@@ -49,6 +55,92 @@ CACHE_DEFAULT_TIMEOUT = None
 CACHE_DIR = None
 #: For "redis" cache: the URL to use for connecting to the cache.
 CACHE_REDIS_URL = None
+#: For "filesystem" cache: bytes of coverage data and images to keep, ``0`` for no limit.
+CACHE_SIZE_LIMIT = 0
+#: For "filesystem" cache: seconds between rescans of the cache size with a size limit.
+CACHE_SCAN_INTERVAL = 10.0
+#: Seconds that concurrent identical computations wait for the one computing the result.
+SINGLE_FLIGHT_TIMEOUT = 300
+#: Seconds between checks whether another process has computed a result.
+SINGLE_FLIGHT_POLL_INTERVAL = 0.1
+#: Seconds between checks whether a computation was superseded by a newer request.
+CANCEL_CHECK_INTERVAL = 0.25
+
+#: Number of concurrent coverage loads from BAM files per server process.
+LOAD_CONCURRENCY = 4
+#: Number of coverage loads that may wait for a free slot.
+LOAD_QUEUE_SIZE = 16
+#: Seconds to wait for a free slot in a stage before reporting that the server is busy.
+ADMISSION_TIMEOUT = 10
+#: Milliseconds after which the browser retries requests that the busy server rejected.
+BUSY_RETRY_INTERVAL = 3000
+
+#: Number of render worker processes, ``0`` renders in the request thread.
+RENDER_WORKERS = 2
+#: Number of render jobs that may wait for a free render worker.
+RENDER_QUEUE_SIZE = 8
+#: Seconds to wait for a free slot in the render queue.
+RENDER_QUEUE_TIMEOUT = 10
+
+#: Number of background job worker processes, ``0`` computes everything in the request.
+JOB_WORKERS = 2
+#: Plots with at least this many samples are rendered in a background job.
+JOB_MIN_SAMPLES = 8
+#: Milliseconds between polls of the background job progress by the browser.
+JOB_POLL_INTERVAL = 1000
+#: Seconds after which a pending or running job without any update is considered lost.
+JOB_STALE_SECONDS = 600
+
+#: Path of the file with the gene symbols and transcript accessions to warm up at startup.
+WARMUP_PANEL = None
+#: Number of worker processes for the warm-up.
+WARMUP_WORKERS = 2
+#: Niceness increment of the warm-up worker processes such that serving requests has priority.
+WARMUP_NICE = 10
+
+#: Path of the file that accesses of transcripts and samples are appended to, disabled if empty.
+ACCESS_LOG_PATH = None
+#: Accesses of the same transcript and sample by a server process within this many seconds are
+#: logged once.
+ACCESS_LOG_DEDUP_SECONDS = 300
+#: Number of the most requested transcripts to warm up from the access log, ``0`` disables.
+POPULAR_TOP_K = 0
+#: Days of the access log to rank the transcripts by, older entries are dropped from the log.
+POPULAR_WINDOW_DAYS = 30
+#: Samples accessed within this many days are warmed up for the popular transcripts.
+POPULAR_RECENT_DAYS = 7
+#: Seconds that each warm-up of the popular transcripts may take, remaining tasks are skipped.
+POPULAR_BUDGET = 600
+#: Seconds between warm-ups of the popular transcripts, ``0`` only warms up at startup.
+POPULAR_INTERVAL = 0
+
+#: ``Cache-Control`` max age of rendered plots in seconds, they are addressed by content hash.
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60
+
+#: Thresholds for the "% bases >= N x" table metrics, defaults to ``plot.MIN_WARN``/``MIN_OK``.
+COVERAGE_THRESHOLDS = ()
+
+#: Number of rows per page of the coverage table.
+TABLE_PAGE_SIZE = 25
+
+#: Plots with more samples than this are rendered as heatmap.
+HEATMAP_MIN_SAMPLES = 20
+
+#: Number of bins for the downsampled coverage in the interactive plot, roughly its width in pixels.
+INTERACTIVE_BINS = 1000
+
+#: Path of the file that tracing spans are appended to, tracing is disabled if empty.
+TRACE_PATH = os.environ.get("EXCOVIS_TRACE") or None
+
+#: Path of the file that slow callback requests are appended to, disabled if empty.
+SLOWLOG_PATH = None
+#: Callback requests taking at least this many seconds are logged as slow.
+SLOWLOG_THRESHOLD = 2.0
+
+#: Bytes of shared memory coverage segments that each server process keeps mapped, ``0`` disables.
+SHM_BUDGET = 0
+#: Name prefix of the shared memory segments, the PID of the (master) server process.
+SHM_PREFIX = "excovis-%d" % os.getpid()
 
 # #: The height of the plot.
 # PLOT_HEIGHT = 500
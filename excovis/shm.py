@@ -0,0 +1,266 @@
+"""Shared memory for hot coverage arrays across the server worker processes.
+
+Each segment holds a few named ``numpy`` arrays (e.g., positions and depths of one sample for one
+transcript) and is created once per host.  Worker processes map existing segments zero-copy.  A
+header in each segment counts the processes that have it attached.  Each process keeps the
+segments it uses in an LRU list bounded by ``settings.SHM_BUDGET`` bytes.  When a process evicts
+a segment, it detaches and decrements the count, and the last process unlinks the segment.
+
+Segment names start with ``settings.SHM_PREFIX`` such that ``cleanup()`` can remove left-over
+segments when the server stops.  Requires Python 3.8+, otherwise the manager is disabled.
+"""
+
+from collections import OrderedDict
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+
+from logzero import logger
+import numpy as np
+
+from . import settings
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # pragma: no cover, Python < 3.8
+    resource_tracker = shared_memory = None
+
+#: Header layout: reference count and length of the JSON metadata.
+_HEADER = struct.Struct("<qq")
+#: Alignment of the arrays in the segment.
+_ALIGN = 64
+
+
+def _align(x):
+    return (x + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _unlink(name):
+    """Unlink segment ``name`` without ``SharedMemory.unlink()`` which also notifies the tracker."""
+    try:
+        shared_memory._posixshmem.shm_unlink("/" + name.lstrip("/"))
+    except FileNotFoundError:  # pragma: no cover
+        pass
+
+
+class _Segment:
+    """A shared memory segment attached by this process."""
+
+    def __init__(self, shm, arrays, meta):
+        #: The ``SharedMemory`` object.
+        self.shm = shm
+        #: ``dict`` of read-only arrays backed by ``shm``.
+        self.arrays = arrays
+        #: ``dict`` with additional JSON metadata.
+        self.meta = meta
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+
+class SharedArrayManager:
+    """Manage the shared memory segments attached by this process."""
+
+    def __init__(self):
+        #: Attached segments by key, in LRU order.
+        self.segments = OrderedDict()
+        #: Detached segments whose arrays were still referenced when closing.
+        self.zombies = []
+        #: Lock for the attributes.
+        self.lock = threading.RLock()
+
+    def forget(self):
+        """Forget the segments inherited by a forked process, their references are the parent's."""
+        for segment in list(self.segments.values()) + self.zombies:
+            segment.shm._mmap = None
+        self.segments = OrderedDict()
+        self.zombies = []
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def enabled():
+        """Return whether shared memory is used."""
+        return shared_memory is not None and settings.SHM_BUDGET > 0
+
+    @staticmethod
+    def _name(key):
+        return "%s-%s" % (settings.SHM_PREFIX, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16])
+
+    @staticmethod
+    def _host_lock():
+        """Return file object whose ``flock`` protects the reference counts on this host."""
+        path = os.path.join(tempfile.gettempdir(), "%s.lock" % settings.SHM_PREFIX)
+        return open(path, "a+b")
+
+    @staticmethod
+    def _untrack(shm):
+        """Prevent the resource tracker from unlinking ``shm`` when this process exits."""
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:  # pragma: no cover
+            pass
+
+    @staticmethod
+    def _add_ref(shm, delta):
+        """Add ``delta`` to reference count of ``shm``, must hold host lock, return new count."""
+        refs, meta_len = _HEADER.unpack_from(shm.buf, 0)
+        _HEADER.pack_into(shm.buf, 0, refs + delta, meta_len)
+        return refs + delta
+
+    @staticmethod
+    def _map(shm):
+        """Map arrays of the segment ``shm``."""
+        _, meta_len = _HEADER.unpack_from(shm.buf, 0)
+        header = json.loads(bytes(shm.buf[_HEADER.size : _HEADER.size + meta_len]))
+        arrays = {}
+        for name, dtype, shape, offset in header["arrays"]:
+            # ``np.frombuffer()`` holds a buffer export of the ``mmap`` such that closing ``shm``
+            # fails with ``BufferError`` instead of unmapping memory that arrays still use.
+            count = int(np.prod(shape))
+            arr = np.frombuffer(shm._mmap, dtype=dtype, count=count, offset=offset)
+            arr = arr.reshape(shape)
+            arr.flags.writeable = False
+            arrays[name] = arr
+        return _Segment(shm, arrays, header["meta"])
+
+    def get(self, key):
+        """Return pair of ``dict`` of arrays and metadata for ``key``, ``None`` if missing."""
+        if not self.enabled():
+            return None
+        with self.lock:
+            if key in self.segments:
+                self.segments.move_to_end(key)
+                segment = self.segments[key]
+                return segment.arrays, segment.meta
+            with self._host_lock() as lockf:
+                fcntl.flock(lockf, fcntl.LOCK_EX)
+                try:
+                    shm = shared_memory.SharedMemory(name=self._name(key))
+                except FileNotFoundError:
+                    return None
+                self._untrack(shm)
+                self._add_ref(shm, 1)
+            return self._insert(key, self._map(shm))
+
+    def put(self, key, arrays, meta=None):
+        """Copy ``arrays`` into a new segment for ``key`` and return its arrays and metadata.
+
+        If another process created the segment in the meantime, the existing one is used.
+        """
+        if not self.enabled():
+            return arrays, meta or {}
+        arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+        layout = []
+        offset = 0
+        for name, arr in arrays.items():
+            layout.append([name, arr.dtype.str, list(arr.shape), offset])
+            offset = _align(offset + arr.nbytes)
+        # Compute the header size and shift the array offsets behind it, leaving slack for the
+        # longer offsets in the final metadata.
+        meta_bytes = json.dumps({"arrays": layout, "meta": meta or {}}).encode("utf-8")
+        data_offset = _align(_HEADER.size + len(meta_bytes) + 64)
+        for entry in layout:
+            entry[3] += data_offset
+        meta_bytes = json.dumps({"arrays": layout, "meta": meta or {}}).encode("utf-8")
+
+        with self.lock:
+            if key in self.segments:
+                segment = self.segments[key]
+                return segment.arrays, segment.meta
+            with self._host_lock() as lockf:
+                fcntl.flock(lockf, fcntl.LOCK_EX)
+                try:
+                    shm = shared_memory.SharedMemory(
+                        name=self._name(key), create=True, size=max(1, data_offset + offset)
+                    )
+                except FileExistsError:
+                    shm = shared_memory.SharedMemory(name=self._name(key))
+                else:
+                    _HEADER.pack_into(shm.buf, 0, 0, len(meta_bytes))
+                    shm.buf[_HEADER.size : _HEADER.size + len(meta_bytes)] = meta_bytes
+                    for name, _, _, arr_offset in layout:
+                        arr = arrays[name]
+                        target = np.ndarray(
+                            arr.shape, dtype=arr.dtype, buffer=shm.buf, offset=arr_offset
+                        )
+                        target[...] = arr
+                        del target
+                self._untrack(shm)
+                self._add_ref(shm, 1)
+            return self._insert(key, self._map(shm))
+
+    def _insert(self, key, segment):
+        """Register ``segment`` and evict least recently used segments over budget."""
+        self.segments[key] = segment
+        used = sum(s.nbytes for s in self.segments.values())
+        while used > settings.SHM_BUDGET and len(self.segments) > 1:
+            _, evicted = self.segments.popitem(last=False)
+            used -= evicted.nbytes
+            self._detach(evicted)
+        self._close_zombies()
+        return segment.arrays, segment.meta
+
+    def _detach(self, segment):
+        """Release this process' reference to ``segment``, unlink it if it was the last one."""
+        with self._host_lock() as lockf:
+            fcntl.flock(lockf, fcntl.LOCK_EX)
+            if self._add_ref(segment.shm, -1) <= 0:
+                _unlink(segment.shm.name)
+        self.zombies.append(segment)
+
+    def _close_zombies(self):
+        """Close detached segments whose arrays are not referenced any more."""
+        zombies, self.zombies = self.zombies, []
+        for segment in zombies:
+            segment.arrays = None
+            try:
+                segment.shm.close()
+            except BufferError:  # arrays still in use
+                self.zombies.append(segment)
+
+    def clear(self):
+        """Detach all segments of this process, e.g., when it exits."""
+        with self.lock:
+            while self.segments:
+                self._detach(self.segments.popitem()[1])
+            self._close_zombies()
+            # Leave the mappings that are still in use to the process exit.
+            for segment in self.zombies:
+                segment.shm._mmap = None
+
+    def stats(self):
+        """Return ``dict`` with number and size of the segments attached by this process."""
+        with self.lock:
+            return {
+                "segments": len(self.segments),
+                "bytes": sum(s.nbytes for s in self.segments.values()),
+                "zombies": len(self.zombies),
+            }
+
+
+#: The manager of this process.
+manager = SharedArrayManager()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=manager.forget)
+
+
+def cleanup():
+    """Unlink all segments with ``settings.SHM_PREFIX`` left on this host (Linux only)."""
+    manager.clear()
+    for path in glob.glob("/dev/shm/%s-*" % settings.SHM_PREFIX):
+        logger.debug("Removing shared memory segment %s", path)
+        try:
+            os.unlink(path)
+        except OSError:  # pragma: no cover
+            pass
+    try:
+        os.unlink(os.path.join(tempfile.gettempdir(), "%s.lock" % settings.SHM_PREFIX))
+    except OSError:
+        pass
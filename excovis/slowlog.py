@@ -0,0 +1,109 @@
+"""Log of slow Dash callback requests.
+
+If ``settings.SLOWLOG_PATH`` is set, each callback request that takes at least
+``settings.SLOWLOG_THRESHOLD`` seconds is appended to that file as one JSON line.  The entry has
+the Dash request payload (the callback inputs and state, e.g., transcript, samples, padding and
+image options), the timings of the stages and timed functions (see ``.metrics``), and the cache
+results of the memoized functions.  ``excovis replay`` re-executes the logged requests.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+import attr
+import flask
+
+from . import settings, tracing
+
+#: The record of the current thread.
+_local = threading.local()
+#: Lock for writing to the log file.
+_lock = threading.Lock()
+
+
+@attr.s(auto_attribs=True)
+class Record:
+    """The timings and cache results recorded for one callback request."""
+
+    #: Name of the callback.
+    callback: str
+    #: Outcome of the callback, one of "ok", "prevented", "error".
+    outcome: str = "error"
+    #: Pairs of stage name and seconds, in order of completion.
+    stages: list = attr.Factory(list)
+    #: Number of cache results ("hit", "miss", "coalesced") by memoized function.
+    cache: dict = attr.Factory(dict)
+
+
+def current():
+    """Return ``Record`` of the current thread or ``None``."""
+    return getattr(_local, "record", None)
+
+
+def add_stage(name, seconds):
+    """Record that stage ``name`` took ``seconds`` in the current request, if recording."""
+    record = current()
+    if record is not None:
+        record.stages.append((name, round(seconds, 6)))
+
+
+def add_cache_result(function, result):
+    """Record the cache ``result`` of the memoized ``function`` in the current request."""
+    record = current()
+    if record is not None:
+        counts = record.cache.setdefault(function, {})
+        counts[result] = counts.get(result, 0) + 1
+
+
+def _write(entry):
+    line = json.dumps(entry, default=str) + "\n"
+    with _lock, open(settings.SLOWLOG_PATH, "a") as outputf:
+        outputf.write(line)
+
+
+@contextlib.contextmanager
+def recording(callback):
+    """Context manager recording the callback request in its body, yields the ``Record``.
+
+    The record is logged if the body took at least ``settings.SLOWLOG_THRESHOLD`` seconds.
+    Yields ``None`` if the slow log is disabled.
+    """
+    if not settings.SLOWLOG_PATH or current() is not None:
+        yield None
+        return
+    record = _local.record = Record(callback)
+    timestamp = time.time()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        _local.record = None
+        seconds = time.perf_counter() - start
+        if seconds >= settings.SLOWLOG_THRESHOLD:
+            payload = None
+            if flask.has_request_context():
+                payload = flask.request.get_json(silent=True)
+            _write(
+                {
+                    "timestamp": timestamp,
+                    "pid": os.getpid(),
+                    "trace": tracing.current_trace(),
+                    "callback": callback,
+                    "outcome": record.outcome,
+                    "seconds": round(seconds, 6),
+                    "stages": record.stages,
+                    "cache": record.cache,
+                    "payload": payload,
+                }
+            )
+
+
+def read(path):
+    """Yield the entries of the slow log at ``path``."""
+    with open(path, "rt") as inputf:
+        for line in inputf:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,111 @@
+"""Computation of coverage statistics per exon and sample.
+
+All statistics are computed in one vectorized pass over the depth matrix using segment
+reductions (``np.add.reduceat`` and friends) over the positions sorted by exon.  The result
+contains one table per statistic such that switching between them is a lookup.  This module is
+unaware of the Dash app.
+"""
+
+import numpy as np
+import pandas as pd
+
+#: Percentiles to compute in addition to the median.
+PERCENTILES = (10, 25, 75, 90)
+
+#: Names of the computed statistics, in display order.
+STATISTICS = ("min", "max", "median", "mean") + tuple("p%d" % q for q in PERCENTILES)
+
+
+def threshold_statistic(threshold):
+    """Return name of the statistic with the percentage of bases with depth ``>= threshold``."""
+    return "ge%d" % threshold
+
+
+def _percentile(sorted_depths, starts, counts, q):
+    """Return the ``q``-th percentile of each segment in ``sorted_depths``.
+
+    Uses linear interpolation between the closest ranks like ``np.percentile()``.
+    """
+    rank = starts + q / 100.0 * (counts - 1)
+    lo = np.floor(rank).astype(int)
+    hi = np.ceil(rank).astype(int)
+    frac = (rank - lo)[:, None]
+    return sorted_depths[lo] + (sorted_depths[hi] - sorted_depths[lo]) * frac
+
+
+def _segment_stats(depths, starts, thresholds):
+    """Compute all statistics for the segments of ``depths`` beginning at rows ``starts``.
+
+    ``depths`` has one row per position and one column per sample, rows must be grouped by
+    segment.  Returns ``dict`` mapping statistic name to array with one row per segment.
+    """
+    counts = np.diff(np.append(starts, len(depths)))
+    # Sort the values within each segment by shifting each segment into its own value band.
+    seg_ids = np.repeat(np.arange(len(starts)), counts)
+    offsets = (seg_ids * (depths.max() + 1.0))[:, None]
+    sorted_depths = np.sort(depths + offsets, axis=0) - offsets
+
+    result = {
+        "min": np.minimum.reduceat(depths, starts, axis=0),
+        "max": np.maximum.reduceat(depths, starts, axis=0),
+        "mean": np.add.reduceat(depths, starts, axis=0) / counts[:, None],
+        "median": _percentile(sorted_depths, starts, counts, 50),
+    }
+    for q in PERCENTILES:
+        result["p%d" % q] = _percentile(sorted_depths, starts, counts, q)
+    for threshold in thresholds:
+        result[threshold_statistic(threshold)] = (
+            100.0 * np.add.reduceat(depths >= threshold, starts, axis=0) / counts[:, None]
+        )
+    return result
+
+
+def compute_coverage_stats(coverage_df, thresholds=()):
+    """Compute the coverage statistics for the coverage data frame ``coverage_df``.
+
+    The data frame has the layout of ``store.load_coverage_df()``.  Returns a ``dict`` mapping
+    each name from ``STATISTICS`` and ``threshold_statistic(t)`` for each of ``thresholds`` to a
+    data frame with the columns ``feature``, ``exon_no``, and one column for each sample.  The
+    first row is for the whole transcript, followed by one row for each exon.
+    """
+    samples = list(coverage_df.columns[3:])
+    columns = ["feature", "exon_no"] + samples
+    names = STATISTICS + tuple(map(threshold_statistic, thresholds))
+    if coverage_df.empty:
+        return {name: pd.DataFrame(columns=columns) for name in names}
+
+    exon_nos = coverage_df["exon_no"].values
+    order = np.argsort(exon_nos, kind="stable")
+    exon_nos = exon_nos[order]
+    depths = coverage_df.loc[:, samples].values.astype(np.float64)[order]
+    starts = np.flatnonzero(np.append(True, exon_nos[1:] != exon_nos[:-1]))
+
+    per_exon = _segment_stats(depths, starts, thresholds)
+    per_tx = _segment_stats(depths, np.array([0]), thresholds)
+
+    result = {}
+    for name in names:
+        df_tx = pd.DataFrame(per_tx[name], columns=samples)
+        df_tx.insert(0, "exon_no", None)
+        df_tx.insert(0, "feature", "transcript")
+        df_exon = pd.DataFrame(per_exon[name], columns=samples)
+        df_exon.insert(0, "exon_no", exon_nos[starts])
+        df_exon.insert(0, "feature", "exon")
+        result[name] = pd.concat([df_tx, df_exon], ignore_index=True).round(1)
+    return result
+
+
+def to_long_df(coverage_stats):
+    """Convert result of ``compute_coverage_stats()`` into one data frame.
+
+    The result has the columns ``feature``, ``exon_no``, ``sample``, and one column for each
+    statistic.
+    """
+    result = None
+    for name, df in coverage_stats.items():
+        df = df.melt(id_vars=["feature", "exon_no"], var_name="sample", value_name=name)
+        if result is None:
+            result = df
+        else:
+            result[name] = df[name].values
+    return result
@@ -9,6 +9,7 @@ We have to get direct access to the collection for which we have a ticket.  Then
 perform a linear search for the collection's data objects and only THEN can we open them.
 """
 
+import hashlib
 from itertools import chain
 
 from logzero import logger
@@ -16,11 +17,17 @@ import pandas as pd
 from intervaltree import Interval, IntervalTree
 import pysam
 
-from . import data, genes, settings
+from . import admission, cancel, data, genes, metrics, settings, shm, stats, table
 from .exceptions import ExcovisException
-from .cache import cache
+from .cache import cache, process_memoize, single_flight
 
+#: Prefix for the cache keys of rendered images.
+IMAGE_KEY_PREFIX = "excovis-image-"
 
+
+# Also kept in process memory, shared copy-on-write with forked server workers.
+@process_memoize
+@single_flight
 @cache.memoize()
 def load_all_data():
     """Load all meta data information from ``settings.DATA_SOURCES``.
@@ -44,6 +51,7 @@ def load_all_data():
     return result
 
 
+@single_flight
 @cache.memoize()
 def load_data(id):
     for data in load_all_data():
@@ -70,6 +78,8 @@ def _load_fake_coverage(sample, chrom, tree):
     )
 
 
+@metrics.timed("load_coverage")
+@single_flight
 @cache.memoize()
 def load_coverage(sample_id, chrom, tree, transcript):
     """Load coverage for all positions in ``tree`` from ``chrom``."""
@@ -89,43 +99,139 @@ def load_coverage(sample_id, chrom, tree, transcript):
     pad = settings.MAX_EXON_PADDING
     rows = []
 
-    with pysam.AlignmentFile(dataset.path, "rb") as samfile:
-        for i, itv in enumerate(sorted(tree, key=lambda exon: exon.begin)):
-            if transcript.strand == "+":
-                exon_no = i + 1
-            else:
-                exon_no = len(transcript.exons) - i
-            seen = set()
-            for align_col in samfile.pileup(chrom, itv.begin - pad, itv.end + pad):
-                pos = align_col.reference_pos
-                if pos not in seen and itv.begin - pad <= pos < itv.end + pad:
-                    seen.add(pos)
-                    rows.append(
-                        {
-                            "chrom": chrom,
-                            "pos": pos + 1,
-                            "exon_no": exon_no,
-                            dataset.sample: align_col.get_num_aligned(),
-                        }
-                    )
-            for pos in range(itv.begin - pad, itv.end + pad):
-                if pos not in seen:
-                    rows.append(
-                        {"chrom": chrom, "pos": pos + 1, "exon_no": exon_no, dataset.sample: 0}
-                    )
-    result = pd.DataFrame(data=rows, columns=["chrom", "pos", "exon_no", dataset.sample])
-    result.sort_values("pos", inplace=True)
+    with admission.admit("load"):
+        with metrics.stage("bam_open", sample=dataset.sample):
+            samfile = pysam.AlignmentFile(dataset.path, "rb")
+        with samfile, metrics.stage("pileup", sample=dataset.sample, exons=len(tree)):
+            for i, itv in enumerate(sorted(tree, key=lambda exon: exon.begin)):
+                cancel.check()
+                if transcript.strand == "+":
+                    exon_no = i + 1
+                else:
+                    exon_no = len(transcript.exons) - i
+                seen = set()
+                for align_col in samfile.pileup(chrom, itv.begin - pad, itv.end + pad):
+                    pos = align_col.reference_pos
+                    if pos not in seen and itv.begin - pad <= pos < itv.end + pad:
+                        seen.add(pos)
+                        rows.append(
+                            {
+                                "chrom": chrom,
+                                "pos": pos + 1,
+                                "exon_no": exon_no,
+                                dataset.sample: align_col.get_num_aligned(),
+                            }
+                        )
+                for pos in range(itv.begin - pad, itv.end + pad):
+                    if pos not in seen:
+                        rows.append(
+                            {"chrom": chrom, "pos": pos + 1, "exon_no": exon_no, dataset.sample: 0}
+                        )
+    with metrics.stage("dataframe"):
+        result = pd.DataFrame(data=rows, columns=["chrom", "pos", "exon_no", dataset.sample])
+        result.sort_values("pos", inplace=True)
     return result
 
 
-@cache.memoize()
+def load_shared_coverage(sample_id, tree, transcript):
+    """Load coverage like ``load_coverage()`` through the host's shared memory segments.
+
+    The columns of the returned data frame are read-only views of the shared memory such that
+    each worker process of the host maps them instead of loading its own copy.  Falls back to
+    ``load_coverage()`` if shared memory is disabled.
+    """
+    key = "coverage:%s:%s" % (sample_id, transcript.tx_accession)
+    shared = shm.manager.get(key)
+    if shared is None:
+        df = load_coverage(sample_id, transcript.chrom, tree, transcript)
+        columns = list(df.columns[1:])
+        shared = shm.manager.put(
+            key,
+            {"c%d" % i: df[column].values for i, column in enumerate(columns)},
+            {"chrom": transcript.chrom, "columns": columns},
+        )
+    arrays, meta = shared
+    return pd.DataFrame(
+        dict(
+            [("chrom", meta["chrom"])]
+            + [(column, arrays["c%d" % i]) for i, column in enumerate(meta["columns"])]
+        ),
+        columns=["chrom"] + meta["columns"],
+        copy=False,
+    )
+
+
+def transcript_tree(transcript):
+    """Return ``IntervalTree`` with the exons of ``transcript`` for ``load_coverage()``."""
+    return IntervalTree([Interval(exon.begin, exon.end) for exon in transcript.exons])
+
+
+@metrics.timed("load_coverage_df")
 def load_coverage_df(exon_padding, tx_accession, samples):
+    """Load coverage data frame with the columns ``chrom``, ``pos``, ``exon_no``, and ``samples``.
+
+    Not memoized itself, the columns are views of the per-sample coverage from
+    ``load_shared_coverage()`` and not copied unless they need sorting.
+    """
     transcript = genes.load_transcripts()[tx_accession]
-    tree = IntervalTree([Interval(exon.begin, exon.end) for exon in transcript.exons])
-    ds = [load_coverage(sample, transcript.chrom, tree, transcript) for sample in samples]
-    df_coverage = pd.concat(
-        [ds[0]["chrom"], ds[0]["pos"], ds[0]["exon_no"]] + [d.iloc[:, 3] for d in ds],
-        axis="columns",
-    )
-    df_coverage.sort_values("pos", inplace=True)
+    tree = transcript_tree(transcript)
+    ds = [load_shared_coverage(sample, tree, transcript) for sample in samples]
+    with metrics.stage("dataframe"):
+        df_coverage = pd.DataFrame(
+            dict(
+                [(column, ds[0][column].values) for column in ("chrom", "pos", "exon_no")]
+                + [(d.columns[3], d.iloc[:, 3].values) for d in ds]
+            ),
+            copy=False,
+        )
+        if not df_coverage["pos"].is_monotonic_increasing:
+            df_coverage = df_coverage.sort_values("pos")
     return df_coverage
+
+
+@single_flight
+@cache.memoize()
+def load_on_target_coverage_df(tx_accession, samples):
+    """Load coverage data frame for ``samples`` restricted to the exons of ``tx_accession``."""
+    transcript = genes.load_transcripts()[tx_accession]
+    coverage_df = load_coverage_df(0, tx_accession, samples)
+    return coverage_df[genes.on_target_mask(transcript, coverage_df["pos"].values)]
+
+
+@single_flight
+@cache.memoize()
+def load_coverage_stats(tx_accession, samples, thresholds=()):
+    """Load the on-target coverage statistics of ``samples`` for ``tx_accession``.
+
+    See ``stats.compute_coverage_stats()`` for the result.
+    """
+    coverage_df = load_on_target_coverage_df(tx_accession, samples)
+    return stats.compute_coverage_stats(coverage_df, tuple(thresholds))
+
+
+def load_coverage_table(tx_accession, samples, thresholds, aggregation, sort_by, filter_query):
+    """Load the filtered and sorted coverage table for the given statistic ``aggregation``.
+
+    Only the statistics are cached, filtering and sorting them is cheap and done per request.
+    """
+    coverage_stats = load_coverage_stats(tx_accession, samples, thresholds)
+    # Fall back to the mean for a cleared or unknown selection.
+    table_df = coverage_stats.get(aggregation, coverage_stats["mean"])
+    return table.sort_df(table.filter_df(table_df, filter_query), sort_by)
+
+
+def store_image(png):
+    """Store the rendered image ``png`` in the cache and return its SHA256 hex digest."""
+    digest = hashlib.sha256(png).hexdigest()
+    cache.set(IMAGE_KEY_PREFIX + digest, png)
+    return digest
+
+
+def load_image(digest):
+    """Load rendered image with the given ``digest`` from the cache, ``None`` if missing."""
+    return cache.get(IMAGE_KEY_PREFIX + digest)
+
+
+def has_image(digest):
+    """Return whether the rendered image with the given ``digest`` is in the cache."""
+    return cache.has(IMAGE_KEY_PREFIX + digest)
@@ -0,0 +1,321 @@
+"""Generation of synthetic data sets for benchmarks and load tests.
+
+Writes a small UCSC ``ncbiRefSeq.txt.gz`` file with synthetic genes and one indexed BAM file per
+sample with random reads on the exons of these genes.  The depth of coverage follows a profile
+and may drop out in given regions or random exons.  The data is reproducible for a given seed
+and exercises the real ``pysam`` code paths without any patient data.  This module is unaware of
+the Dash app.
+"""
+
+import gzip
+import math
+import os
+import typing
+
+import attr
+from logzero import logger
+import numpy as np
+import pysam
+
+from . import settings
+
+#: The depth of coverage profiles: the same depth everywhere, increasing from the first to the
+#: last exon of each gene, or oscillating along the chromosome.
+PROFILES = ("flat", "gradient", "wave")
+#: Period of the ``"wave"`` profile in base pairs.
+WAVE_PERIOD = 5_000
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class GeneSpec:
+    """Layout of a synthetic gene with exons of equal length and equal spacing."""
+
+    #: The gene symbol.
+    gene_symbol: str
+    #: The transcript identifier.
+    tx_accession: str
+    #: Chromosome name.
+    chrom: str
+    #: 0-based begin position of the first exon.
+    begin: int
+    #: Number of exons.
+    exons: int
+    #: Length of each exon.
+    exon_length: int
+    #: Length of each intron.
+    intron_length: int
+    #: Strand of the gene.
+    strand: str = "+"
+
+    @property
+    def end(self):
+        """End position of the last exon."""
+        return self.exon_ranges()[-1][1]
+
+    def exon_ranges(self):
+        """Return list of 0-based ``(begin, end)`` of the exons."""
+        step = self.exon_length + self.intron_length
+        return [
+            (self.begin + i * step, self.begin + i * step + self.exon_length)
+            for i in range(self.exons)
+        ]
+
+
+#: The synthetic genes by size, TTN has 363 exons spanning about 280 kbp.
+GENES = {
+    "small": GeneSpec("SMALL", "NM_900001.1", "1", 10_000, 3, 200, 800),
+    "medium": GeneSpec("MEDIUM", "NM_900002.1", "1", 100_000, 40, 150, 350, "-"),
+    "huge": GeneSpec("TTN", "NM_900003.1", "1", 300_000, 363, 280, 490, "-"),
+}
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Config:
+    """Configuration of a synthetic data set."""
+
+    #: The genes to write and cover with reads.
+    genes: typing.Tuple[GeneSpec, ...] = tuple(GENES.values())
+    #: Number of samples.
+    samples: int = 10
+    #: Prefix of the sample names, followed by the sample number.
+    sample_prefix: str = "S"
+    #: Mean depth of coverage, each sample's depth is scaled by a random factor in ``[0.5, 1.5]``.
+    depth: float = 30.0
+    #: The depth of coverage profile, one of ``PROFILES``.
+    profile: str = "flat"
+    #: Probability of each exon of each sample to have no reads.
+    dropout_rate: float = 0.0
+    #: Regions ``(chrom, begin, end)`` (0-based, half-open) without reads in all samples.
+    dropouts: typing.Tuple[typing.Tuple[str, int, int], ...] = ()
+    #: Lengths of the chromosomes by name, defaults to end of the last gene plus 10 kbp.
+    chrom_sizes: typing.Dict[str, int] = attr.Factory(dict)
+    #: Read length.
+    read_length: int = 100
+    #: Number of filler transcripts on other chromosomes in the ``ncbiRefSeq.txt.gz`` file.
+    filler_transcripts: int = 0
+    #: Seed of the random number generator.
+    seed: int = 42
+
+    def sample_names(self):
+        """Return list of the sample names."""
+        width = len(str(self.samples))
+        return ["%s%0*d" % (self.sample_prefix, width, i + 1) for i in range(self.samples)]
+
+    def all_chrom_sizes(self):
+        """Return the chromosome sizes with defaults for the chromosomes of the genes."""
+        result = {}
+        for gene in self.genes:
+            result[gene.chrom] = max(result.get(gene.chrom, 0), gene.end + 10_000)
+        result.update(self.chrom_sizes)
+        return result
+
+
+def refseq_line(chrom, tx_accession, gene_symbol, strand, exon_ranges):
+    """Return line of ``ncbiRefSeq.txt`` for a transcript with the given exons."""
+    begin, end = exon_ranges[0][0], exon_ranges[-1][1]
+    return "\t".join(
+        map(
+            str,
+            (
+                0,
+                tx_accession,
+                "chr%s" % chrom,
+                strand,
+                begin,
+                end,
+                begin,
+                end,
+                len(exon_ranges),
+                "".join("%d," % b for b, _ in exon_ranges),
+                "".join("%d," % e for _, e in exon_ranges),
+                0,
+                gene_symbol,
+                "cmpl",
+                "cmpl",
+                "",
+            ),
+        )
+    )
+
+
+def write_refseq(config, path):
+    """Write ``ncbiRefSeq.txt.gz`` file with the genes and filler transcripts of ``config``."""
+    rng = np.random.default_rng(config.seed)
+    with gzip.open(path, "wt") as outputf:
+        for gene in config.genes:
+            print(
+                refseq_line(
+                    gene.chrom, gene.tx_accession, gene.gene_symbol, gene.strand, gene.exon_ranges()
+                ),
+                file=outputf,
+            )
+        for i in range(config.filler_transcripts):
+            lengths = rng.integers(100, 2_000, size=2 * rng.integers(1, 30))
+            bounds = 1_000 + np.cumsum(lengths)
+            print(
+                refseq_line(
+                    2 + i % 21,
+                    "NM_%06d.1" % i,
+                    "FILLER%d" % (i // 2),
+                    "+-"[i % 2],
+                    list(zip(bounds[::2], bounds[1::2])),
+                ),
+                file=outputf,
+            )
+
+
+def depth_profile(config, gene, positions, depth):
+    """Return the mean depth of coverage at the 0-based ``positions`` of ``gene``."""
+    if config.profile == "gradient":
+        span = max(1, gene.end - gene.begin)
+        return depth * (0.2 + 1.6 * np.clip((positions - gene.begin) / span, 0.0, 1.0))
+    elif config.profile == "wave":
+        return depth * (1.0 + 0.8 * np.sin(2.0 * math.pi * positions / WAVE_PERIOD))
+    else:
+        return np.full(len(positions), depth)
+
+
+def read_starts(config, rng, depth):
+    """Return the sorted 0-based start positions of the reads of one sample by chromosome."""
+    pad = settings.MAX_EXON_PADDING
+    result = {}
+    for gene in config.genes:
+        for begin, end in gene.exon_ranges():
+            if rng.random() < config.dropout_rate:
+                continue
+            # Each position starts a Poisson distributed number of reads.
+            positions = np.arange(max(0, begin - pad - config.read_length + 1), end + pad)
+            lam = depth_profile(config, gene, positions, depth) / config.read_length
+            result.setdefault(gene.chrom, []).append(np.repeat(positions, rng.poisson(lam)))
+    for chrom, starts in list(result.items()):
+        starts = np.sort(np.concatenate(starts))
+        for dropout_chrom, begin, end in config.dropouts:
+            if dropout_chrom == chrom:
+                starts = starts[(starts + config.read_length <= begin) | (starts >= end)]
+        result[chrom] = starts
+    return result
+
+
+def write_bam(config, path, sample, seed):
+    """Write indexed BAM file at ``path`` for ``sample`` with the read group's sample name."""
+    rng = np.random.default_rng(seed)
+    depth = config.depth * rng.uniform(0.5, 1.5)
+    starts = read_starts(config, rng, depth)
+    chrom_sizes = config.all_chrom_sizes()
+    sam_path = path[: -len(".bam")] + ".sam"
+    cigar = "%dM" % config.read_length
+    with open(sam_path, "wt") as outputf:
+        outputf.write("@HD\tVN:1.6\tSO:coordinate\n")
+        for chrom, size in chrom_sizes.items():
+            outputf.write("@SQ\tSN:%s\tLN:%d\n" % (chrom, size))
+        outputf.write("@RG\tID:%s\tSM:%s\n" % (sample, sample))
+        for chrom in chrom_sizes:
+            outputf.writelines(
+                "r%d\t0\t%s\t%d\t60\t%s\t*\t0\t0\t*\t*\tRG:Z:%s\n"
+                % (i, chrom, start + 1, cigar, sample)
+                for i, start in enumerate(starts.get(chrom, ()))
+            )
+    pysam.sort("-o", path, sam_path)
+    pysam.index(path)
+    os.unlink(sam_path)
+
+
+def synthesize(config, path):
+    """Write the synthetic data set of ``config`` into the directory ``path``.
+
+    The transcripts are written to ``ncbiRefSeq.txt.gz`` and the BAM files to the sub directory
+    ``bam``.  Returns pair of the paths of the transcripts file and the BAM directory.
+    """
+    refseq_path = os.path.join(path, "ncbiRefSeq.txt.gz")
+    bam_dir = os.path.join(path, "bam")
+    os.makedirs(bam_dir, exist_ok=True)
+    logger.info("Writing transcripts to %s", refseq_path)
+    write_refseq(config, refseq_path)
+    for i, sample in enumerate(config.sample_names()):
+        logger.debug("Writing BAM file for sample %s", sample)
+        write_bam(config, os.path.join(bam_dir, "%s.bam" % sample), sample, config.seed + i + 1)
+    logger.info("Wrote %d BAM file(s) to %s", config.samples, bam_dir)
+    return refseq_path, bam_dir
+
+
+def parse_chrom_size(value):
+    """Parse ``CHROM:LENGTH`` into pair."""
+    chrom, length = value.rsplit(":", 1)
+    return chrom, int(length)
+
+
+def parse_region(value):
+    """Parse 1-based, inclusive ``CHROM:BEGIN-END`` into 0-based, half-open triple."""
+    chrom, region = value.rsplit(":", 1)
+    begin, end = region.replace(",", "").split("-")
+    return chrom, int(begin) - 1, int(end)
+
+
+def run(args, parser):
+    """Main entry point after argument parsing."""
+    config = Config(
+        genes=tuple(GENES[size] for size in args.genes or GENES),
+        samples=args.samples,
+        sample_prefix=args.sample_prefix,
+        depth=args.depth,
+        profile=args.profile,
+        dropout_rate=args.dropout_rate,
+        dropouts=tuple(args.dropouts),
+        chrom_sizes=dict(args.chrom_sizes),
+        read_length=args.read_length,
+        filler_transcripts=args.filler_transcripts,
+        seed=args.seed,
+    )
+    refseq_path, bam_dir = synthesize(config, args.output_dir)
+    logger.info(
+        "Serve with: excovis run --data-source %s --transcripts-path %s", bam_dir, refseq_path
+    )
+
+
+def setup_argparse(parser):
+    """Setup argparse sub parser."""
+    parser.add_argument("output_dir", help="Directory to write the data set to")
+    parser.add_argument(
+        "--gene",
+        dest="genes",
+        default=[],
+        action="append",
+        choices=list(GENES),
+        help="Size of a gene to generate, may be given multiple times, default is all",
+    )
+    parser.add_argument("--samples", type=int, default=10, help="Number of samples")
+    parser.add_argument("--sample-prefix", default="S", help="Prefix of the sample names")
+    parser.add_argument("--depth", type=float, default=30.0, help="Mean depth of coverage")
+    parser.add_argument(
+        "--profile", default="flat", choices=PROFILES, help="Depth of coverage profile"
+    )
+    parser.add_argument(
+        "--dropout-rate",
+        type=float,
+        default=0.0,
+        help="Probability of each exon of each sample to have no reads",
+    )
+    parser.add_argument(
+        "--dropout",
+        dest="dropouts",
+        type=parse_region,
+        default=[],
+        action="append",
+        help="Region CHROM:BEGIN-END without reads in all samples, may be given multiple times",
+    )
+    parser.add_argument(
+        "--chrom-size",
+        dest="chrom_sizes",
+        type=parse_chrom_size,
+        default=[],
+        action="append",
+        help="Chromosome length as CHROM:LENGTH, may be given multiple times",
+    )
+    parser.add_argument("--read-length", type=int, default=100, help="Read length")
+    parser.add_argument(
+        "--filler-transcripts",
+        type=int,
+        default=0,
+        help="Number of additional transcripts on other chromosomes in the transcripts file",
+    )
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the random numbers")
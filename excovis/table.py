@@ -0,0 +1,96 @@
+"""Server-side filtering, sorting and paging of the coverage table.
+
+The functions in this module implement the ``filter_query``, ``sort_by`` and paging semantics
+of ``dash_table.DataTable`` with ``*_action="custom"`` on ``pandas`` data frames.  This module is
+unaware of the Dash app.
+"""
+
+import math
+import re
+
+#: Operators supported in ``filter_query``, longer operators first.
+FILTER_OPERATORS = (
+    ("ge ", ">="),
+    ("le ", "<="),
+    ("lt ", "<"),
+    ("gt ", ">"),
+    ("ne ", "!="),
+    ("eq ", "="),
+    ("contains ",),
+)
+
+#: Regular expression for the column name in a filter query part.
+_RE_COLUMN = re.compile(r"^\{(?P<column>[^}]+)\}\s*(?P<rest>.*)$")
+
+
+def _parse_value(value, numeric=True):
+    """Parse value from filter query part, as number if ``numeric`` and possible."""
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in "'\"`":
+        return value[1:-1]
+    elif not numeric:
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def split_filter_part(filter_part):
+    """Split one ``&&``-separated part of ``filter_query`` into column, operator, and value.
+
+    Returns ``(None, None, None)`` if the part cannot be parsed.
+    """
+    m = _RE_COLUMN.match(filter_part.strip())
+    if not m:
+        return None, None, None
+    rest = m.group("rest")
+    for operators in FILTER_OPERATORS:
+        for operator in operators:
+            if rest.startswith(operator):
+                name = operators[0].strip()
+                # Substrings are matched as typed, e.g., "2" and not "2.0".
+                value = _parse_value(rest[len(operator) :], numeric=name != "contains")
+                return m.group("column"), name, value
+    return None, None, None
+
+
+def filter_df(df, filter_query):
+    """Filter ``df`` by the ``DataTable`` ``filter_query``, unparseable parts are ignored."""
+    for filter_part in (filter_query or "").split(" && "):
+        column, operator, value = split_filter_part(filter_part)
+        if column not in df.columns:
+            continue
+        elif operator == "contains":
+            df = df.loc[df[column].astype(str).str.contains(value, regex=False)]
+        elif isinstance(value, float) and df[column].dtype.kind not in "iuf":
+            # Compare numerically, ignoring rows that have no number in this column.
+            values = df[column].apply(lambda x: x if isinstance(x, (int, float)) else math.nan)
+            df = df.loc[getattr(values.astype(float), operator)(value)]
+        else:
+            try:
+                df = df.loc[getattr(df[column], operator)(value)]
+            except TypeError:
+                continue  # e.g., text compared to numbers
+    return df
+
+
+def sort_df(df, sort_by):
+    """Sort ``df`` by the ``DataTable`` ``sort_by`` list."""
+    sort_by = [col for col in (sort_by or []) if col["column_id"] in df.columns]
+    if not sort_by:
+        return df
+    return df.sort_values(
+        [col["column_id"] for col in sort_by],
+        ascending=[col["direction"] == "asc" for col in sort_by],
+        kind="mergesort",
+        na_position="first",
+    )
+
+
+def page_df(df, page_current, page_size):
+    """Return pair of the records on page ``page_current`` and the number of pages."""
+    page_count = max(1, math.ceil(len(df) / page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    begin = page_current * page_size
+    return df.iloc[begin : begin + page_size].to_dict("records"), page_count
@@ -0,0 +1,91 @@
+"""Lightweight tracing of the request path.
+
+If ``settings.TRACE_PATH`` is set (environment variable ``EXCOVIS_TRACE``), each span is
+appended to that file as one JSON line holding a "complete" event in the Chrome trace event
+format.  ``jq -s . FILE > trace.json`` yields a file that can be opened in ``chrome://tracing``
+or Perfetto.  All spans of one request carry the ID of the outermost span as ``trace`` argument.
+When tracing is disabled, ``span()`` returns a shared no-op context manager.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from . import settings
+
+#: The no-op span used when tracing is disabled.
+_NOOP = contextlib.nullcontext()
+
+#: The trace ID of the current thread.
+_local = threading.local()
+
+#: The trace file of this process, its PID, and a lock for writing.
+_file = None
+_file_pid = None
+_lock = threading.Lock()
+
+
+def current_trace():
+    """Return ID of the trace of the current thread or ``None``."""
+    return getattr(_local, "trace", None)
+
+
+def _write(event):
+    """Append ``event`` to the trace file, (re)open it in new processes."""
+    global _file, _file_pid
+    line = json.dumps(event, default=str) + "\n"
+    with _lock:
+        if _file is None or _file_pid != os.getpid():
+            _file = open(settings.TRACE_PATH, "a")
+            _file_pid = os.getpid()
+        _file.write(line)
+        _file.flush()
+
+
+class _Span:
+    """A span that is written to the trace file when it ends."""
+
+    __slots__ = ("name", "args", "root", "trace", "ts", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.root = current_trace() is None
+        if self.root:
+            _local.trace = uuid.uuid4().hex[:16]
+        self.trace = _local.trace
+        self.ts = time.time() * 1e6
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        args = dict(self.args, trace=self.trace)
+        if exc_type is not None:
+            args["error"] = exc_type.__name__
+        _write(
+            {
+                "name": self.name,
+                "cat": "excovis",
+                "ph": "X",
+                "ts": round(self.ts),
+                "dur": round((time.perf_counter() - self.start) * 1e6),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
+        if self.root:
+            _local.trace = None
+        return False
+
+
+def span(name, **args):
+    """Return context manager tracing its body as span ``name`` with the given ``args``."""
+    if not settings.TRACE_PATH:
+        return _NOOP
+    return _Span(name, args)
@@ -1,13 +1,15 @@
 """Definitions of Dash layout."""
 
 import os.path
+import uuid
 
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
+import dash_table
 from natsort import natsorted
 
-from . import settings, store, genes
+from . import plot, settings, stats, store, genes
 from .__init__ import __version__
 
 
@@ -67,8 +69,28 @@ def render_form():
                 min=0,
                 max=settings.MAX_MAX_COVERAGE,
                 marks={i: "%dx" % i for i in range(0, settings.MAX_MAX_COVERAGE + 1, 50)},
+            ),
+            dbc.Label("Warning/OK thresholds", html_for="input_thresholds", className="pt-3 mt-3"),
+            dcc.RangeSlider(
+                id="input_thresholds",
+                value=[plot.MIN_WARN, plot.MIN_OK],
+                min=0,
+                max=settings.MAX_MAX_COVERAGE,
+                marks={i: "%dx" % i for i in range(0, settings.MAX_MAX_COVERAGE + 1, 50)},
+                pushable=1,
                 className="pb-3",
             ),
+            dbc.Label("Plot Mode", html_for="input_plot_mode"),
+            dcc.Dropdown(
+                id="input_plot_mode",
+                options=[
+                    {"label": "Image", "value": "image"},
+                    {"label": "Image (heatmap)", "value": "heatmap"},
+                    {"label": "Interactive", "value": "interactive"},
+                ],
+                value="image",
+                clearable=False,
+            ),
             html.Hr(),
             dbc.Label("Select Gene", html_for="input_gene"),
             dcc.Dropdown(id="input_gene", options=genes_options),
@@ -81,14 +103,55 @@ def render_form():
             dbc.Label("Coverage Aggregation", html_for="input_aggregation"),
             dcc.Dropdown(
                 id="input_aggregation",
-                options=[{"label": agg, "value": agg} for agg in ("min", "max", "median", "mean")],
+                options=[{"label": agg, "value": agg} for agg in ("min", "max", "median", "mean")]
+                + [{"label": "%dth percentile" % q, "value": "p%d" % q} for q in stats.PERCENTILES]
+                + [
+                    {"label": "%% bases >= %dx" % t, "value": stats.threshold_statistic(t)}
+                    for t in plot.coverage_thresholds()
+                ],
                 value="mean",
+                clearable=False,
             ),
         ],
         id="menu",
     )
 
 
+def render_job_progress(message, progress):
+    """Render progress bar of a background job, ``progress`` is a fraction."""
+    percent = int(100 * progress)
+    return html.Div(
+        children=[
+            html.Div(message, className="text-muted small"),
+            dbc.Progress(value=percent, striped=True, animated=True, children="%d%%" % percent),
+        ],
+        className="my-3",
+    )
+
+
+def render_table():
+    """Render the coverage table, the data is paged, sorted and filtered on the server."""
+    return html.Div(
+        children=[
+            html.H3(id="coverage-table-title"),
+            html.Div(id="download-links", className="pb-2"),
+            dash_table.DataTable(
+                id="coverage-table",
+                page_action="custom",
+                page_current=0,
+                page_size=settings.TABLE_PAGE_SIZE,
+                sort_action="custom",
+                sort_mode="multi",
+                sort_by=[],
+                filter_action="custom",
+                filter_query="",
+            ),
+        ],
+        id="page-table",
+        style={"display": "none"},
+    )
+
+
 def render_main_content():
     """Render page main content"""
     return html.Div(
@@ -99,8 +162,33 @@ def render_main_content():
                     dbc.Col(
                         # content will be rendered in this element
                         children=[
+                            # Enabled to retry the callbacks while the server is busy.
+                            *[
+                                dcc.Interval(
+                                    id="%s-retry" % name,
+                                    interval=settings.BUSY_RETRY_INTERVAL,
+                                    disabled=True,
+                                )
+                                for name in ("plot", "graph", "table")
+                            ],
+                            dcc.Store(id="image-options"),
+                            # State of the plot rendered in the background and its result.
+                            dcc.Store(id="plot-job"),
+                            dcc.Store(id="plot-job-result"),
+                            dcc.Interval(
+                                id="plot-job-interval",
+                                interval=settings.JOB_POLL_INTERVAL,
+                                disabled=True,
+                            ),
+                            html.Div(id="plot-job-progress"),
                             dcc.Loading(children=[html.Div(id="page-plot")]),
-                            dcc.Loading(children=[html.Div(id="page-table")]),
+                            dcc.Store(id="coverage-store"),
+                            html.Div(
+                                children=[dcc.Graph(id="cov-graph", config={"displaylogo": False})],
+                                id="page-graph",
+                                style={"display": "none"},
+                            ),
+                            dcc.Loading(children=[render_table()]),
                         ],
                         className="col-10",
                     ),
@@ -163,6 +251,8 @@ def build_layout():
         children=[
             # Represents the URL bar, doesn't render anything.
             dcc.Location(id="url", refresh=False),
+            # Identifies the page load for cancelling its superseded requests.
+            dcc.Store(id="session-id", data=str(uuid.uuid4())),
             # Navbar, content, footer.
             render_navbar(),
             render_main_content(),
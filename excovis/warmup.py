@@ -0,0 +1,324 @@
+"""Warm-up of the cache for a panel of genes and the popular transcripts.
+
+The panel file lists gene symbols or transcript accessions, separated by white space or commas,
+``#`` starts a comment.  At startup, a spawned coordinator process loads the coverage of all
+samples for each transcript of the panel (all transcripts of a gene) in a pool of worker
+processes.  The per-sample coverage is shared by all selections of samples, unlike the table
+statistics which are cached for the exact selection and thus not warmed up.  Then, the coverage
+of the most requested transcripts for the recently active samples of the access log (see
+``.accesslog``) is loaded within a time budget, optionally repeated on a schedule.  The progress is kept in the
+cache such that each server process can report it through the readiness endpoint of the app.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+import os
+import re
+import signal
+import time
+
+from logzero import logger
+
+from . import accesslog, jobs, settings
+from .cache import cache
+
+#: Cache key of the warm-up progress.
+PROGRESS_KEY = "excovis-warmup"
+
+#: Warm-up has not started yet.
+PENDING = "pending"
+#: Warm-up is running.
+RUNNING = "running"
+#: Warm-up has finished, possibly with failed tasks.
+DONE = "done"
+#: Warm-up has failed.
+FAILED = "failed"
+
+#: The coordinator process.
+_process = None
+
+
+def read_panel(path):
+    """Return list of the gene symbols and transcript accessions in the panel file ``path``."""
+    result = []
+    with open(path, "rt") as inputf:
+        for line in inputf:
+            result += [entry for entry in re.split(r"[\s,]+", line.split("#")[0]) if entry]
+    return result
+
+
+def resolve_panel(entries, transcripts):
+    """Return pair of the transcript accessions for the panel ``entries`` and the unknown ones.
+
+    Accessions are used as is, gene symbols are resolved to all transcripts of the gene.
+    """
+    by_gene = {}
+    for transcript in transcripts.values():
+        by_gene.setdefault(transcript.gene_symbol, []).append(transcript.tx_accession)
+    tx_accessions, unknown = [], []
+    for entry in entries:
+        if entry in transcripts:
+            tx_accessions.append(entry)
+        elif entry in by_gene:
+            tx_accessions += sorted(by_gene[entry])
+        else:
+            unknown.append(entry)
+    return list(dict.fromkeys(tx_accessions)), unknown
+
+
+def get_progress():
+    """Return progress ``dict`` with ``state``, ``total``, ``done``, ``failed``, and more.
+
+    Returns ``None`` if no warm-up was started.
+    """
+    return cache.get(PROGRESS_KEY)
+
+
+def _set_progress(**values):
+    progress = get_progress() or {}
+    progress.update(values)
+    # Never expire, the readiness endpoint must not fall back to "pending".
+    cache.set(PROGRESS_KEY, progress, timeout=0)
+
+
+def popular_enabled():
+    """Return whether the popular transcripts of the access log are warmed up."""
+    return bool(settings.ACCESS_LOG_PATH and settings.POPULAR_TOP_K)
+
+
+def enabled():
+    """Return whether any warm-up is configured."""
+    return bool(settings.WARMUP_PANEL) or popular_enabled()
+
+
+def is_ready():
+    """Return whether the initial warm-up has finished, ``True`` if there is none."""
+    if not enabled():
+        return True
+    progress = get_progress()
+    return bool(progress) and progress["state"] in (DONE, FAILED)
+
+
+def _warm_coverage(tx_accession, sample_id):
+    """Load the coverage of ``sample_id`` for ``tx_accession`` into the cache."""
+    from . import genes, store
+
+    transcript = genes.load_transcripts()[tx_accession]
+    tree = store.transcript_tree(transcript)
+    store.load_coverage(sample_id, transcript.chrom, tree, transcript)
+
+
+def _increment(name, section=None):
+    """Increment the counter ``name`` of the progress or of its ``section``."""
+    progress = get_progress()
+    if section is None:
+        _set_progress(**{name: progress.get(name, 0) + 1})
+    else:
+        values = dict(progress.get(section) or {})
+        values[name] = values.get(name, 0) + 1
+        _set_progress(**{section: values})
+
+
+def _run_tasks(pool, tasks, section=None, deadline=None):
+    """Run the ``(fn, *args)`` ``tasks`` in ``pool`` and update the progress.
+
+    Only a few tasks are queued at a time such that no more tasks are started after the
+    ``deadline``.  Returns the number of skipped tasks.
+    """
+    max_pending = 2 * max(1, settings.WARMUP_WORKERS)
+    pending = set()
+    submitted = 0
+    try:
+        while True:
+            while (
+                submitted < len(tasks)
+                and len(pending) < max_pending
+                and (deadline is None or time.time() < deadline)
+            ):
+                pending.add(pool.submit(*tasks[submitted]))
+                submitted += 1
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future.exception() is not None:
+                    logger.warning("Warm-up task failed: %s", future.exception())
+                    _increment("failed", section)
+                else:
+                    _increment("done", section)
+    finally:
+        for future in pending:
+            future.cancel()
+    return len(tasks) - submitted
+
+
+def _init_worker(values):
+    """Initialize warm-up worker process with lower priority than the server processes."""
+    # Apply the server's settings first, e.g., ``WARMUP_NICE``.
+    jobs.init_worker(values)
+    if settings.WARMUP_NICE:
+        os.nice(settings.WARMUP_NICE)
+
+
+def _make_pool(values):
+    """Return process pool for the warm-up tasks."""
+    return ProcessPoolExecutor(
+        max_workers=settings.WARMUP_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(values,),
+    )
+
+
+def _warm_panel(values):
+    """Warm up the cache for all samples and the transcripts of ``settings.WARMUP_PANEL``."""
+    from . import genes, store
+
+    tx_accessions, unknown = resolve_panel(
+        read_panel(settings.WARMUP_PANEL), genes.load_transcripts()
+    )
+    if unknown:
+        logger.warning("Unknown genes or transcripts in warm-up panel: %s", unknown)
+    samples = [data.id for data in store.load_all_data()]
+    tasks = [
+        (_warm_coverage, tx_accession, sample)
+        for tx_accession in tx_accessions
+        for sample in samples
+    ]
+    _set_progress(
+        total=len(tasks),
+        transcripts=tx_accessions,
+        unknown=unknown,
+        samples=len(samples),
+    )
+    logger.info("Warming up %d transcript(s) for %d sample(s)", len(tx_accessions), len(samples))
+    with _make_pool(values) as pool:
+        _run_tasks(pool, tasks)
+
+
+def _warm_popular(values):
+    """Warm up the coverage of the popular transcripts and recent samples of the access log.
+
+    Stops starting tasks after ``settings.POPULAR_BUDGET`` seconds.  The progress is kept in the
+    ``"popular"`` section.
+    """
+    from . import genes, store
+
+    started = time.time()
+    tx_accessions, samples = accesslog.popular(started)
+    transcripts = genes.load_transcripts()
+    tx_accessions = [tx_accession for tx_accession in tx_accessions if tx_accession in transcripts]
+    available = {data.id for data in store.load_all_data()}
+    samples = [sample for sample in samples if sample in available]
+    # The most popular transcripts and most recent samples first, in case the budget runs out.
+    tasks = [
+        (_warm_coverage, tx_accession, sample)
+        for tx_accession in tx_accessions
+        for sample in samples
+    ]
+    runs = (get_progress().get("popular") or {}).get("runs", 0)
+    _set_progress(
+        popular={
+            "state": RUNNING,
+            "runs": runs + 1,
+            "started": started,
+            "transcripts": tx_accessions,
+            "samples": len(samples),
+            "total": len(tasks),
+            "done": 0,
+            "failed": 0,
+        }
+    )
+    logger.info(
+        "Warming up %d popular transcript(s) for %d recent sample(s)",
+        len(tx_accessions),
+        len(samples),
+    )
+    with _make_pool(values) as pool:
+        skipped = _run_tasks(pool, tasks, "popular", started + settings.POPULAR_BUDGET)
+    if skipped:
+        logger.info("Warm-up budget exhausted, skipped %d task(s)", skipped)
+    _set_progress(
+        popular=dict(get_progress()["popular"], state=DONE, skipped=skipped, finished=time.time())
+    )
+
+
+def _terminate(_signum, _frame):
+    raise SystemExit(0)
+
+
+def _run_coordinator(values):
+    """Run the warm-up in the coordinator process with the ``settings`` ``values``.
+
+    The panel and popular transcripts are warmed up once, the latter are then warmed up again
+    every ``settings.POPULAR_INTERVAL`` seconds if configured.
+    """
+    signal.signal(signal.SIGTERM, _terminate)
+    jobs.init_worker(values)
+
+    _set_progress(state=RUNNING)
+    try:
+        if settings.WARMUP_PANEL:
+            _warm_panel(values)
+        if popular_enabled():
+            _warm_popular(values)
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        _set_progress(state=FAILED, message=str(e), finished=time.time())
+    else:
+        logger.info("Warm-up done")
+        _set_progress(state=DONE, finished=time.time())
+    while popular_enabled() and settings.POPULAR_INTERVAL:
+        time.sleep(settings.POPULAR_INTERVAL)
+        try:
+            _warm_popular(values)
+        except Exception:
+            logger.exception("Warm-up of popular transcripts failed")
+
+
+def _forget_process():
+    """Forget the coordinator in forked server workers, it is a child of the master only."""
+    global _process
+    if _process is not None:
+        # Otherwise, ``multiprocessing`` tries to join it when the worker exits.
+        multiprocessing.process._children.discard(_process)
+        _process = None
+
+
+os.register_at_fork(after_in_child=_forget_process)
+
+
+def start():
+    """Start the warm-up in the background, if configured.
+
+    Must be called within the app context.
+    """
+    global _process
+    if not enabled():
+        return
+    # Overwrite the progress of earlier runs in a persistent cache.
+    cache.set(
+        PROGRESS_KEY,
+        {"state": PENDING, "total": 0, "done": 0, "failed": 0, "started": time.time()},
+        timeout=0,
+    )
+    logger.info(
+        "Starting warm-up of panel %s and top %d transcript(s) of access log %s",
+        settings.WARMUP_PANEL,
+        settings.POPULAR_TOP_K if popular_enabled() else 0,
+        settings.ACCESS_LOG_PATH,
+    )
+    _process = multiprocessing.get_context("spawn").Process(
+        target=_run_coordinator, args=(jobs.settings_values(),), name="excovis-warmup"
+    )
+    _process.start()
+
+
+def shutdown():
+    """Stop the warm-up, if running."""
+    global _process
+    if _process is not None:
+        if _process.is_alive():
+            _process.terminate()
+        _process.join()
+        _process = None
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 """The Dash visualization app web server for ExCoVis."""
 
+import gc
 import os
 import re
 import tempfile
@@ -8,16 +9,84 @@ import urllib.parse
 
 from logzero import logger
 
-from . import settings
+from . import jobs, metrics, render, settings, shm, warmup
+
+
+def preload():
+    """Build the app and load the transcripts and data catalog, return the Flask app.
+
+    This is run in the master process of the pre-forking server such that the workers share the
+    loaded data copy-on-write.
+    """
+    from . import genes, store
+    from .app import app_flask
+
+    with app_flask.app_context():
+        genes.load_transcripts()
+        store.load_all_data()
+        warmup.start()
+    # Keep the garbage collector from touching (and thus copying) the preloaded objects.
+    gc.freeze()
+    return app_flask
+
+
+def worker_exit():
+    """Release the resources of an exiting server worker process."""
+    render.shutdown()
+    jobs.shutdown()
+    shm.manager.clear()
+
+
+def on_exit():
+    """Release the resources of the exiting server."""
+    warmup.shutdown()
+    shm.cleanup()
+
+
+def run_gunicorn(args):
+    """Run the app in the pre-forking ``gunicorn`` WSGI server."""
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", "%s:%d" % (args.host, args.port))
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("timeout", args.timeout)
+            self.cfg.set("preload_app", True)
+            self.cfg.set("worker_exit", lambda _arbiter, _worker: worker_exit())
+            self.cfg.set("on_exit", lambda _arbiter: on_exit())
+            self.cfg.set(
+                "child_exit", lambda _arbiter, worker: metrics.mark_process_dead(worker.pid)
+            )
+
+        def load(self):
+            return preload()
+
+    logger.info(
+        "Starting gunicorn with %d worker(s) and %d thread(s) each", args.workers, args.threads
+    )
+    Application().run()
 
 
 def run_server(args):
     """Actually run the Dash server."""
-    from .app import app  # noqa
+    if args.cmd == "serve":
+        run_gunicorn(args)
+        return
 
-    app.run_server(
-        host=args.host, port=args.port, debug=args.debug, dev_tools_hot_reload=args.debug
-    )
+    from .app import app, app_flask
+
+    with app_flask.app_context():
+        warmup.start()
+    try:
+        app.run_server(
+            host=args.host, port=args.port, debug=args.debug, dev_tools_hot_reload=args.debug
+        )
+    finally:
+        warmup.shutdown()
+        render.shutdown()
+        jobs.shutdown()
 
 
 def run_temp_dir(args):
@@ -66,8 +135,8 @@ def parse_url(url_str):
         return url
 
 
-def run(args, parser):
-    """Main entry point after argument parsing."""
+def configure(args, parser):
+    """Configure ``.settings`` from the parsed arguments."""
     data_sources = []
     if os.environ.get("EXCOVIS_DATA_SOURCES"):
         data_sources += os.environ.get("EXCOVIS_DATA_SOURCES").split(";")
@@ -87,14 +156,52 @@ def run(args, parser):
     settings.PUBLIC_URL_PREFIX = re.sub(r"/+$", "", args.public_url_prefix or "")
     settings.FAKE_DATA = args.fake_data
     settings.DATA_SOURCES = data_sources
+    settings.TRANSCRIPTS_PATH = args.transcripts_path
     settings.CACHE_DEFAULT_TIMEOUT = args.cache_default_timeout
     if args.cache_redis_url:
         settings.CACHE_TYPE = "redis"
         settings.CACHE_REDIS_URL = args.cache_redis_url
     elif args.cache_dir:
         settings.CACHE_DIR = args.cache_dir
+    settings.CACHE_SIZE_LIMIT = args.cache_size_limit_mb * 1024 * 1024
+    settings.LOAD_CONCURRENCY = args.load_concurrency
+    settings.LOAD_QUEUE_SIZE = args.load_queue_size
+    settings.RENDER_WORKERS = args.render_workers
+    settings.RENDER_QUEUE_SIZE = args.render_queue_size
+    settings.JOB_WORKERS = args.job_workers
+    settings.JOB_MIN_SAMPLES = args.job_min_samples
+    settings.JOB_STALE_SECONDS = args.job_stale_seconds
+    settings.HEATMAP_MIN_SAMPLES = args.heatmap_min_samples
+    if args.warmup_panel and not os.path.exists(args.warmup_panel):
+        parser.error("Warm-up panel file %s does not exist" % args.warmup_panel)
+    settings.WARMUP_PANEL = args.warmup_panel
+    settings.WARMUP_WORKERS = args.warmup_workers
+    settings.WARMUP_NICE = args.warmup_nice
+    settings.ACCESS_LOG_PATH = args.access_log
+    settings.POPULAR_TOP_K = args.popular_top_k
+    settings.POPULAR_WINDOW_DAYS = args.popular_window_days
+    settings.POPULAR_RECENT_DAYS = args.popular_recent_days
+    settings.POPULAR_BUDGET = args.popular_budget
+    settings.POPULAR_INTERVAL = args.popular_interval
+    if args.coverage_thresholds is None:
+        # Not the argument default as ``action="append"`` would append to it.
+        thresholds = os.environ.get("EXCOVIS_COVERAGE_THRESHOLDS", "")
+        try:
+            args.coverage_thresholds = [int(x) for x in thresholds.split(",") if x.strip()]
+        except ValueError:
+            parser.error("Invalid EXCOVIS_COVERAGE_THRESHOLDS: %s" % thresholds)
+    settings.COVERAGE_THRESHOLDS = tuple(args.coverage_thresholds)
+    settings.SHM_BUDGET = getattr(args, "shm_budget_mb", 0) * 1024 * 1024
+    settings.TRACE_PATH = args.trace
+    settings.SLOWLOG_PATH = args.slowlog
+    settings.SLOWLOG_THRESHOLD = args.slowlog_threshold
     settings.UPLOAD_ENABLED = not args.upload_disabled
     settings.UPLOAD_DIR = args.upload_dir
+
+
+def run(args, parser):
+    """Main entry point after argument parsing."""
+    configure(args, parser)
     run_cache_dir(args)
 
 
@@ -120,6 +227,11 @@ def setup_argparse(parser):
         action="append",
         help="Path to data source(s)",
     )
+    parser.add_argument(
+        "--transcripts-path",
+        default=os.environ.get("EXCOVIS_TRANSCRIPTS_PATH", settings.TRANSCRIPTS_PATH),
+        help="Path or URL of the UCSC ncbiRefSeq.txt.gz file with the transcripts",
+    )
     parser.add_argument(
         "--cache-dir",
         default=os.environ.get("EXCOVIS_CACHE_DIR"),
@@ -135,6 +247,145 @@ def setup_argparse(parser):
         default=os.environ.get("EXCOVIS_CACHE_DEFAULT_TIMEOUT", 600),
         help="Default timeout for cache",
     )
+    parser.add_argument(
+        "--cache-size-limit-mb",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_CACHE_SIZE_LIMIT_MB", 0)),
+        help=(
+            "MB of coverage data and images in the file system cache, evicting the least "
+            "recently and frequently used entries, 0 for no limit"
+        ),
+    )
+
+    parser.add_argument(
+        "--load-concurrency",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_LOAD_CONCURRENCY", settings.LOAD_CONCURRENCY)),
+        help="Number of concurrent coverage loads from BAM files per server process",
+    )
+    parser.add_argument(
+        "--load-queue-size",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_LOAD_QUEUE_SIZE", settings.LOAD_QUEUE_SIZE)),
+        help="Number of coverage loads that may wait, further requests are asked to retry",
+    )
+    parser.add_argument(
+        "--render-workers",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_RENDER_WORKERS", settings.RENDER_WORKERS)),
+        help="Number of plot render worker processes, 0 to render in request threads",
+    )
+    parser.add_argument(
+        "--render-queue-size",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_RENDER_QUEUE_SIZE", settings.RENDER_QUEUE_SIZE)),
+        help="Number of plot render jobs that may wait for a free render worker",
+    )
+    parser.add_argument(
+        "--job-workers",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_JOB_WORKERS", settings.JOB_WORKERS)),
+        help="Number of background job worker processes, 0 to compute everything in requests",
+    )
+    parser.add_argument(
+        "--job-min-samples",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_JOB_MIN_SAMPLES", settings.JOB_MIN_SAMPLES)),
+        help="Plots with at least this many samples are rendered in a background job",
+    )
+    parser.add_argument(
+        "--job-stale-seconds",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_JOB_STALE_SECONDS", settings.JOB_STALE_SECONDS)),
+        help="Seconds after which a pending or running job without any update is resubmitted",
+    )
+    parser.add_argument(
+        "--heatmap-min-samples",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_HEATMAP_MIN_SAMPLES", settings.HEATMAP_MIN_SAMPLES)),
+        help="Plots with more samples than this are rendered as heatmap",
+    )
+    parser.add_argument(
+        "--coverage-threshold",
+        dest="coverage_thresholds",
+        type=int,
+        action="append",
+        default=None,
+        help=(
+            "Threshold for the '%% bases >= N x' table metrics, may be given multiple times, "
+            "defaults to the comma-separated EXCOVIS_COVERAGE_THRESHOLDS"
+        ),
+    )
+
+    parser.add_argument(
+        "--warmup-panel",
+        default=os.environ.get("EXCOVIS_WARMUP_PANEL"),
+        help="File with gene symbols or transcript accessions to warm up the cache for at startup",
+    )
+    parser.add_argument(
+        "--warmup-workers",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_WARMUP_WORKERS", settings.WARMUP_WORKERS)),
+        help="Number of worker processes for the warm-up",
+    )
+    parser.add_argument(
+        "--warmup-nice",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_WARMUP_NICE", settings.WARMUP_NICE)),
+        help="Niceness increment of the warm-up worker processes",
+    )
+    parser.add_argument(
+        "--access-log",
+        default=os.environ.get("EXCOVIS_ACCESS_LOG"),
+        help="Append the requested transcripts and samples to this file for warming up the cache",
+    )
+    parser.add_argument(
+        "--popular-top-k",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_POPULAR_TOP_K", settings.POPULAR_TOP_K)),
+        help="Warm up the cache for this many most requested transcripts of the access log",
+    )
+    parser.add_argument(
+        "--popular-window-days",
+        type=float,
+        default=float(os.environ.get("EXCOVIS_POPULAR_WINDOW_DAYS", settings.POPULAR_WINDOW_DAYS)),
+        help="Days of the access log to rank the transcripts by, older entries are dropped",
+    )
+    parser.add_argument(
+        "--popular-recent-days",
+        type=float,
+        default=float(os.environ.get("EXCOVIS_POPULAR_RECENT_DAYS", settings.POPULAR_RECENT_DAYS)),
+        help="Warm up the samples requested within this many days",
+    )
+    parser.add_argument(
+        "--popular-budget",
+        type=float,
+        default=float(os.environ.get("EXCOVIS_POPULAR_BUDGET", settings.POPULAR_BUDGET)),
+        help="Seconds that each warm-up of the popular transcripts may take",
+    )
+    parser.add_argument(
+        "--popular-interval",
+        type=float,
+        default=float(os.environ.get("EXCOVIS_POPULAR_INTERVAL", settings.POPULAR_INTERVAL)),
+        help="Seconds between warm-ups of the popular transcripts, 0 only warms up at startup",
+    )
+
+    parser.add_argument(
+        "--trace",
+        default=os.environ.get("EXCOVIS_TRACE"),
+        help="Append tracing spans as JSON lines in Chrome trace event format to this file",
+    )
+    parser.add_argument(
+        "--slowlog",
+        default=os.environ.get("EXCOVIS_SLOWLOG"),
+        help="Append slow callback requests as JSON lines to this file, see 'excovis replay'",
+    )
+    parser.add_argument(
+        "--slowlog-threshold",
+        type=float,
+        default=float(os.environ.get("EXCOVIS_SLOWLOG_THRESHOLD", settings.SLOWLOG_THRESHOLD)),
+        help="Callback requests taking at least this many seconds are logged as slow",
+    )
 
     parser.add_argument(
         "--upload-dir",
@@ -154,3 +405,32 @@ def setup_argparse(parser):
         default=os.environ.get("EXCOVIS_URL_PREFIX", ""),
         help="The prefix that this app will be served under (e.g., if behind a reverse proxy.)",
     )
+
+
+def setup_argparse_serve(parser):
+    """Setup argparse sub parser for the production server."""
+    setup_argparse(parser)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_WORKERS", os.cpu_count() or 1)),
+        help="Number of server worker processes, default is the number of CPUs",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_THREADS", 4)),
+        help="Number of threads per server worker process",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_TIMEOUT", 120)),
+        help="Seconds before silent server workers are killed and restarted",
+    )
+    parser.add_argument(
+        "--shm-budget-mb",
+        type=int,
+        default=int(os.environ.get("EXCOVIS_SHM_BUDGET_MB", 512)),
+        help="MB of coverage data in shared memory mapped by each server worker, 0 to disable",
+    )
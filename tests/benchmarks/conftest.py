@@ -0,0 +1,98 @@
+"""Fixtures for the benchmarks of the hot paths.
+
+All input data is generated locally once per session with ``excovis.synth``: a UCSC
+``ncbiRefSeq.txt.gz`` file with a small, a medium and a huge (TTN-like) gene plus filler
+transcripts, and one indexed BAM file with random reads on the exons of these genes for each
+sample.  Run the benchmarks with ``make bench``, the results are saved below ``.benchmarks`` for
+comparison between commits.
+"""
+
+import tempfile
+import urllib.parse
+
+import flask
+import matplotlib
+import pytest
+
+matplotlib.use("Agg")
+
+from excovis import genes, settings, store, synth  # noqa: E402
+from excovis.cache import build_cache_config, cache  # noqa: E402
+
+#: Numbers of samples to benchmark with.
+SAMPLE_COUNTS = (1, 10, 100)
+#: Number of filler transcripts in the generated ``ncbiRefSeq.txt.gz`` file.
+FILLER_TRANSCRIPTS = 20_000
+#: The benchmarked genes by size.
+GENES = synth.GENES
+
+
+@pytest.fixture(scope="session")
+def fixture_dir(tmp_path_factory):
+    """Directory with the generated ``ncbiRefSeq.txt.gz`` and BAM files."""
+    path = tmp_path_factory.mktemp("excovis-bench")
+    config = synth.Config(
+        samples=max(SAMPLE_COUNTS), depth=17.5, filler_transcripts=FILLER_TRANSCRIPTS
+    )
+    synth.synthesize(config, str(path))
+    return path
+
+
+@pytest.fixture(scope="session")
+def refseq_path(fixture_dir):
+    """Path to the generated ``ncbiRefSeq.txt.gz`` file."""
+    return str(fixture_dir / "ncbiRefSeq.txt.gz")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def app_context(fixture_dir):
+    """Configure ``settings`` for the generated data and push app context with a fresh cache."""
+    settings.FAKE_DATA = False
+    settings.DATA_SOURCES = [urllib.parse.urlparse("file://%s" % (fixture_dir / "bam"))]
+    settings.TRANSCRIPTS_PATH = str(fixture_dir / "ncbiRefSeq.txt.gz")
+    settings.RENDER_WORKERS = 0
+    settings.JOB_WORKERS = 0
+    settings.SHM_BUDGET = 0
+    with tempfile.TemporaryDirectory(prefix="EXCOVIS.bench.") as tmpdir:
+        settings.CACHE_TYPE = "filesystem"
+        settings.CACHE_DIR = tmpdir
+        settings.CACHE_DEFAULT_TIMEOUT = 0
+        app = flask.Flask(__name__)
+        cache.init_app(app, config=build_cache_config())
+        with app.app_context():
+            yield app
+
+
+@pytest.fixture(scope="session")
+def transcripts(app_context):
+    """The generated transcripts by accession."""
+    return genes.load_transcripts()
+
+
+@pytest.fixture(scope="session")
+def samples(app_context):
+    """IDs of the generated samples, sorted by sample name."""
+    return [data.id for data in sorted(store.load_all_data(), key=lambda data: data.sample)]
+
+
+@pytest.fixture(scope="session")
+def coverage_df(samples):
+    """Factory for the coverage data frame of the given gene and number of samples.
+
+    The per-sample coverage is loaded into the cache on first use.
+    """
+
+    def factory(gene, n_samples):
+        return store.load_coverage_df(0, GENES[gene].tx_accession, samples[:n_samples])
+
+    return factory
+
+
+@pytest.fixture(scope="session")
+def on_target_coverage_df(samples):
+    """Factory for the on-target coverage data frame of the given gene and number of samples."""
+
+    def factory(gene, n_samples):
+        return store.load_on_target_coverage_df(GENES[gene].tx_accession, samples[:n_samples])
+
+    return factory
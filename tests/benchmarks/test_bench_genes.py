@@ -0,0 +1,17 @@
+"""Benchmarks for loading the transcripts."""
+
+from excovis import genes
+
+from .conftest import FILLER_TRANSCRIPTS, GENES
+
+
+def test_read_transcripts(benchmark, refseq_path):
+    result = benchmark(genes.read_transcripts, refseq_path)
+    assert len(result) == FILLER_TRANSCRIPTS + len(GENES)
+
+
+def test_on_target_mask(benchmark, transcripts, coverage_df):
+    transcript = transcripts[GENES["huge"].tx_accession]
+    positions = coverage_df("huge", 1)["pos"].values
+    result = benchmark(genes.on_target_mask, transcript, positions)
+    assert result.sum() == sum(exon.length() for exon in transcript.exons)
@@ -0,0 +1,17 @@
+"""Benchmarks for building the static coverage plots."""
+
+import pytest
+
+from excovis import plot
+
+from .conftest import GENES, SAMPLE_COUNTS
+
+
+@pytest.mark.parametrize("exon_padding", [None, 10], ids=["unprojected", "projected"])
+@pytest.mark.parametrize("n_samples", SAMPLE_COUNTS)
+@pytest.mark.parametrize("gene", GENES)
+def test_plot_for_gene(benchmark, transcripts, coverage_df, gene, n_samples, exon_padding):
+    transcript = transcripts[GENES[gene].tx_accession]
+    df_covs = coverage_df(gene, n_samples)
+    # The figures are not managed by ``pyplot`` and need no closing.
+    benchmark.pedantic(plot.plot_for_gene, args=(transcript, df_covs, exon_padding), rounds=3)
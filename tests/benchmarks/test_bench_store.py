@@ -0,0 +1,25 @@
+"""Benchmarks for loading coverage from the BAM files and combining it into data frames."""
+
+import pytest
+
+from excovis import settings, store
+
+from .conftest import GENES, SAMPLE_COUNTS
+
+
+@pytest.mark.parametrize("gene", GENES)
+def test_load_coverage(benchmark, transcripts, samples, gene):
+    transcript = transcripts[GENES[gene].tx_accession]
+    tree = store.transcript_tree(transcript)
+    result = benchmark(store.load_coverage.uncached, samples[0], transcript.chrom, tree, transcript)
+    padded = settings.MAX_EXON_PADDING * 2
+    assert len(result) == sum(exon.length() + padded for exon in transcript.exons)
+
+
+@pytest.mark.parametrize("n_samples", SAMPLE_COUNTS)
+@pytest.mark.parametrize("gene", GENES)
+def test_load_coverage_df(benchmark, samples, coverage_df, gene, n_samples):
+    expected = coverage_df(gene, n_samples)  # loads the per-sample coverage into the cache
+    tx_accession = GENES[gene].tx_accession
+    result = benchmark(store.load_coverage_df, 0, tx_accession, samples[:n_samples])
+    assert result.shape == expected.shape
@@ -0,0 +1,33 @@
+"""Benchmarks for the aggregation of the coverage statistics and the table operations."""
+
+import pytest
+
+from excovis import stats, table
+
+from .conftest import GENES, SAMPLE_COUNTS
+
+#: Thresholds for the "% bases >= N x" statistics.
+THRESHOLDS = (10, 20)
+
+
+@pytest.mark.parametrize("n_samples", SAMPLE_COUNTS)
+@pytest.mark.parametrize("gene", GENES)
+def test_compute_coverage_stats(benchmark, on_target_coverage_df, gene, n_samples):
+    coverage_df = on_target_coverage_df(gene, n_samples)
+    result = benchmark(stats.compute_coverage_stats, coverage_df, THRESHOLDS)
+    assert len(result["mean"]) == GENES[gene].exons + 1
+
+
+@pytest.mark.parametrize("n_samples", SAMPLE_COUNTS)
+def test_filter_sort_table(benchmark, on_target_coverage_df, n_samples):
+    table_df = stats.compute_coverage_stats(on_target_coverage_df("huge", n_samples))["mean"]
+    sample = table_df.columns[-1]
+
+    def filter_sort():
+        return table.sort_df(
+            table.filter_df(table_df, "{%s} lt 20 && {feature} contains exon" % sample),
+            [{"column_id": sample, "direction": "asc"}],
+        )
+
+    result = benchmark(filter_sort)
+    assert (result[sample] < 20).all()
@@ -0,0 +1,19 @@
+"""Common fixtures for the unit tests."""
+
+import flask
+import pytest
+
+from excovis import settings
+from excovis.cache import build_cache_config, cache
+
+
+@pytest.fixture
+def cache_app(tmp_path, monkeypatch):
+    """Push app context with an empty file system cache in a temporary directory."""
+    monkeypatch.setattr(settings, "CACHE_TYPE", "filesystem")
+    monkeypatch.setattr(settings, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(settings, "CACHE_DEFAULT_TIMEOUT", 0)
+    app = flask.Flask(__name__)
+    cache.init_app(app, config=build_cache_config())
+    with app.app_context():
+        yield app
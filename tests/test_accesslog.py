@@ -0,0 +1,90 @@
+"""Tests for the access log of ``excovis.accesslog``."""
+
+import pytest
+
+from excovis import accesslog, settings
+
+#: Timestamp of "now" in the tests.
+NOW = 100 * accesslog.DAY
+
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    """Enable the access log in a temporary directory."""
+    path = tmp_path / "access.log"
+    monkeypatch.setattr(settings, "ACCESS_LOG_PATH", str(path))
+    monkeypatch.setattr(settings, "ACCESS_LOG_DEDUP_SECONDS", 60)
+    monkeypatch.setattr(settings, "POPULAR_WINDOW_DAYS", 7)
+    monkeypatch.setattr(settings, "POPULAR_RECENT_DAYS", 1)
+    monkeypatch.setattr(settings, "POPULAR_TOP_K", 2)
+    monkeypatch.setattr(accesslog, "_last_logged", {})
+    return path
+
+
+def write_log(path, entries):
+    path.write_text("".join("%d\t%s\t%s\n" % entry for entry in entries))
+
+
+def test_record_dedups_repeated_accesses(log_path):
+    accesslog.record("NM_1", ["S1", "S2"], now=NOW)
+    accesslog.record("NM_1", ["S1", "S3"], now=NOW + 30)
+    accesslog.record("NM_1", ["S1"], now=NOW + 60)
+    assert list(accesslog.read(str(log_path))) == [
+        (NOW, "NM_1", "S1"),
+        (NOW, "NM_1", "S2"),
+        (NOW + 30, "NM_1", "S3"),
+        (NOW + 60, "NM_1", "S1"),
+    ]
+
+
+def test_record_disabled(log_path, monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_LOG_PATH", None)
+    accesslog.record("NM_1", ["S1"], now=NOW)
+    assert not log_path.exists()
+
+
+def test_read_skips_partial_lines(log_path):
+    log_path.write_text("10\tNM_1\tS1\n20\tNM_1\nx\tNM_1\tS1\n30\tNM_2\tS2\n40\tNM_")
+    assert list(accesslog.read(str(log_path))) == [(10, "NM_1", "S1"), (30, "NM_2", "S2")]
+    assert list(accesslog.read(str(log_path), since=20)) == [(30, "NM_2", "S2")]
+    assert list(accesslog.read(str(log_path) + ".missing")) == []
+
+
+def test_rank():
+    entries = [
+        (10, "NM_1", "S1"),
+        (20, "NM_2", "S2"),
+        (30, "NM_2", "S3"),
+        (40, "NM_3", "S2"),
+        (50, "NM_2", "S1"),
+        (60, "NM_3", "S3"),
+    ]
+    tx_accessions, samples = accesslog.rank(entries, top_k=2, recent_since=20)
+    assert tx_accessions == ["NM_2", "NM_3"]
+    # "S1" was accessed before ``recent_since`` but also after it.
+    assert samples == ["S3", "S1", "S2"]
+
+
+def test_compact_drops_old_entries(log_path):
+    write_log(log_path, [(10, "NM_1", "S1"), (20, "NM_2", "S2"), (30, "NM_3", "S3")])
+    accesslog.compact(str(log_path), since=20)
+    assert log_path.read_text() == "20\tNM_2\tS2\n30\tNM_3\tS3\n"
+    assert [path.name for path in log_path.parent.iterdir()] == ["access.log"]
+
+
+def test_popular(log_path):
+    hours = accesslog.DAY // 24
+    write_log(
+        log_path,
+        [
+            (NOW - 8 * accesslog.DAY, "NM_OLD", "S_OLD"),
+            (NOW - 8 * accesslog.DAY, "NM_OLD", "S_OLD"),
+            (NOW - 2 * accesslog.DAY, "NM_1", "S1"),
+            (NOW - 2 * accesslog.DAY, "NM_2", "S1"),
+            (NOW - 2 * hours, "NM_2", "S2"),
+            (NOW - 1 * hours, "NM_3", "S3"),
+            (NOW - 1 * hours, "NM_2", "S3"),
+        ],
+    )
+    assert accesslog.popular(now=NOW) == (["NM_2", "NM_1"], ["S3", "S2"])
+    assert "NM_OLD" not in log_path.read_text()
@@ -0,0 +1,46 @@
+"""Tests for the admission control of ``excovis.admission``."""
+
+import threading
+import time
+
+import pytest
+
+from excovis import admission, settings
+
+
+def test_acquire_raises_busy_when_queue_full():
+    stage = admission.Stage("test", limit=1, queue_size=1)
+    stage.acquire()
+    # One request waits for the slot, the next one does not fit into the queue.
+    waiter = threading.Thread(target=lambda: (stage.acquire(timeout=5), stage.release()))
+    waiter.start()
+    while stage.stats()["waiting"] == 0:
+        time.sleep(0.01)
+    with pytest.raises(admission.Busy, match="full"):
+        stage.acquire()
+    stage.release()
+    waiter.join()
+    stats = stage.stats()
+    assert (stats["active"], stats["waiting"]) == (0, 0)
+    assert (stats["admitted"], stats["rejected"]) == (2, 1)
+
+
+def test_acquire_raises_busy_on_timeout():
+    stage = admission.Stage("test", limit=1, queue_size=1)
+    stage.acquire()
+    with pytest.raises(admission.Busy, match="Timeout"):
+        stage.acquire(timeout=0.01)
+    stage.release()
+    assert stage.stats()["rejected"] == 1
+
+
+def test_admit(monkeypatch):
+    monkeypatch.setattr(admission, "_stages", {})
+    monkeypatch.setattr(settings, "LOAD_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "LOAD_QUEUE_SIZE", 0)
+    with admission.admit("load"):
+        assert admission.stats()["load"]["active"] == 1
+        with pytest.raises(admission.Busy):
+            with admission.admit("load"):
+                pass  # pragma: no cover
+    assert admission.stats()["load"]["active"] == 0
@@ -0,0 +1,153 @@
+"""Tests for the size-bounded file system cache of ``excovis.boundedcache``."""
+
+import hashlib
+import os
+
+import pytest
+
+from excovis.boundedcache import MAX_FREQUENCY, BoundedFileSystemCache, FrequencySketch, entry_kind
+from excovis.cache import LOCK_KEY_SUFFIX
+from excovis.store import IMAGE_KEY_PREFIX
+
+#: Size of the test values in bytes.
+VALUE_BYTES = 1_000
+
+
+def digest(key):
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+@pytest.fixture
+def bounded_cache(tmp_path):
+    """Cache with a budget for two test values."""
+    return BoundedFileSystemCache(str(tmp_path), max_bytes=int(2.5 * VALUE_BYTES))
+
+
+def value(char):
+    return char.encode() * VALUE_BYTES
+
+
+def touch(cache, key, mtime):
+    """Set the modification time, i.e., the LRU order, of the entry for ``key``."""
+    os.utime(cache._get_filename(key), (mtime, mtime))
+
+
+def test_entry_kind():
+    assert entry_kind(IMAGE_KEY_PREFIX + "abc") == "image"
+    assert entry_kind("excovis.store.load_coverage_statsabc") == "memoized"
+    assert entry_kind("excovis-job-abc") is None
+    assert entry_kind("excovis-warmup") is None
+    assert entry_kind("excovis.store.load_coverage_stats_memver") is None
+    assert entry_kind("excovis.store.load_coverage_statsabc" + LOCK_KEY_SUFFIX) is None
+
+
+def test_frequency_sketch_counts_and_saturates():
+    sketch = FrequencySketch()
+    for _ in range(3):
+        sketch.increment(digest("a"))
+    assert sketch.frequency(digest("a")) == 3
+    assert sketch.frequency(digest("b")) == 0
+    for _ in range(2 * MAX_FREQUENCY):
+        sketch.increment(digest("a"))
+    assert sketch.frequency(digest("a")) == MAX_FREQUENCY
+
+
+def test_frequency_sketch_ages():
+    sketch = FrequencySketch(width=16)
+    for _ in range(8):
+        sketch.increment(digest("a"))
+    for i in range(sketch.sample_size - 8):
+        sketch.increment(digest("filler-%d" % i))
+    # The counters were halved with the last increment.
+    assert sketch.frequency(digest("a")) == 4
+    assert sketch.additions == sketch.sample_size // 2
+
+
+def test_evicts_least_recently_used(bounded_cache):
+    assert bounded_cache.set("a", value("a"))
+    assert bounded_cache.set("b", value("b"))
+    touch(bounded_cache, "a", 1_000)
+    touch(bounded_cache, "b", 2_000)
+    assert bounded_cache.set("c", value("c"))
+    assert bounded_cache.get("a") is None
+    assert bounded_cache.get("b") == value("b")
+    assert bounded_cache.get("c") == value("c")
+    stats = bounded_cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+
+
+def test_rejects_infrequent_entry(bounded_cache):
+    bounded_cache.set("a", value("a"))
+    bounded_cache.set("b", value("b"))
+    for _ in range(3):
+        assert bounded_cache.get("a") == value("a")
+    touch(bounded_cache, "a", 1_000)
+    touch(bounded_cache, "b", 2_000)
+    # "a" would be evicted but is used more frequently than "c".
+    assert not bounded_cache.set("c", value("c"))
+    assert bounded_cache.get("c") is None
+    assert bounded_cache.get("a") == value("a")
+    assert bounded_cache.stats()["rejections"] == 1
+    # After more misses, "c" is used as frequently as "a" and admitted.
+    for _ in range(3):
+        bounded_cache.get("c")
+    touch(bounded_cache, "a", 1_000)
+    assert bounded_cache.set("c", value("c"))
+    assert bounded_cache.get("a") is None
+
+
+def test_always_admits_images(bounded_cache):
+    bounded_cache.set("a", value("a"))
+    bounded_cache.set("b", value("b"))
+    for _ in range(3):
+        bounded_cache.get("a")
+        bounded_cache.get("b")
+    assert bounded_cache.set(IMAGE_KEY_PREFIX + "c", value("c"))
+    assert bounded_cache.get(IMAGE_KEY_PREFIX + "c") == value("c")
+    assert bounded_cache.stats()["evictions"] == 1
+
+
+def test_rejects_entry_larger_than_budget(bounded_cache):
+    assert not bounded_cache.set(IMAGE_KEY_PREFIX + "a", value("a") * 3)
+    assert bounded_cache.get(IMAGE_KEY_PREFIX + "a") is None
+
+
+def test_never_evicts_control_entries(bounded_cache):
+    control_keys = [
+        "excovis-job-abc",
+        "excovis-warmup",
+        "excovis.store.load_coverage_stats_memver",
+        "excovis.store.load_coverage_statsabc" + LOCK_KEY_SUFFIX,
+    ]
+    for key in control_keys:
+        assert bounded_cache.set(key, value("x") * 2)
+        touch(bounded_cache, key, 1)
+    # The control entries do not count towards the budget.
+    for char in "abcd":
+        assert bounded_cache.set(IMAGE_KEY_PREFIX + char, value(char))
+    for key in control_keys:
+        assert bounded_cache.get(key) == value("x") * 2
+    assert bounded_cache.stats()["bytes"] <= bounded_cache.max_bytes
+
+
+def test_stats_hit_ratio(bounded_cache):
+    assert bounded_cache.stats()["hit_ratio"] is None
+    bounded_cache.set("a", value("a"))
+    bounded_cache.get("a")
+    bounded_cache.get("b")
+    bounded_cache.get("excovis-job-abc")  # control entries are not counted
+    stats = bounded_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+
+
+def test_scan_removes_expired_control_entries(bounded_cache):
+    assert bounded_cache.set("excovis-job-expired", "state", timeout=-1)
+    assert bounded_cache.set("excovis-job-kept", "state", timeout=0)
+    assert bounded_cache.set("excovis-job-later", "state", timeout=60)
+    assert bounded_cache.set(IMAGE_KEY_PREFIX + "a", value("a"))  # scans the entries
+    assert not os.path.exists(bounded_cache._get_filename("excovis-job-expired"))
+    assert bounded_cache.get("excovis-job-kept") == "state"
+    assert bounded_cache.get("excovis-job-later") == "state"
+    assert bounded_cache.get(IMAGE_KEY_PREFIX + "a") == value("a")
+    assert bounded_cache.stats()["expired"] == 1
@@ -0,0 +1,118 @@
+"""Tests for the coalescing of concurrent memoized computations in ``excovis.cache``."""
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from excovis import settings
+from excovis.cache import LOCK_KEY_SUFFIX, cache, process_memoize, single_flight
+from excovis.exceptions import Superseded
+
+#: Number of concurrent callers.
+CALLERS = 8
+
+#: Arguments of the calls of ``compute()``.
+calls = []
+#: Lock for ``calls``.
+calls_lock = threading.Lock()
+#: Behaviour of ``compute()`` by argument: a value to return, or an exception to raise once.
+behaviour = {}
+
+
+@single_flight
+@cache.memoize()
+def compute(arg):
+    with calls_lock:
+        calls.append(arg)
+        outcome = behaviour[arg]
+        if isinstance(outcome, Exception):
+            behaviour[arg] = "recovered"
+    # Keep the computation running until all callers are waiting for it.
+    time.sleep(0.3)
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    calls.clear()
+    behaviour.clear()
+
+
+def call_concurrently(app, arg):
+    """Call ``compute(arg)`` from ``CALLERS`` threads, return list of the results or errors."""
+    barrier = threading.Barrier(CALLERS)
+
+    def call():
+        with app.app_context():
+            barrier.wait()
+            try:
+                return compute(arg)
+            except Exception as e:
+                return e
+
+    with ThreadPoolExecutor(CALLERS) as executor:
+        return list(executor.map(lambda _: call(), range(CALLERS)))
+
+
+def test_single_flight_computes_once(cache_app):
+    behaviour["a"] = {"value": 42}
+    results = call_concurrently(cache_app, "a")
+    assert calls == ["a"]
+    assert results == [{"value": 42}] * CALLERS
+    # Later calls are cache hits.
+    assert compute("a") == {"value": 42}
+    assert calls == ["a"]
+
+
+def test_single_flight_errors_reach_followers(cache_app):
+    behaviour["b"] = ValueError("failed")
+    results = call_concurrently(cache_app, "b")
+    assert calls == ["b"]
+    assert all(isinstance(result, ValueError) for result in results)
+    assert all(str(result) == "failed" for result in results)
+
+
+def test_single_flight_followers_retry_when_leader_superseded(cache_app):
+    behaviour["c"] = Superseded("newer request")
+    results = call_concurrently(cache_app, "c")
+    # Only the leader's request was superseded, one of the followers computes the result.
+    assert sum(isinstance(result, Superseded) for result in results) == 1
+    assert results.count("recovered") == CALLERS - 1
+    assert calls == ["c", "c"]
+
+
+def test_single_flight_waits_for_lock_of_other_process(cache_app):
+    behaviour["d"] = "computed here"
+    key = compute.make_cache_key(compute.uncached, "d")
+    backend = cache.cache
+    # Another process holds the lock and stores its result after a while.
+    assert backend.add(key + LOCK_KEY_SUFFIX, 12345, timeout=60)
+    timer = threading.Timer(0.3, lambda: backend.set(key, "computed there"))
+    timer.start()
+    try:
+        assert compute("d") == "computed there"
+    finally:
+        timer.join()
+    assert calls == []
+
+
+def test_process_memoize_expires_with_cache_timeout(monkeypatch):
+    @process_memoize
+    def load(arg):
+        calls.append(arg)
+        return len(calls)
+
+    monkeypatch.setattr(settings, "CACHE_DEFAULT_TIMEOUT", 0)
+    assert load("e") == load("e") == 1
+    assert load("f") == 2
+    load.cache_clear()
+    assert load("e") == 3
+    # Expired results are loaded again.
+    monkeypatch.setattr(settings, "CACHE_DEFAULT_TIMEOUT", "0.1")
+    time.sleep(0.1)
+    assert load("e") == 4
+    assert load("e") == 4
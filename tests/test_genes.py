@@ -0,0 +1,68 @@
+"""Tests for the transcript helpers of ``excovis.genes``."""
+
+from intervaltree import Interval, IntervalTree
+import numpy as np
+import pytest
+
+from excovis import genes
+
+
+@pytest.fixture
+def transcript():
+    """Minus strand transcript with exons listed against the genomic order, 0-based half-open.
+
+    The intron between the exons at 320 and 500 is shorter than twice the largest padding.
+    """
+    exons = [genes.Exon(500, 501), genes.Exon(300, 320), genes.Exon(100, 150)]
+    return genes.Transcript(
+        gene_symbol="GENE",
+        tx_accession="NM_000001.1",
+        strand="-",
+        chrom="1",
+        tx_begin=100,
+        tx_end=501,
+        cds_begin=100,
+        cds_end=501,
+        exons=tuple(exons),
+    )
+
+
+def interval_tree_mask(transcript, positions, padding=0):
+    """Return the on-target mask computed with an ``IntervalTree`` query per position."""
+    tree = IntervalTree(
+        [Interval(exon.begin - padding, exon.end + padding) for exon in transcript.exons]
+    )
+    return np.array([tree.overlaps_point(pos - 1) for pos in positions], dtype=bool)
+
+
+@pytest.mark.parametrize("padding", [0, 5, 100])
+def test_on_target_mask_matches_interval_tree(transcript, padding):
+    # All 1-based positions around the transcript, covering exon starts, ends and padding edges.
+    positions = np.arange(1, 700)
+    np.testing.assert_array_equal(
+        genes.on_target_mask(transcript, positions, padding),
+        interval_tree_mask(transcript, positions, padding),
+    )
+
+
+def test_on_target_mask_boundaries(transcript):
+    # The 0-based exon [100, 150) covers the 1-based positions 101 to 150.
+    assert list(genes.on_target_mask(transcript, [100, 101, 150, 151])) == [
+        False,
+        True,
+        True,
+        False,
+    ]
+    # The one-base exon [500, 501) covers the 1-based position 501 only.
+    assert list(genes.on_target_mask(transcript, [500, 501, 502])) == [False, True, False]
+    # With padding, the positions 96 to 155 are on target.
+    assert list(genes.on_target_mask(transcript, [95, 96, 155, 156], padding=5)) == [
+        False,
+        True,
+        True,
+        False,
+    ]
+
+
+def test_on_target_mask_empty(transcript):
+    assert genes.on_target_mask(transcript, np.array([], dtype=int)).shape == (0,)
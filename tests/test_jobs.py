@@ -0,0 +1,89 @@
+"""Tests for the deduplication of background jobs in ``excovis.jobs``."""
+
+from concurrent.futures import Future
+import time
+
+import pytest
+
+from excovis import jobs, settings
+
+
+def job(job_id, value):
+    return value  # pragma: no cover
+
+
+class FakePool:
+    """Records the submitted jobs instead of running them."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, *args):
+        self.submitted.append(args)
+        return Future()
+
+
+@pytest.fixture
+def pool(cache_app, monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(jobs, "_get_pool", lambda: pool)
+    return pool
+
+
+def test_submit_dedups_pending_and_done(pool):
+    job_id = jobs.submit(job, 1)
+    assert jobs.submit(job, 1) == job_id
+    assert len(pool.submitted) == 1
+    jobs._set_state(job_id, state=jobs.DONE, result="digest")
+    assert jobs.submit(job, 1) == job_id
+    assert jobs.submit(job, 1, valid=lambda result: result == "digest") == job_id
+    assert len(pool.submitted) == 1
+    assert jobs.submit(job, 2) != job_id
+    assert len(pool.submitted) == 2
+
+
+def test_submit_again_when_failed(pool):
+    job_id = jobs.submit(job, 1)
+    jobs._set_state(job_id, state=jobs.FAILED, message="failed")
+    assert jobs.submit(job, 1) == job_id
+    assert len(pool.submitted) == 2
+    assert jobs.get_state(job_id)["state"] == jobs.PENDING
+
+
+def test_submit_again_when_result_invalid(pool):
+    job_id = jobs.submit(job, 1)
+    jobs._set_state(job_id, state=jobs.DONE, result="evicted")
+    assert jobs.submit(job, 1, valid=lambda result: False) == job_id
+    assert len(pool.submitted) == 2
+    assert jobs.get_state(job_id)["result"] is None
+
+
+def test_stale_job_is_failed_and_submitted_again(pool, monkeypatch):
+    job_id = jobs.submit(job, 1)
+    jobs._set_state(job_id, state=jobs.RUNNING)
+    assert jobs.get_state(job_id)["state"] == jobs.RUNNING
+    monkeypatch.setattr(settings, "JOB_STALE_SECONDS", -1)
+    state = jobs.get_state(job_id)
+    assert (state["state"], state["message"]) == (
+        jobs.FAILED,
+        "The job was lost, please try again.",
+    )
+    assert jobs.submit(job, 1) == job_id
+    assert len(pool.submitted) == 2
+
+
+def test_running_job_is_kept_alive(cache_app, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_STALE_SECONDS", 0.3)
+    states = []
+
+    def slow_job(job_id):
+        # A long step without progress reports.
+        for _ in range(5):
+            time.sleep(0.2)
+            states.append(jobs.get_state(job_id)["state"])
+        return "digest"
+
+    jobs._run("slow", slow_job, ())
+    assert states == [jobs.RUNNING] * 5
+    state = jobs.get_state("slow")
+    assert (state["state"], state["result"]) == (jobs.DONE, "digest")
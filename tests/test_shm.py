@@ -0,0 +1,120 @@
+"""Tests for the shared memory coverage segments of ``excovis.shm``."""
+
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+from excovis import settings, shm
+
+pytestmark = pytest.mark.skipif(
+    shm.shared_memory is None or not os.path.isdir("/dev/shm"), reason="requires /dev/shm"
+)
+
+#: Size of the test arrays in bytes.
+ARRAY_BYTES = 8_000
+
+
+@pytest.fixture(autouse=True)
+def shm_settings(monkeypatch):
+    """Use a unique segment prefix and a budget of two segments, remove the segments after."""
+    monkeypatch.setattr(settings, "SHM_PREFIX", "excovis-test-%s" % uuid.uuid4().hex[:8])
+    monkeypatch.setattr(settings, "SHM_BUDGET", 2 * (ARRAY_BYTES + 1024))
+    yield
+    shm.cleanup()
+
+
+def make_arrays(value):
+    return {"pos": np.arange(ARRAY_BYTES // 8, dtype=np.int64), "depth": np.full(10, value)}
+
+
+def exists(key):
+    return os.path.exists("/dev/shm/%s" % shm.SharedArrayManager._name(key))
+
+
+def refs(key):
+    segment = shm.shared_memory.SharedMemory(name=shm.SharedArrayManager._name(key))
+    shm.SharedArrayManager._untrack(segment)
+    try:
+        return shm._HEADER.unpack_from(segment.buf, 0)[0]
+    finally:
+        segment.close()
+
+
+def test_put_and_get_from_other_process():
+    # Two managers stand in for two worker processes of the host.
+    first, second = shm.SharedArrayManager(), shm.SharedArrayManager()
+    arrays, meta = first.put("a", make_arrays(1), {"chrom": "1"})
+    assert meta == {"chrom": "1"}
+    np.testing.assert_array_equal(arrays["depth"], np.full(10, 1))
+    assert not arrays["pos"].flags.writeable
+    del arrays
+    assert second.get("missing") is None
+    arrays, meta = second.get("a")
+    np.testing.assert_array_equal(arrays["pos"], make_arrays(1)["pos"])
+    assert meta == {"chrom": "1"}
+    del arrays
+    assert refs("a") == 2
+    # Putting an existing key maps the existing segment.
+    third = shm.SharedArrayManager()
+    arrays, _ = third.put("a", make_arrays(2))
+    np.testing.assert_array_equal(arrays["depth"], np.full(10, 1))
+    del arrays
+    assert refs("a") == 3
+    for manager in (first, second, third):
+        manager.clear()
+
+
+def test_unlinked_when_last_reference_detaches():
+    first, second = shm.SharedArrayManager(), shm.SharedArrayManager()
+    first.put("a", make_arrays(1))
+    second.get("a")
+    first.clear()
+    assert exists("a")
+    assert refs("a") == 1
+    second.clear()
+    assert not exists("a")
+    assert first.stats() == second.stats() == {"segments": 0, "bytes": 0, "zombies": 0}
+
+
+def test_lru_within_budget():
+    manager = shm.SharedArrayManager()
+    manager.put("a", make_arrays(1))
+    manager.put("b", make_arrays(2))
+    # Using "a" makes "b" the least recently used segment.
+    assert manager.get("a") is not None
+    manager.put("c", make_arrays(3))
+    assert list(manager.segments) == ["a", "c"]
+    assert manager.stats()["bytes"] <= settings.SHM_BUDGET
+    assert not exists("b")
+    assert exists("a") and exists("c")
+    manager.clear()
+
+
+def test_detached_arrays_stay_valid():
+    manager = shm.SharedArrayManager()
+    arrays, _ = manager.put("a", make_arrays(1))
+    manager.clear()
+    assert not exists("a")
+    # The mapping is kept until the arrays are not referenced any more.
+    np.testing.assert_array_equal(arrays["depth"], np.full(10, 1))
+
+
+def test_cleanup_removes_left_over_segments():
+    # E.g., a crashed worker process that did not detach.
+    crashed = shm.SharedArrayManager()
+    crashed.put("a", make_arrays(1))
+    assert exists("a")
+    shm.cleanup()
+    assert not exists("a")
+    crashed.clear()
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "SHM_BUDGET", 0)
+    manager = shm.SharedArrayManager()
+    arrays = make_arrays(1)
+    assert manager.put("a", arrays) == (arrays, {})
+    assert manager.get("a") is None
+    assert not exists("a")
@@ -0,0 +1,86 @@
+"""Tests for the vectorized coverage statistics of ``excovis.stats``."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from excovis import stats
+
+THRESHOLDS = (10, 20)
+
+
+@pytest.fixture
+def coverage_df():
+    """Coverage of two samples on a minus strand transcript with 3 bp padding.
+
+    Exon 4 is 10 bp long, exon 3 has no positions (e.g., outside the loaded region), exon 2 is
+    one base long without padding, and exon 1 is 4 bp long.  The exons are numbered against the
+    genomic order as on the minus strand.
+    """
+    rng = np.random.default_rng(42)
+    exon_nos = [4] * (3 + 10 + 3) + [2] + [1] * (3 + 4 + 3)
+    return pd.DataFrame(
+        {
+            "chrom": "1",
+            "pos": np.arange(100, 100 + len(exon_nos)),
+            "exon_no": exon_nos,
+            "S1": rng.integers(0, 40, len(exon_nos)),
+            "S2": [25 if exon_no == 2 else 0 for exon_no in exon_nos],
+        }
+    )
+
+
+def expected_stats(df):
+    """Return the expected statistics of ``df`` in the layout of ``compute_coverage_stats()``."""
+    samples = ["S1", "S2"]
+    aggregations = {
+        "min": lambda x: x.min(),
+        "max": lambda x: x.max(),
+        "mean": lambda x: x.mean(),
+        "median": lambda x: x.median(),
+    }
+    for q in stats.PERCENTILES:
+        aggregations["p%d" % q] = lambda x, q=q: x.quantile(q / 100.0)
+    for threshold in THRESHOLDS:
+        aggregations[stats.threshold_statistic(threshold)] = lambda x, t=threshold: (
+            100.0 * (x >= t).mean()
+        )
+    result = {}
+    for name, fn in aggregations.items():
+        per_tx = fn(df[samples].astype(float)).to_frame().T
+        per_tx.insert(0, "exon_no", None)
+        per_tx.insert(0, "feature", "transcript")
+        per_exon = df.groupby("exon_no")[samples].apply(lambda g: fn(g.astype(float)))
+        per_exon = per_exon.reset_index()
+        per_exon.insert(0, "feature", "exon")
+        result[name] = pd.concat([per_tx, per_exon], ignore_index=True).round(1)
+    return result
+
+
+def test_compute_coverage_stats_matches_groupby(coverage_df):
+    result = stats.compute_coverage_stats(coverage_df, THRESHOLDS)
+    expected = expected_stats(coverage_df)
+    assert set(result) == set(expected)
+    for name, df in result.items():
+        assert list(df["exon_no"]) == [None, 1, 2, 4], name
+        np.testing.assert_allclose(
+            df[["S1", "S2"]].values.astype(float),
+            expected[name][["S1", "S2"]].values.astype(float),
+            err_msg=name,
+        )
+
+
+def test_compute_coverage_stats_one_base_exon(coverage_df):
+    result = stats.compute_coverage_stats(coverage_df, THRESHOLDS)
+    for name in stats.STATISTICS:
+        assert result[name].loc[2, "S2"] == 25.0, name
+    assert result["ge20"].loc[2, "S2"] == 100.0
+    assert result["ge20"].loc[1, "S2"] == 0.0
+
+
+def test_compute_coverage_stats_empty():
+    df = pd.DataFrame(columns=["chrom", "pos", "exon_no", "S1"])
+    result = stats.compute_coverage_stats(df, THRESHOLDS)
+    assert set(result) == set(stats.STATISTICS) | {"ge10", "ge20"}
+    assert all(df.empty for df in result.values())
+    assert list(result["min"].columns) == ["feature", "exon_no", "S1"]
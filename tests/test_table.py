@@ -0,0 +1,129 @@
+"""Tests for the server-side filtering, sorting and paging of ``excovis.table``."""
+
+import pandas as pd
+import pytest
+
+from excovis import table
+
+
+@pytest.fixture
+def table_df():
+    """Coverage table in the layout of ``stats.compute_coverage_stats()``."""
+    return pd.DataFrame(
+        {
+            "feature": ["transcript", "exon", "exon", "exon", "exon"],
+            "exon_no": [None, 1, 2, 3, 4],
+            "S1": [20.0, 10.0, 30.0, 20.0, 25.5],
+            "S2": [5.0, 5.0, 1.0, 5.0, 9.0],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "filter_query, expected",
+    [
+        ("{S1} ge 20", [0, 2, 3, 4]),
+        ("{S1} >= 20", [0, 2, 3, 4]),
+        ("{S1} le 20", [0, 1, 3]),
+        ("{S1} <= 20", [0, 1, 3]),
+        ("{S1} lt 20", [1]),
+        ("{S1} < 20", [1]),
+        ("{S1} gt 20", [2, 4]),
+        ("{S1} > 20", [2, 4]),
+        ("{S1} ne 20", [1, 2, 4]),
+        ("{S1} != 20", [1, 2, 4]),
+        ("{S1} eq 25.5", [4]),
+        ("{S1} = 25.5", [4]),
+        ("{feature} eq transcript", [0]),
+        ('{feature} = "exon"', [1, 2, 3, 4]),
+        ("{feature} contains script", [0]),
+        ("{S1} contains 2", [0, 3, 4]),
+    ],
+)
+def test_filter_df_operators(table_df, filter_query, expected):
+    assert list(table.filter_df(table_df, filter_query).index) == expected
+
+
+def test_filter_df_numeric_on_object_column(table_df):
+    # The transcript row has no exon number and never matches a numeric comparison.
+    assert list(table.filter_df(table_df, "{exon_no} gt 2").index) == [3, 4]
+    assert list(table.filter_df(table_df, "{exon_no} le 2").index) == [1, 2]
+
+
+def test_filter_df_combined(table_df):
+    query = "{feature} eq exon && {S1} ge 20 && {S2} lt 9"
+    assert list(table.filter_df(table_df, query).index) == [2, 3]
+
+
+@pytest.mark.parametrize(
+    "filter_query",
+    [
+        None,
+        "",
+        "{S1}",
+        "{S1} like 20",
+        "S1 ge 20",
+        "{unknown} ge 20",
+        "{S1 ge 20",
+        "{S1} > abc",
+        "{exon_no} > x",
+    ],
+)
+def test_filter_df_invalid_queries_are_ignored(table_df, filter_query):
+    assert list(table.filter_df(table_df, filter_query).index) == list(table_df.index)
+
+
+def test_filter_df_ignores_invalid_parts(table_df):
+    query = "{unknown} ge 20 && {S1} gt 20 && nonsense"
+    assert list(table.filter_df(table_df, query).index) == [2, 4]
+
+
+def test_split_filter_part():
+    assert table.split_filter_part("{S1} >= 20") == ("S1", "ge", 20.0)
+    assert table.split_filter_part("{feature} eq 'exon'") == ("feature", "eq", "exon")
+    assert table.split_filter_part("{S1} contains 2") == ("S1", "contains", "2")
+    assert table.split_filter_part("{S1} ~ 20") == (None, None, None)
+
+
+def test_sort_df_multi_column(table_df):
+    sort_by = [
+        {"column_id": "S2", "direction": "desc"},
+        {"column_id": "S1", "direction": "asc"},
+    ]
+    assert list(table.sort_df(table_df, sort_by).index) == [4, 1, 0, 3, 2]
+
+
+def test_sort_df_missing_values_first(table_df):
+    sort_by = [{"column_id": "exon_no", "direction": "desc"}]
+    assert list(table.sort_df(table_df, sort_by).index) == [0, 4, 3, 2, 1]
+
+
+def test_sort_df_stable_and_ignores_unknown_columns(table_df):
+    assert table.sort_df(table_df, None) is table_df
+    assert table.sort_df(table_df, [{"column_id": "unknown", "direction": "asc"}]) is table_df
+    sort_by = [{"column_id": "S2", "direction": "asc"}]
+    assert list(table.sort_df(table_df, sort_by).index) == [2, 0, 1, 3, 4]
+
+
+def test_page_df_pages(table_df):
+    records, page_count = table.page_df(table_df, 0, 2)
+    assert page_count == 3
+    assert [record["S1"] for record in records] == [20.0, 10.0]
+
+
+def test_page_df_last_partial_page(table_df):
+    records, page_count = table.page_df(table_df, 2, 2)
+    assert page_count == 3
+    assert [record["S1"] for record in records] == [25.5]
+
+
+def test_page_df_clamps_page(table_df):
+    records, page_count = table.page_df(table_df, 10, 2)
+    assert page_count == 3
+    assert [record["S1"] for record in records] == [25.5]
+    records, _ = table.page_df(table_df, None, 2)
+    assert len(records) == 2
+
+
+def test_page_df_empty(table_df):
+    assert table.page_df(table_df.iloc[:0], 3, 2) == ([], 1)